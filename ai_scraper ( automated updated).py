@@ -4,33 +4,72 @@
 # - Deduplication across runs
 # - Monitoring with stop-after-X-rounds
 # - Network blocking for faster loading
-# - Discount label translation JA→EN
+# - Discount label translation JA→EN (+ other TRANSLATE_LANGS into the translations.db side table)
 # - Symbol cleanup in product titles
+# - Streaming pipeline: items are translated in batches and persisted as they are scraped
+# - Compact records: known links/banners are kept as 64-bit hashes for long-running monitors
+# - Price history: a known product at a new price is recorded and updated, not dropped
+# - Incremental harvesting: cards are collected as they render and scrolling stops at the
+#   limit (with banners it goes on to the end of the page, where banners load lazily)
+# - Selectors come from declarative site profiles (profiles/*.json, see selector_profiles.py)
+# - Images are thumbnailed in the background; the same creative under another URL is merged
+# - Layout drift is detected right after DOMContentLoaded; changed markup falls back to
+#   the generic price-text heuristic instead of timing out
+# - Monitors keep one Chromium across rounds; it is relaunched past the memory / page
+#   limits and leaked browser processes are killed (resources.py)
+# - A URL is scraped by one process at a time (scrape_lease.py): the API server, the
+#   monitor and cron runs share an in-flight or recent result instead of each
+#   launching Chromium and racing on the JSON writes
+# - OCR'd banner text and titles that differ only by noise / decoration are caught by
+#   MinHash near-duplicate checks (near_dup.py), not stored again every round
+# - SCRAPE_PROFILE=1 profiles the first scrape (profiling.py; run_scraper.py --profile for CLI runs)
 
 import time
 import json
 import re
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime, timezone
 from playwright.sync_api import sync_playwright, TimeoutError
 from deep_translator import GoogleTranslator
 from functools import lru_cache
+from scheduler import AdaptiveScheduler, backoff_delay
+from pipeline import Pipeline, TranslateStage, ListSink, JournalSink, join_translate
+from records import ProductRecord, BannerRecord, banner_key, product_key, parse_price, to_jsonable
+from price_history import record_items
+from search_index import index_items
+from selector_profiles import load_profile
+from layout_drift import check_layout, heuristic_card
+from http_fetch import FETCH_MODE, FetchEngine
+from snapshots import SNAPSHOT_ENABLED, archive_page
+from deal_feed import publish_items
+from alerts import check_alerts
+from response_cache import bump_version
+from resources import ResourceGovernor
+from profiling import PROFILE_ENABLED, profiled
+from near_dup import TITLE_THRESHOLD, NearDupIndex, banner_kind, store_records, title_kind
+from scrape_lease import FRESH_FOR, coordinated, write_lock
+from thumbnails import ImageSink, annotate_images, product_image_key, banner_image_key
+from translations import SOURCE_LANG, TARGET_LANGS, TranslationStore, google_code
 
 # ----------------------------
 # Setup
 # ----------------------------
 DATA_FILE = Path("ai_storage.json")
-translator = GoogleTranslator(source="ja", target="en")
 
 # ----------------------------
 # Helpers
 # ----------------------------
+@lru_cache(maxsize=None)
+def get_translator(lang: str) -> GoogleTranslator:
+    return GoogleTranslator(source=SOURCE_LANG, target=google_code(lang))
+
 @lru_cache(maxsize=1000)
-def translate_to_en(text: str) -> str:
+def translate_text(text: str, lang: str = "en") -> str:
     if not text:
         return ""
     try:
-        return translator.translate(text.strip())
+        return get_translator(lang).translate(text.strip())
     except Exception:
         return text.strip()
 
@@ -52,148 +91,296 @@ def block_unwanted(route, request):
         return route.abort()
     return route.continue_()
 
+# ----------------------------
+# Browser session
+# ----------------------------
+class BrowserSession:
+    """One Chromium reused across rounds; relaunched when the resource governor asks for it."""
+
+    def __init__(self, governor: ResourceGovernor = None):
+        self.governor = governor or ResourceGovernor()
+        self.playwright = None
+        self.browser = None
+
+    def get(self):
+        reason = self.governor.should_recycle() if self.browser is not None else None
+        if self.browser is not None and not self.browser.is_connected():
+            reason = "browser disconnected"
+        if reason:
+            self.governor.recycled(reason)
+            self.close(final=False)
+        if self.browser is None:
+            self.playwright = sync_playwright().start()
+            self.browser = self.playwright.chromium.launch(headless=True)
+            self.governor.launched()
+        self.governor.page_opened()
+        return self.browser
+
+    def close(self, final: bool = True):
+        if self.browser is not None:
+            self.governor.closed()
+        for close in (self.browser and self.browser.close, self.playwright and self.playwright.stop):
+            if not close:
+                continue
+            try:
+                close()
+            except Exception as e:
+                print(f"⚠️ Browser shutdown failed: {e}")  # whatever survives is killed below
+        self.browser = self.playwright = None
+        if final:
+            self.governor.close()
+        else:
+            self.governor.reap()
+
+@contextmanager
+def browser_context(session: BrowserSession = None):
+    """A fresh context on the session's browser (a one-shot browser without a session)."""
+    owned = session is None
+    session = session or BrowserSession()
+    try:
+        context = session.get().new_context(viewport={"width": 1280, "height": 720})
+        context.route("**/*", block_unwanted)  # 🚫 block trackers
+        try:
+            yield context
+        finally:
+            context.close()
+    finally:
+        if owned:
+            session.close()
+
+# ----------------------------
+# Card Harvesting
+# ----------------------------
+MAX_SCROLLS = 10
+SCROLL_WAIT_MS = 500
+
 # ----------------------------
 # Banner Extraction
 # ----------------------------
-def extract_banner_texts(page, known_banners: set, max_banners: int = 20):
-    banners = []
-    duplicates_banners = 0
-    img_selectors = "img[src*='banner'], img[src*='sale'], img[alt*='割引'], img[alt*='セール'], img[class*='banner']"
-    img_elements = page.locator(img_selectors).all()
-
-    print(f"🔎 Found {len(img_elements)} potential banner images")
-    for img in img_elements[:max_banners]:
-        src = img.get_attribute("src")
-        alt = img.get_attribute("alt") or ""
-        title = img.get_attribute("title") or ""
-        text_ja = clean_text(alt or title)
-
-        if not text_ja:
-            continue
-
-        key = (src, text_ja)
-        if key in known_banners:
-            duplicates_banners += 1
-            continue
-
-        banners.append({
-            "text_ja": text_ja,
-            "text_en": translate_to_en(text_ja),
-            "image_url": src,
-            "scraped_at": timestamp()
-        })
-        known_banners.add(key)
-
-    print(f"🖼️ Extracted {len(banners)} new banner texts (skipped {duplicates_banners} duplicates)")
-    return banners, known_banners, duplicates_banners
+def scroll_to_end(page, max_steps: int):
+    """Keep scrolling until the page stops growing (lazy banners below the last card we needed)."""
+    last_height = page.evaluate("document.body.scrollHeight")
+    for _ in range(max_steps):
+        page.mouse.wheel(0, 1500)
+        page.wait_for_timeout(SCROLL_WAIT_MS)
+        new_height = page.evaluate("document.body.scrollHeight")
+        if new_height == last_height:
+            break
+        last_height = new_height
+
+def extract_banner_texts(page, plan, max_banners: int = 20):
+    """Yield raw banner candidates (src + alt/title text) from one evaluate() call."""
+    result = plan.run(page, limit=max_banners)
+    print(f"🔎 Found {result['total']} potential banner images")
+    yield from result["items"]
+
+# ----------------------------
+# Pipeline stages
+# ----------------------------
+def translate_batch(texts, lang: str = "en"):
+    """One request per ~4.5k chars instead of one per string."""
+    return join_translate(texts, lambda text: translate_text(text, lang))
+
+def normalize_product(raw: dict):
+    # Cards without a link or image are dropped here (not by the shared profile: the Selenium path keeps them)
+    if not raw["link"] or not raw["image_url"] or parse_price(raw["discounted_price"]) is None:
+        return None
+    return ProductRecord(
+        title_ja=clean_text(raw["title"] or ""),
+        title_en=None,
+        original_price=raw["original_price"],      # the record keeps the scraped string and its integer
+        discounted_price=raw["discounted_price"],
+        discount_percent_ja=clean_text(raw["label"]) if raw["label"] else None,
+        discount_percent_en=None,
+        image_url=raw["image_url"],
+        link=raw["link"],
+        scraped_at=raw.get("scraped_at") or int(time.time()),  # capture time when reprocessing snapshots
+    )
+
+def normalize_banner(raw: dict):
+    text_ja = clean_text(raw["text"])
+    if not text_ja:
+        return None
+    return BannerRecord(text_ja=text_ja, text_en=None, image_url=raw["src"], scraped_at=raw.get("scraped_at") or int(time.time()))
+
+def make_pipeline(known_links: set, known_banners: set, sink=None, images: bool = True) -> Pipeline:
+    translate = TranslateStage(translate_batch, {
+        "products": [("title_ja", "title_en"), ("discount_percent_ja", "discount_percent_en")],
+        "banners": [("text_ja", "text_en")],
+    }, targets=TARGET_LANGS, store=TranslationStore())  # zh/ko etc. go to translations.db
+    return Pipeline(
+        normalizers={"products": normalize_product, "banners": normalize_banner},
+        translate=translate,
+        keys={"products": lambda p: p.key, "banners": lambda b: b.key},  # 64-bit hashes, not full URLs
+        known={"products": known_links, "banners": known_banners},
+        # Thumbnails download while the round continues (not when reprocessing snapshots)
+        sink=ImageSink(sink or ListSink()) if images else sink or ListSink(),
+    ).start()
+
+def put_card(pipe: Pipeline, raw: dict, known_links: set) -> bool:
+    """Queue one raw card unless it was already scraped at the same price."""
+    if product_key(raw["link"], parse_price(raw["discounted_price"])) in known_links:
+        pipe.stats["duplicate_products"] += 1
+        return False
+    pipe.put("products", raw)  # normalized/translated on the pipeline thread
+    return True
+
+def journal_sink(filename=DATA_FILE) -> JournalSink:
+    """Persist items as they are scraped; folded into `filename` when the round ends."""
+    filename = Path(filename)
+    return JournalSink(filename.with_suffix(".journal.jsonl"), commit=lambda data: save_to_json(data, filename),
+                       default=to_jsonable)
 
 # ----------------------------
 # Product Scraping
 # ----------------------------
-def scrape_products(url: str, user_limit: int, known_links: set, known_banners: set, max_retries: int = 2):
+def scrape_products(url: str, user_limit: int, known_links: set, known_banners: set, max_retries: int = 2,
+                    offset: int = 0, with_banners: bool = True, sink=None, profile=None, fetch_mode: str = FETCH_MODE,
+                    snapshot: bool = SNAPSHOT_ENABLED, session: BrowserSession = None, fresh_for: float = FRESH_FOR):
+    """
+    scrape_page() coordinated across processes (scrape_lease.py), keyed on the URL and
+    the shard (offset / limit / banners). While another process scrapes the same key
+    its result is awaited, and one younger than `fresh_for` seconds is reused. Those
+    items (minus what this process has seen) still go through `sink`, so stdout and
+    other output files get them too; saving them again to the owner's store is a no-op.
+    """
+    key = f"{url}#offset={offset}&limit={user_limit}&banners={int(with_banners)}"
+    def scrape():
+        return scrape_page(url, user_limit, known_links, known_banners, max_retries, offset, with_banners,
+                           sink, profile, fetch_mode, snapshot, session)[0]
+
+    results, source = coordinated(key, scrape, fresh_for, succeeded=lambda r: bool(r["total_found"]))
+    if source != "scraped":
+        products = [p for p in results["products"]
+                    if product_key(p["link"], parse_price(p["discounted_price"])) not in known_links]
+        banners = [b for b in results["banners"] if banner_key(b["image_url"], b["text_ja"]) not in known_banners]
+        known_links.update(product_key(p["link"], parse_price(p["discounted_price"])) for p in products)
+        known_banners.update(banner_key(b["image_url"], b["text_ja"]) for b in banners)
+        if sink is not None:
+            for kind, items in (("products", products), ("banners", banners)):
+                for item in items:
+                    sink.write(kind, item)
+            data = sink.close()
+            products, banners = data["products"], data["banners"]
+        results = {"products": products, "banners": banners, "total_found": results["total_found"]}
+    return results, known_links, known_banners
+
+def scrape_page(url: str, user_limit: int, known_links: set, known_banners: set, max_retries: int = 2,
+                offset: int = 0, with_banners: bool = True, sink=None, profile=None, fetch_mode: str = FETCH_MODE,
+                snapshot: bool = SNAPSHOT_ENABLED, session: BrowserSession = None):
+    """
+    Extract cards on this thread and stream them through the pipeline.
+    With the default sink the round's new items are returned; with a
+    journal sink they are already persisted when this returns.
+    Selectors come from the site profile (selector_profiles.py) matching `url`.
+    The server-rendered HTML is tried first (http_fetch.py); Chromium is only
+    launched when it lacks the profile's fields or enough cards (fetch_mode="auto").
+    With `snapshot` the page HTML is archived for offline reprocessing (snapshots.py).
+    Monitors pass a BrowserSession so Chromium is not relaunched every round.
+    """
     print(f"🌐 Visiting: {url}")
-    products, banners = [], []
-    duplicates_products = 0
-    duplicates_banners = 0
+    profile = profile or load_profile(url=url)
+    products_plan = profile.plan("products")  # replaced by the fallback plan on layout drift
+    pipe = make_pipeline(known_links, known_banners, sink)
     total_cards = 0
+    engine = FetchEngine()
+    cheap = engine.try_cheap(url, profile, needed=offset + user_limit, mode=fetch_mode)
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 720})
-        context.route("**/*", block_unwanted)  # 🚫 block trackers
-        page = context.new_page()
-
-        for attempt in range(max_retries):
-            try:
-                print(f"📡 Attempt {attempt + 1}/{max_retries} to load page")
-                page.goto(url, timeout=60000, wait_until="domcontentloaded")
-                page.wait_for_selector("div.ecm-ad", timeout=15000)
-                print("✅ Product containers detected")
-
-                # Scroll down to load more
-                last_height = page.evaluate("document.body.scrollHeight")
-                for _ in range(10):
-                    page.mouse.wheel(0, 1500)
-                    page.wait_for_timeout(500)
-                    new_height = page.evaluate("document.body.scrollHeight")
-                    if new_height == last_height:
-                        break
-                    last_height = new_height
-                print("✅ Page fully loaded")
-
-                # Banners
-                new_banners, known_banners, duplicates_banners = extract_banner_texts(page, known_banners)
-                banners.extend(new_banners)
-
-                # Products
-                cards = page.query_selector_all("div.ecm-ad")
-                total_cards = len(cards)
-                print(f"🔎 Found {total_cards} product cards")
-                print(f"📦 Scraping {user_limit} products out of {total_cards}")
-
-                count = 0
-                for card in cards:
-                    if count >= user_limit:
-                        break
+    try:
+        if cheap is not None:
+            total_cards = scrape_static(cheap[0], profile, pipe, known_links, user_limit, offset, with_banners)
+            if snapshot:
+                archive_page(cheap[0], url, profile.name)
+        elif fetch_mode == "http":
+            print("❌ HTTP fetch failed (fetch mode 'http' never launches a browser)")
+        else:
+            with browser_context(session) as context:
+                page = context.new_page()
+
+                for attempt in range(max_retries):
                     try:
-                        link_el = card.query_selector("a.ecm-ad-link")
-                        img_el = card.query_selector("img")
-                        title_el = card.query_selector(".ecm-ad-name")
-                        orig_el = card.query_selector(".ecm-ad-price-original")
-                        disc_el = card.query_selector(".ecm-ad-price-amount")
-                        label_el = card.query_selector(".ecm-ad-label")
-
-                        if not link_el or not img_el or not disc_el:
-                            continue  # skip invalid cards safely
-
-                        link = link_el.get_attribute("href")
-                        image_url = img_el.get_attribute("src")
-                        title_ja = clean_text(title_el.inner_text() if title_el else "")
-                        original_price = clean_text(orig_el.inner_text()) if orig_el else None
-                        discounted_price = clean_text(disc_el.inner_text()) if disc_el else None
-                        discount_percent_ja = clean_text(label_el.inner_text()) if label_el else None
-                        discount_percent_en = translate_to_en(discount_percent_ja) if discount_percent_ja else None
-
-                        if not link or link in known_links or not discounted_price:
-                            duplicates_products += 1
-                            continue
-
-                        products.append({
-                            "title_ja": title_ja,
-                            "title_en": translate_to_en(title_ja),
-                            "original_price": original_price,
-                            "discounted_price": discounted_price,
-                            "discount_percent_ja": discount_percent_ja,
-                            "discount_percent_en": discount_percent_en,
-                            "image_url": image_url,
-                            "link": link,
-                            "scraped_at": timestamp()
-                        })
-                        known_links.add(link)
-                        count += 1
-
-                        if count % 5 == 0:
-                            print(f"✅ Collected {count} products so far...")
-
-                    except Exception as e:
-                        print(f"⚠️ Error parsing product: {e}")
-                        continue
-
-                break
-            except TimeoutError:
-                print(f"⏳ Timeout on attempt {attempt + 1}, retrying in 5s...")
-                time.sleep(5)  # delay before retry
-                if attempt == max_retries - 1:
-                    print("❌ Max retries reached")
+                        print(f"📡 Attempt {attempt + 1}/{max_retries} to load page")
+                        page.goto(url, timeout=60000, wait_until="domcontentloaded")
+                        # Fail fast on changed markup instead of a 15 s selector timeout per round
+                        products_plan, drift = check_layout(page, profile, url)
+                        fallback = drift["drifted"]
+                        print(f"✅ Product containers detected (profile: {drift['fallback'] or profile.name})")
+
+                        # Harvest cards as they render; stop scrolling once the limit is met
+                        page.evaluate(products_plan.harvester_js)
+                        count = idle = last_height = 0
+                        for step in range(MAX_SCROLLS + 1):
+                            # Last step (or two idle scrolls): also flush cards that never finished rendering
+                            harvest = products_plan.harvest(page, force=step == MAX_SCROLLS or idle >= 2)
+                            total_cards = harvest["seen"]
+                            for raw in harvest["cards"]:
+                                if fallback and not raw.get("invalid"):
+                                    raw = heuristic_card(raw) or {"idx": raw["idx"], "invalid": True}
+                                if raw["idx"] < offset or count >= user_limit or raw.get("invalid"):
+                                    continue  # before this shard, past the limit, or skipped as incomplete
+                                if not put_card(pipe, raw, known_links):
+                                    continue  # same link at the same price as an earlier round
+                                count += 1
+                                if count % 5 == 0:
+                                    print(f"✅ Extracted {count} products so far...")
+
+                            if count >= user_limit or step == MAX_SCROLLS or idle >= 2:
+                                break
+                            idle = idle + 1 if harvest["height"] == last_height and not harvest["cards"] else 0
+                            last_height = harvest["height"]
+                            page.mouse.wheel(0, 1500)
+                            page.wait_for_timeout(SCROLL_WAIT_MS)
+
+                        print(f"🔎 Found {total_cards} product cards after {step} scrolls")
+                        print(f"📦 Scraped {count} new products (limit {user_limit}, starting at card {offset})")
+
+                        # Banners: the card limit stopped the scroll early, but banners further down load lazily too
+                        if with_banners:
+                            if count >= user_limit:
+                                scroll_to_end(page, MAX_SCROLLS - step)
+                            for raw in extract_banner_texts(page, profile.plan("banners")):
+                                pipe.put("banners", raw)
+                        if snapshot:
+                            archive_page(page, url, profile.name)  # DOM after scrolling: lazy cards included
 
-        context.close()
-        browser.close()
+                        break
+                    except TimeoutError:
+                        if attempt == max_retries - 1:
+                            print("❌ Max retries reached")
+                            break
+                        delay = backoff_delay(attempt)
+                        print(f"⏳ Timeout on attempt {attempt + 1}, retrying in {delay:.1f}s...")
+                        time.sleep(delay)  # exponential backoff with jitter
+    finally:
+        # Whatever was extracted before a crash still reaches the sink
+        data, stats = pipe.close()
 
     print(
-        f"✅ Round summary: {len(products)} new products, {len(banners)} new banners "
-        f"(skipped {duplicates_products} duplicate products, {duplicates_banners} duplicate banners)"
+        f"✅ Round summary: {stats['products']} new products, {stats['banners']} new banners "
+        f"(skipped {stats['duplicate_products']} duplicate products, {stats['duplicate_banners']} duplicate banners, "
+        f"{stats['translate_calls']} translation requests {stats['translate_calls_by_lang']}, "
+        f"{stats['translation_cache_hits']} cached translations)"
     )
-    return {"products": products, "banners": banners, "total_found": total_cards}, known_links, known_banners
+    if products_plan.stats.counts:
+        print(f"🧪 Field hit rates: {products_plan.stats.report()}")
+    print(f"🌍 Fetch: {engine.report()}")
+    return {"products": data["products"], "banners": data["banners"], "total_found": total_cards}, known_links, known_banners
+
+def scrape_static(page, profile, pipe: Pipeline, known_links: set, user_limit: int, offset: int,
+                  with_banners: bool) -> int:
+    """Cheap path: the same plans on the server-rendered HTML, no scrolling. Returns the card count."""
+    result = profile.plan("products").run(page, offset)
+    count = 0
+    for raw in result["items"]:
+        if count >= user_limit:
+            break
+        if put_card(pipe, raw, known_links):
+            count += 1
+    print(f"⚡ Static HTML: {result['total']} product cards, {count} new products (limit {user_limit}, starting at card {offset})")
+    if with_banners:
+        for raw in extract_banner_texts(page, profile.plan("banners")):
+            pipe.put("banners", raw)
+    return result["total"]
 
 # ----------------------------
 # Save to JSON (deduplicated)
@@ -213,21 +400,75 @@ def load_existing_json(filename=DATA_FILE):
 def save_to_json(data, filename=DATA_FILE):
     try:
         filename.parent.mkdir(parents=True, exist_ok=True)
-        existing = load_existing_json(filename)
-
-        existing_links = {p["link"] for p in existing["products"]}
-        new_products = [p for p in data["products"] if p["link"] not in existing_links]
-
-        existing_banners = {(b["image_url"], b["text_ja"]) for b in existing["banners"]}
-        new_banners = [b for b in data["banners"] if (b["image_url"], b["text_ja"]) not in existing_banners]
-
-        existing["products"].extend(new_products)
-        existing["banners"].extend(new_banners)
-
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(existing, f, indent=2, ensure_ascii=False)
-
-        print(f"💾 Saved {len(new_products)} new products and {len(new_banners)} new banners to {filename}")
+        with write_lock(filename):  # another process may be saving another shard / limit of the page
+            existing = load_existing_json(filename)
+
+            # Every observation goes to the price history, including known links at a new price
+            changed = record_items(data["products"], source="automated")
+
+            # Same creative under another image URL → same image_id (perceptual hash)
+            annotate_images(list(data["products"]) + list(data["banners"]))
+
+            # Near-duplicate titles / banner texts (MinHash LSH); indexed only once the save succeeds
+            with NearDupIndex() as near:
+                near.backfill("automated", store_records(existing["products"], existing["banners"], "automated"))
+
+                # A known link at a new price updates the stored product instead of being dropped
+                by_link = {p["link"]: p for p in existing["products"]}
+                by_image = {product_image_key(p): p for p in existing["products"] if product_image_key(p)}
+                new_products, updated, merged, near_dups = [], [], 0, 0
+                for p in data["products"]:
+                    current = by_link.get(p["link"])
+                    if current is None and (product_image_key(p) in by_image or near.seen(
+                            title_kind(p, "automated"), p["title_ja"], ref=p["link"], threshold=TITLE_THRESHOLD, commit=False)):
+                        merged += 1  # same image and price, same title up to decoration, under a different link
+                        continue
+                    if current is None:
+                        new_products.append(p)
+                        by_link[p["link"]] = p
+                        if product_image_key(p):
+                            by_image[product_image_key(p)] = p
+                    elif parse_price(current.get("discounted_price")) != parse_price(p["discounted_price"]):
+                        previous_price = current.get("discounted_price")
+                        for field in ("original_price", "discounted_price", "discount_percent_ja", "discount_percent_en", "scraped_at"):
+                            current[field] = p[field]
+                        updated.append({**current, "previous_price": previous_price})
+
+                existing_banners = {banner_image_key(b) for b in existing["banners"]}
+                new_banners = []
+                for b in data["banners"]:
+                    if banner_image_key(b) in existing_banners:
+                        continue
+                    existing_banners.add(banner_image_key(b))
+                    if near.seen(banner_kind(b["text_ja"], "automated"), b["text_ja"], ref=b["image_url"], commit=False):
+                        near_dups += 1  # the same banner, OCR'd / written slightly differently
+                        continue
+                    new_banners.append(b)
+
+                existing["products"].extend(new_products)
+                existing["banners"].extend(new_banners)
+
+                with open(filename, "w", encoding="utf-8") as f:
+                    json.dump(existing, f, indent=2, ensure_ascii=False, default=to_jsonable)
+                near.commit()
+
+        # Keyword index is updated incrementally (new products, price updates, new banners)
+        index_items(data["products"], new_banners, source="automated")
+
+        # Push feed (main.py /feed/sse, /feed/ws): only what is new or changed
+        publish_items("product", new_products)
+        publish_items("product", updated, change="price_change")
+        publish_items("banner", new_banners)
+        # Alert rules (alert_rules.json) only look at the records that just changed
+        check_alerts(new_products + updated)
+        check_alerts(new_banners, kind="banner")
+        bump_version()  # the API's cached responses / ETags are now stale
+
+        print(
+            f"💾 Saved {len(new_products)} new products, {len(updated)} price updates and {len(new_banners)} new banners "
+            f"to {filename} ({changed} price changes recorded, {merged} duplicate products merged by image / title, "
+            f"{near_dups} near-duplicate banners skipped)"
+        )
     except Exception as e:
         print(f"❌ Error saving to JSON: {e}")
 
@@ -239,46 +480,58 @@ if __name__ == "__main__":
     known_links = set()
     known_banners = set()
 
-    # First detect product count
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 720})
-        context.route("**/*", block_unwanted)  # 🚫 block trackers
-        page = context.new_page()
-        page.goto(url, timeout=60000, wait_until="domcontentloaded")
-        page.wait_for_selector("div.ecm-ad", timeout=15000)
-        total_cards = len(page.query_selector_all("div.ecm-ad"))
-        context.close()
-        browser.close()
-
-    print(f"\n🔎 Detected {total_cards} product cards on the page.")
-    user_limit = int(input(f"👉 How many products do you want to scrape? (max {total_cards}): "))
-
-    results, known_links, known_banners = scrape_products(url, user_limit, known_links, known_banners)
-    if results:
-        save_to_json(results)
-        print("\n📊 Sample Output:")
-        print(json.dumps(results, indent=2, ensure_ascii=False)[:2000])
-
-    repeat = input("\n🔄 Do you want to check again for new discounts automatically? (y/n): ").strip().lower()
-    if repeat == "y":
-        interval_raw = input("⏱️ Enter interval (e.g., '60' for 60 sec or '5m' for 5 minutes): ").strip()
-        interval = int(interval_raw[:-1]) * 60 if interval_raw.endswith("m") else int(interval_raw)
-        max_rounds = int(input("🔢 How many rounds should I run? (0 = infinite): ").strip())
-        round_count = 0
-
-        print(f"🔁 Monitoring mode ON — checking every {interval} seconds. Stop after {max_rounds if max_rounds else '∞'} rounds.\n")
-
-        while True:
-            time.sleep(interval)
-            round_count += 1
-            print(f"\n🔄 Round {round_count} starting at {timestamp()} ...")
-            results, known_links, known_banners = scrape_products(url, user_limit, known_links, known_banners)
-            if results and (results["products"] or results["banners"]):
-                save_to_json(results)
-            else:
-                print("✅ No new products/banners found this round.")
-
-            if max_rounds > 0 and round_count >= max_rounds:
-                print(f"🛑 Stopping after {round_count} rounds.")
-                break
+    session = BrowserSession()  # reused by every round below
+
+    try:
+        # First detect product count
+        with browser_context(session) as context:
+            page = context.new_page()
+            page.goto(url, timeout=60000, wait_until="domcontentloaded")
+            plan, _ = check_layout(page, load_profile(url=url), url)
+            total_cards = plan.evaluate(page)["total"]
+
+        print(f"\n🔎 Detected {total_cards} product cards on the page.")
+        user_limit = int(input(f"👉 How many products do you want to scrape? (max {total_cards}): "))
+
+        with profiled("automated", enabled=PROFILE_ENABLED):
+            results, known_links, known_banners = scrape_products(url, user_limit, known_links, known_banners, sink=journal_sink(), session=session)
+        if results:
+            print("\n📊 Sample Output:")
+            print(json.dumps(results, indent=2, ensure_ascii=False, default=to_jsonable)[:2000])
+
+        repeat = input("\n🔄 Do you want to check again for new discounts automatically? (y/n): ").strip().lower()
+        if repeat == "y":
+            interval_raw = input("⏱️ Enter interval (e.g., '60' for 60 sec or '5m' for 5 minutes): ").strip()
+            interval = int(interval_raw[:-1]) * 60 if interval_raw.endswith("m") else int(interval_raw)
+            max_rounds = int(input("🔢 How many rounds should I run? (0 = infinite): ").strip())
+            adaptive = input("📈 Adapt the interval to how often the page changes? (y/n): ").strip().lower() == "y"
+            scheduler = AdaptiveScheduler(interval, state_file=Path("scheduler_state.json")) if adaptive else None
+            round_count = 0
+
+            mode = "adaptive, starting at" if adaptive else "every"
+            print(f"🔁 Monitoring mode ON — checking {mode} {interval} seconds. Stop after {max_rounds if max_rounds else '∞'} rounds.\n")
+
+            delay = interval
+            while True:
+                time.sleep(delay)
+                round_count += 1
+                print(f"\n🔄 Round {round_count} starting at {timestamp()} ...")
+                results, known_links, known_banners = scrape_products(url, user_limit, known_links, known_banners, sink=journal_sink(), session=session)
+                changed = bool(results and (results["products"] or results["banners"]))
+                if scheduler:
+                    if not results["total_found"]:
+                        delay = scheduler.record_failure(url)  # page never loaded: back off
+                    else:
+                        scheduler.record(url, changed)
+                        delay = scheduler.next_delay(url)
+                    print(f"⏳ Next check in {delay:.0f}s")
+                if not changed:
+                    print("✅ No new products/banners found this round.")
+                # Flat footprint: leaked browser processes killed, heap trimmed, numbers reported
+                print(f"🧠 Resources: {session.governor.round_done()}")
+
+                if max_rounds > 0 and round_count >= max_rounds:
+                    print(f"🛑 Stopping after {round_count} rounds.")
+                    break
+    finally:
+        session.close()  # no browser outlives the monitor
@@ -4,7 +4,7 @@ import time
 import json
 from pathlib import Path
 from playwright.sync_api import sync_playwright
-from sentence_transformers import SentenceTransformer
+from embeddings import get_embedder
 import chromadb
 import requests
 import io
@@ -14,9 +14,8 @@ import pytesseract
 # ----------------------------
 # Setup Embeddings & Storage
 # ----------------------------
-print("🚀 Loading embeddings model (paraphrase-MiniLM-L3-v2)...")
-model = SentenceTransformer("sentence-transformers/paraphrase-MiniLM-L3-v2")
-print("✅ Embeddings model loaded!")
+# Backend is picked with EMBEDDING_BACKEND=torch|int8|onnx|onnx-int8 (see embeddings.py)
+model = get_embedder()
 
 chroma_client = chromadb.Client()
 collection = chroma_client.create_collection("rakuten_content")
@@ -155,7 +154,12 @@ def index_page(url: str):
 
     collection.add(documents=texts, embeddings=embeddings, ids=ids)
 
-    print(f"✅ Indexed {len(texts)} snippets from {url}")
+    cache = model.cache_stats()
+    if cache:
+        print(f"✅ Indexed {len(texts)} snippets from {url} "
+              f"(embedding cache: {cache['hits']} hits / {cache['misses']} new, hit rate {cache['hit_rate']:.0%})")
+    else:
+        print(f"✅ Indexed {len(texts)} snippets from {url}")
     return len(texts)
 
 
@@ -4,7 +4,12 @@
 # - OCR (pytesseract) for banner images
 # - NLP (spaCy) for smarter product detection
 # - GoogleTranslator for JA→EN
+# - Selectors from the "generic" site profile (profiles/generic.json)
+# - Server-rendered HTML is tried first (http_fetch.py); Chromium only when it has no cards
+# - OCR banners that are the same text up to OCR noise are kept once (MinHash, near_dup.py)
+# - `python ai_scraper.py --profile` profiles the run, OCR threads included (profiling.py)
 
+import sys
 import time
 import json
 import re
@@ -18,6 +23,11 @@ from deep_translator import GoogleTranslator
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
 import spacy
+from selector_profiles import load_profile
+from records import parse_prices
+from http_fetch import FetchEngine
+from profiling import PROFILE_ENABLED, profiled
+from near_dup import NearDupIndex, banner_kind
 
 # ----------------------------
 # Setup
@@ -46,12 +56,6 @@ def clean_text(text: str) -> str:
     text = re.sub(r"[\\!/！＼／]", "", text)
     return text.strip()
 
-def safe_get_attribute(locator, attr, default=None):
-    try:
-        return locator.get_attribute(attr) or default
-    except Exception:
-        return default
-
 # ----------------------------
 # OCR for Images
 # ----------------------------
@@ -83,49 +87,29 @@ def extract_text_from_image(src: str, min_width: int = 200, min_height: int = 50
         print(f"⚠️ OCR error for {src}: {e}")
         return None
 
-def extract_text_from_images(page, max_images: int = 20):
-    img_selectors = "img[src*='banner'], img[src*='sale'], img[alt*='割引'], img[alt*='セール'], img[class*='banner']"
-    img_elements = page.locator(img_selectors).all()
-    banners, img_urls = [], []
+def extract_text_from_images(page, plan, max_images: int = 20):
+    found = plan.run(page, limit=max_images)
+    banners = []
+    img_urls = [img["src"] for img in found["items"] if img["src"].startswith("http")]
 
-    print(f"🔎 Found {len(img_elements)} potential banner images")
-    for img in img_elements[:max_images]:
-        src = safe_get_attribute(img, "src")
-        if src and src.startswith("http"):
-            img_urls.append(src)
+    print(f"🔎 Found {found['total']} potential banner images")
 
+    near, near_dups = NearDupIndex(":memory:"), 0  # the same banner text, OCR'd with different noise
     with ThreadPoolExecutor(max_workers=4) as executor:
         future_to_url = {executor.submit(extract_text_from_image, src): src for src in img_urls}
         for future in as_completed(future_to_url):
             result = future.result()
-            if result:
-                banners.append(result)
-
-    print(f"🖼️ OCR extracted {len(banners)} banners")
+            if not result:
+                continue
+            if near.seen(banner_kind(result["text_ja"], "ocr"), result["text_ja"], ref=result["image_url"]):
+                near_dups += 1
+                continue
+            banners.append(result)
+    near.close()
+
+    print(f"🖼️ OCR extracted {len(banners)} banners ({near_dups} near-duplicates dropped)")
     return banners
 
-# ----------------------------
-# Price Helpers
-# ----------------------------
-def parse_prices(text: str):
-    prices = re.findall(r"[0-9,]+円", text)
-    original_price, discounted_price, discount_percent = None, None, None
-
-    if len(prices) >= 2:
-        original_price, discounted_price = prices[0], prices[1]
-    elif len(prices) == 1:
-        discounted_price = prices[0]
-
-    try:
-        if original_price and discounted_price:
-            op = int(original_price.replace("円", "").replace(",", ""))
-            dp = int(discounted_price.replace("円", "").replace(",", ""))
-            discount_percent = round((1 - dp / op) * 100) if op > 0 else None
-    except:
-        discount_percent = None
-
-    return original_price, discounted_price, f"{discount_percent}%" if discount_percent else None
-
 # ----------------------------
 # NLP Smart Filtering
 # ----------------------------
@@ -144,95 +128,94 @@ def is_likely_product(text: str) -> bool:
 # ----------------------------
 # Scraping Products
 # ----------------------------
-def scrape_products(url: str, max_retries: int = 2, max_cards: int = 150):
+def cards_to_products(cards):
+    products = []
+    for idx, card in enumerate(cards):
+        text = card["text"]
+        if not is_likely_product(text):
+            continue
+
+        original_price, discounted_price, discount_percent = parse_prices(text)
+        title_ja = clean_text(text.split("\n")[0][:100])
+        if not title_ja or not discounted_price:
+            continue
+
+        products.append({
+            "title_ja": title_ja,
+            "title_en": cached_translate(title_ja),
+            "original_price": original_price,
+            "discounted_price": discounted_price,
+            "discount_percent": discount_percent,
+            "image_url": card["image_url"],
+            "link": card["link"],
+        })
+
+        if idx % 25 == 0:
+            print(f"✅ Processed {idx} cards...")
+    return products
+
+def scrape_products(url: str, max_retries: int = 2, max_cards: int = 150, profile: str = "generic"):
     print(f"🌐 Visiting: {url}")
     products, ocr_banners = [], []
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(viewport={"width": 1280, "height": 720})
-        page = context.new_page()
-
-        for attempt in range(max_retries):
-            try:
-                print(f"📡 Attempt {attempt + 1}/{max_retries} to load page")
-                page.goto(url, timeout=30000)
-                page.wait_for_load_state("domcontentloaded", timeout=15000)
-
-                product_selector = "div[class*='product'], div[class*='item'], div:has(img):has-text('円')"
-                page.wait_for_selector(product_selector, timeout=10000, state="visible")
-                print("✅ Product containers detected")
-
-                # Scroll to load
-                last_height = page.evaluate("document.body.scrollHeight")
-                for _ in range(10):
-                    page.mouse.wheel(0, 1500)
-                    time.sleep(0.5)
-                    new_height = page.evaluate("document.body.scrollHeight")
-                    if new_height == last_height:
-                        break
-                    last_height = new_height
-
-                print("✅ Page fully loaded")
-
-                # OCR banners
-                ocr_banners = extract_text_from_images(page)
-
-                # Product cards
-                product_cards = page.locator(product_selector).all()
-                print(f"🔎 Found {len(product_cards)} product cards")
-
-                for idx, card in enumerate(product_cards[:max_cards]):
-                    try:
-                        link = safe_get_attribute(card.locator("a[href*='rakuten']").first, "href")
-                        image_url = safe_get_attribute(card.locator("img").first, "src")
-
-                        try:
-                            text = card.evaluate("el => el.innerText") or ""
-                        except Exception:
-                            text = ""
-
-                        text = text.strip()
-                        if not is_likely_product(text):
-                            continue
-                        if not re.search(r"[0-9,]+円", text):
-                            continue
-
-                        original_price, discounted_price, discount_percent = parse_prices(text)
-                        title_ja = clean_text(text.split("\n")[0][:100])
-                        title_en = cached_translate(title_ja)
-
-                        if not title_ja or not discounted_price:
-                            continue
-
-                        products.append({
-                            "title_ja": title_ja,
-                            "title_en": title_en,
-                            "original_price": original_price,
-                            "discounted_price": discounted_price,
-                            "discount_percent": discount_percent,
-                            "image_url": image_url,
-                            "link": link,
-                        })
-
-                        if idx % 25 == 0:
-                            print(f"✅ Processed {idx} cards...")
-
-                    except Exception as e:
-                        print(f"⚠️ Error processing product card {idx}: {e}")
-                        continue
-
-                break  # success, stop retries
-
-            except TimeoutError:
-                print(f"⏳ Timeout on attempt {attempt + 1}, retrying...")
-                if attempt == max_retries - 1:
-                    print("❌ Max retries reached")
-
-        context.close()
-        browser.close()
+    profile = load_profile(profile)
+    products_plan = profile.plan("products")
+    engine = FetchEngine()
+    cheap = engine.try_cheap(url, profile)
+
+    if cheap is not None:
+        page, _ = cheap
+        ocr_banners = extract_text_from_images(page, profile.plan("banners"))
+        result = products_plan.run(page, limit=max_cards)
+        print(f"⚡ Static HTML: {result['total']} product cards")
+        products = cards_to_products(result["items"])
+    else:
+        with sync_playwright() as p:
+            browser = p.chromium.launch(headless=True)
+            context = browser.new_context(viewport={"width": 1280, "height": 720})
+            page = context.new_page()
+
+            for attempt in range(max_retries):
+                try:
+                    print(f"📡 Attempt {attempt + 1}/{max_retries} to load page")
+                    page.goto(url, timeout=30000)
+                    page.wait_for_load_state("domcontentloaded", timeout=15000)
+
+                    page.wait_for_selector(products_plan.container, timeout=10000, state="visible")
+                    print("✅ Product containers detected")
+
+                    # Scroll to load
+                    last_height = page.evaluate("document.body.scrollHeight")
+                    for _ in range(10):
+                        page.mouse.wheel(0, 1500)
+                        time.sleep(0.5)
+                        new_height = page.evaluate("document.body.scrollHeight")
+                        if new_height == last_height:
+                            break
+                        last_height = new_height
+
+                    print("✅ Page fully loaded")
+
+                    # OCR banners
+                    ocr_banners = extract_text_from_images(page, profile.plan("banners"))
+
+                    # Product cards: one evaluate() returns text/link/image of every candidate block
+                    result = products_plan.run(page, limit=max_cards)
+                    print(f"🔎 Found {result['total']} product cards")
+
+                    products = cards_to_products(result["items"])
+                    print(f"🧪 Field hit rates: {products_plan.stats.report()}")
+                    break  # success, stop retries
+
+                except TimeoutError:
+                    print(f"⏳ Timeout on attempt {attempt + 1}, retrying...")
+                    if attempt == max_retries - 1:
+                        print("❌ Max retries reached")
+
+            context.close()
+            browser.close()
 
     print(f"✅ Extracted {len(products)} products")
+    print(f"🌍 Fetch: {engine.report()}")
     return {"products": products, "ocr_banners": ocr_banners}
 
 # ----------------------------
@@ -253,11 +236,14 @@ def save_to_json(data, filename=DATA_FILE):
 if __name__ == "__main__":
     url = "https://event.rakuten.co.jp/campaign/supersale/?l-id=top_normal_emergency_pc_big01"
     start_time = time.time()
-    results = scrape_products(url)
-    if results:
-        save_to_json(results)
-        print("\n📊 Sample Output:")
-        print(json.dumps(results, indent=2, ensure_ascii=False)[:2000])
-    else:
-        print("❌ No results to save")
+    with profiled("ai_scraper", enabled=PROFILE_ENABLED or "--profile" in sys.argv[1:]) as profile:
+        results = scrape_products(url)
+        if results:
+            save_to_json(results)
+            print("\n📊 Sample Output:")
+            print(json.dumps(results, indent=2, ensure_ascii=False)[:2000])
+        else:
+            print("❌ No results to save")
+        if profile and results:
+            profile.summary.update({"products": len(results["products"]), "ocr_banners": len(results["ocr_banners"])})
     print(f"⏱️ Execution time: {time.time() - start_time:.2f} seconds")
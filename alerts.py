@@ -0,0 +1,344 @@
+# alerts.py
+# Incremental alert rules evaluated on each new / changed record in the save paths
+# - Rules live in alert_rules.json, e.g.
+#     {"name": "bags-60", "min_discount": 60, "keywords": ["バッグ", "bag"], "sinks": ["stdout", "file"]}
+#     {"name": "watch", "link": "https://item.rakuten.co.jp/...", "max_price": 3000,
+#      "sinks": [{"type": "webhook", "url": "https://hooks.example.com/..."}], "cooldown": 86400}
+#   Conditions (all must hold): link, keywords (any), min_discount (% off), max_price (¥), kind
+# - Each rule is indexed under ONE condition (link → dict, keywords → 2-char grams,
+#   thresholds → sorted lists + bisect); only candidates from the index are checked in
+#   full, so a record costs ~O(log rules + matches) instead of O(rules)
+# - Per (rule, item): the same price is alerted once (dedup) and a new price waits for
+#   the rule's cooldown; state is kept in alerts.db across runs and processes
+# - Alerts held back by a cooldown or a failed sink are kept in alerts.db (pending) and
+#   sent by a later save once due, even when that item does not change again
+#
+# Usage:
+#   python alerts.py list
+#   python alerts.py check [storage.json | ai_storage.json]   # dry run over stored items
+
+import json
+import sqlite3
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from pathlib import Path
+from typing import List
+
+from deal_feed import discount_percent, item_text
+from records import link_key, parse_price
+
+ALERT_RULES = Path("alert_rules.json")
+ALERTS_DB = Path("alerts.db")
+ALERT_LOG = Path("alerts.jsonl")
+DEFAULT_COOLDOWN = 6 * 3600   # seconds before the same rule fires again for the same item at a new price
+RETRY_DELAY = 60              # seconds before an alert whose sink failed is sent again
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sent (
+    rule TEXT NOT NULL,
+    item INTEGER NOT NULL,       -- link_key() of the product link / banner text
+    price INTEGER,
+    sent_at INTEGER NOT NULL,
+    PRIMARY KEY (rule, item)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pending (
+    rule TEXT NOT NULL,
+    item INTEGER NOT NULL,
+    price INTEGER,
+    due_at INTEGER NOT NULL,     -- end of the cooldown / next retry of a failed sink
+    alert TEXT NOT NULL,         -- the alert as JSON (latest observation of the item)
+    PRIMARY KEY (rule, item)
+) WITHOUT ROWID;
+"""
+
+def grams(text: str):
+    """Overlapping 2-char grams (single chars for 1-char text) of lowercased text."""
+    text = text.lower()
+    return {text[i:i + 2] for i in range(len(text) - 1)} or {text}
+
+# ----------------------------
+# Rules
+# ----------------------------
+class Rule:
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.kind = spec.get("kind", "product")
+        self.link = spec.get("link")
+        self.keywords = [k.lower() for k in spec.get("keywords", []) if k]
+        self.min_discount = spec.get("min_discount")
+        self.max_price = spec.get("max_price")
+        self.sinks = spec.get("sinks", ["stdout"])
+        self.cooldown = spec.get("cooldown", DEFAULT_COOLDOWN)
+
+    def matches(self, item, kind: str, price, discount, text: str) -> bool:
+        if kind != self.kind:
+            return False
+        if self.link and item.get("link") != self.link:
+            return False
+        if self.max_price is not None and (price is None or price > self.max_price):
+            return False
+        if self.min_discount is not None and (discount is None or discount < self.min_discount):
+            return False
+        return not self.keywords or any(k in text for k in self.keywords)
+
+class RuleIndex:
+    """Rules bucketed by their most selective condition."""
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        self.by_link = defaultdict(list)
+        self.by_gram = defaultdict(list)
+        self.max_price, self.min_discount, self.always = [], [], []
+        for rule in rules:
+            if rule.link:
+                self.by_link[rule.link].append(rule)
+            elif rule.keywords:
+                for keyword in rule.keywords:
+                    self.by_gram[keyword[:2]].append(rule)
+            elif rule.max_price is not None:
+                self.max_price.append((rule.max_price, rule))
+            elif rule.min_discount is not None:
+                self.min_discount.append((rule.min_discount, rule))
+            else:
+                self.always.append(rule)
+        self.max_price.sort(key=lambda t: t[0])
+        self.min_discount.sort(key=lambda t: t[0])
+        self._max_keys = [t[0] for t in self.max_price]
+        self._min_keys = [t[0] for t in self.min_discount]
+
+    def candidates(self, item, price, discount, text: str):
+        found = list(self.always)
+        found += self.by_link.get(item.get("link"), [])
+        for gram in grams(text) | set(text) if text else ():   # single chars: 1-char keywords
+            found += self.by_gram.get(gram, [])
+        if price is not None:
+            found += [rule for _, rule in self.max_price[bisect_left(self._max_keys, price):]]
+        if discount is not None:
+            found += [rule for _, rule in self.min_discount[:bisect_right(self._min_keys, discount)]]
+        return dict.fromkeys(found)   # a rule with several keywords may come up twice
+
+    def match(self, item, kind: str = "product") -> List[Rule]:
+        price = parse_price(item.get("discounted_price"))
+        discount = discount_percent(item)
+        text = item_text(item)
+        return [r for r in self.candidates(item, price, discount, text) if r.matches(item, kind, price, discount, text)]
+
+def load_rules(path=ALERT_RULES) -> List[Rule]:
+    path = Path(path)
+    if not path.exists():
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        return [Rule(spec) for spec in json.load(f)]
+
+_index_cache = {}
+
+def rule_index(path=ALERT_RULES) -> RuleIndex:
+    """Index rebuilt only when the rules file changes."""
+    path = Path(path)
+    mtime = path.stat().st_mtime if path.exists() else None
+    cached = _index_cache.get(str(path))
+    if cached is None or cached[0] != mtime:
+        cached = (mtime, RuleIndex(load_rules(path)))
+        _index_cache[str(path)] = cached
+    return cached[1]
+
+# ----------------------------
+# Sinks
+# ----------------------------
+class StdoutAlertSink:
+    def send(self, alerts: List[dict]):
+        for a in alerts:
+            item = a["item"]
+            if a["kind"] == "banner":
+                print(f"🔔 [{a['rule']}] {item.get('text_ja')} {item.get('image_url') or ''}")
+            else:
+                print(f"🔔 [{a['rule']}] {item.get('title_ja')} — {item.get('discounted_price')} "
+                      f"({a['discount'] if a['discount'] is not None else '-'}% off) {item.get('link') or ''}")
+
+class FileAlertSink:
+    def __init__(self, path=ALERT_LOG):
+        self.path = Path(path)
+
+    def send(self, alerts: List[dict]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for a in alerts:
+                f.write(json.dumps(a, ensure_ascii=False, default=str) + "\n")
+
+class WebhookAlertSink:
+    """POST {"alerts": [...]} as JSON (one request per save, not per alert)."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts: List[dict]):
+        from http_fetch import make_session
+        response = make_session(1).post(self.url, data=json.dumps({"alerts": alerts}, ensure_ascii=False, default=str),
+                                        headers={"Content-Type": "application/json"}, timeout=self.timeout)
+        response.raise_for_status()
+
+SINKS = {
+    "stdout": lambda spec: StdoutAlertSink(),
+    "file": lambda spec: FileAlertSink(spec.get("path", ALERT_LOG)),
+    "webhook": lambda spec: WebhookAlertSink(spec["url"], spec.get("timeout", 10)),
+}
+
+def make_sink(spec):
+    """"stdout" | {"type": "file", "path": ...} | {"type": "webhook", "url": ...}"""
+    spec = {"type": spec} if isinstance(spec, str) else spec
+    if spec["type"] not in SINKS:
+        raise ValueError(f"unknown alert sink '{spec['type']}' (choose from {', '.join(SINKS)})")
+    return SINKS[spec["type"]](spec)
+
+# ----------------------------
+# Engine
+# ----------------------------
+class AlertEngine:
+    def __init__(self, index: RuleIndex = None, path=ALERTS_DB):
+        self.index = index or rule_index()
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.stats = {"checked": 0, "matched": 0, "deduped": 0, "cooling_down": 0, "retried": 0, "sent": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _due(self, rule: Rule, key: int, price, now: int):
+        """0 when the alert is due, None when this price was already alerted, else the end of the cooldown."""
+        row = self.conn.execute("SELECT price, sent_at FROM sent WHERE rule = ? AND item = ?", (rule.name, key)).fetchone()
+        if row is None:
+            return 0
+        if row[0] == price:
+            self.stats["deduped"] += 1
+            return None
+        if now - row[1] < rule.cooldown:
+            self.stats["cooling_down"] += 1
+            return row[1] + rule.cooldown
+        return 0
+
+    def _defer(self, rule: Rule, key: int, price, due_at: int, alert: dict):
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO pending VALUES (?, ?, ?, ?, ?)",
+                              (rule.name, key, price, due_at, json.dumps(alert, ensure_ascii=False, default=str)))
+
+    def evaluate(self, items, kind: str = "product") -> List[tuple]:
+        """(rule, item key, price, alert) for every alert that is due for `items`; cooling ones are deferred."""
+        now = int(time.time())
+        due, seen = [], set()
+        for item in items:
+            self.stats["checked"] += 1
+            for rule in self.index.match(item, kind):
+                self.stats["matched"] += 1
+                key = link_key(item.get("link") or item_text(item))
+                price = parse_price(item.get("discounted_price"))
+                if (rule.name, key) in seen:
+                    continue
+                seen.add((rule.name, key))
+                until = self._due(rule, key, price, now)
+                if until is None:
+                    continue
+                alert = {"rule": rule.name, "kind": kind, "at": now, "discount": discount_percent(item), "item": dict(item)}
+                if until:
+                    self._defer(rule, key, price, until, alert)   # sent by a later save once the cooldown ends
+                    continue
+                due.append((rule, key, price, alert))
+        return due
+
+    def pending_due(self, skip=()) -> List[tuple]:
+        """Deferred alerts whose cooldown / retry delay is over (minus (rule, key) pairs in `skip`)."""
+        now = int(time.time())
+        rules = {rule.name: rule for rule in self.index.rules}
+        rows = self.conn.execute("SELECT rule, item, price, alert FROM pending WHERE due_at <= ?", (now,)).fetchall()
+        due, dropped = [], []
+        for name, key, price, raw in rows:
+            if (name, key) in skip:
+                continue   # a fresh observation of the item is being sent instead
+            alert = json.loads(raw)
+            rule = rules.get(name)
+            if rule is None or rule not in self.index.match(alert["item"], alert["kind"]):
+                dropped.append((name, key))   # the rule was removed or changed since
+                continue
+            until = self._due(rule, key, price, now)
+            if until is None:
+                dropped.append((name, key))
+            elif until:
+                self._defer(rule, key, price, until, alert)
+            else:
+                due.append((rule, key, price, alert))
+        with self.conn:
+            self.conn.executemany("DELETE FROM pending WHERE rule = ? AND item = ?", dropped)
+        self.stats["retried"] += len(due)
+        return due
+
+    def deliver(self, due: List[tuple]):
+        """
+        One send per sink (not per alert); alerts are marked as sent unless a sink
+        failed, in which case they stay pending and are retried after RETRY_DELAY.
+        """
+        now = int(time.time())
+        batches = defaultdict(list)
+        for i, (rule, _, _, _) in enumerate(due):
+            for spec in rule.sinks:
+                batches[json.dumps(spec, sort_keys=True)].append(i)
+        failed = set()
+        for spec, indexes in batches.items():
+            try:
+                make_sink(json.loads(spec)).send([due[i][3] for i in indexes])
+            except Exception as e:
+                print(f"⚠️ Alert sink {spec} failed: {e}")
+                failed.update(indexes)
+        for i in failed:
+            rule, key, price, alert = due[i]
+            self._defer(rule, key, price, now + RETRY_DELAY, alert)
+        sent = [(rule.name, key, price, now) for i, (rule, key, price, _) in enumerate(due) if i not in failed]
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO sent VALUES (?, ?, ?, ?)", sent)
+            self.conn.executemany("DELETE FROM pending WHERE rule = ? AND item = ?", [s[:2] for s in sent])
+        self.stats["sent"] += len(sent)
+
+def check_alerts(items, kind: str = "product", rules=ALERT_RULES) -> int:
+    """
+    Convenience wrapper for the save paths (an alert failure never fails a save).
+    Deferred alerts that are due go out with this save's alerts.
+    """
+    items = list(items)
+    try:
+        index = rule_index(rules)
+        if not index.rules:
+            return 0
+        with AlertEngine(index) as engine:
+            due = engine.evaluate(items, kind)
+            due += engine.pending_due(skip={(rule.name, key) for rule, key, _, _ in due})
+            engine.deliver(due)
+        return engine.stats["sent"]
+    except Exception as e:
+        print(f"⚠️ Could not evaluate alert rules: {e}")
+        return 0
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["list"]:
+        for rule in load_rules():
+            print(f"{rule.name}: {json.dumps({k: v for k, v in vars(rule).items() if v not in (None, [])}, ensure_ascii=False)}")
+    elif sys.argv[1:2] == ["check"]:
+        source = Path(sys.argv[2] if len(sys.argv) > 2 else "ai_storage.json")
+        with open(source, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        products = data if isinstance(data, list) else data.get("products", [])
+        banners = [] if isinstance(data, list) else data.get("banners", [])
+        index = rule_index()
+        hits = [(r.name, p) for p in products for r in index.match(p, "product")]
+        hits += [(r.name, b) for b in banners for r in index.match(b, "banner")]
+        for name, item in hits:
+            print(f"[{name}] {item.get('title_ja') or item.get('text_ja')} {item.get('discounted_price') or ''}")
+        print(f"🔔 {len(hits)} matches over {len(products)} products / {len(banners)} banners (dry run, nothing sent)")
+    else:
+        print("Usage: python alerts.py list | python alerts.py check [storage.json | ai_storage.json]")
@@ -0,0 +1,79 @@
+# bench_embeddings.py
+# Compare embedding backends on our own scraped snippets
+# - sentences/sec per backend (after one warm-up pass)
+# - recall@10 of each backend's nearest neighbours against the stock torch backend
+# - recall@10 of float16-stored torch vectors (what vector_index.py keeps on disk)
+#
+# Usage:
+#   python bench_embeddings.py                      # all backends
+#   python bench_embeddings.py torch int8           # a subset
+
+import json
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import BACKENDS, Embedder, as_storage
+
+K = 10
+
+def load_snippets():
+    """Titles, labels and banner texts from both JSON stores."""
+    texts = []
+    if Path("storage.json").exists():
+        for item in json.loads(Path("storage.json").read_text(encoding="utf-8")):
+            texts += [item.get("title_ja"), item.get("title_en"), item.get("discount_label_ja")]
+    if Path("ai_storage.json").exists():
+        data = json.loads(Path("ai_storage.json").read_text(encoding="utf-8"))
+        for item in data.get("products", []):
+            texts += [item.get("title_ja"), item.get("title_en"), item.get("discount_percent_ja")]
+        for banner in data.get("banners", []):
+            texts += [banner.get("text_ja"), banner.get("text_en")]
+    return sorted({t for t in texts if t})
+
+def neighbours(vectors: np.ndarray, k: int = K) -> np.ndarray:
+    vectors = vectors.astype(np.float32)
+    sims = vectors @ vectors.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argsort(-sims, axis=1)[:, :k]
+
+def recall(reference: np.ndarray, candidate: np.ndarray) -> float:
+    hits = sum(len(set(r) & set(c)) for r, c in zip(reference, candidate))
+    return hits / reference.size
+
+def run(backend: str, texts):
+    embedder = Embedder(backend, cache=False)  # measure the model, not the cache
+    embedder.encode(texts[:32])  # warm-up
+    start = time.perf_counter()
+    vectors = embedder.encode(texts)
+    elapsed = time.perf_counter() - start
+    return vectors, len(texts) / elapsed
+
+if __name__ == "__main__":
+    backends = sys.argv[1:] or list(BACKENDS)
+    texts = load_snippets()
+    if len(texts) <= K:
+        print("❌ Not enough scraped snippets to benchmark, run a scraper first")
+        sys.exit(1)
+    print(f"📚 {len(texts)} unique snippets")
+
+    baseline, base_rate = run("torch", texts)
+    reference = neighbours(baseline)
+    rows = [("torch", base_rate, 1.0), ("torch+fp16 storage", None, recall(reference, neighbours(as_storage(baseline))))]
+
+    for backend in backends:
+        if backend == "torch":
+            continue
+        try:
+            vectors, rate = run(backend, texts)
+        except Exception as e:
+            print(f"⚠️ {backend} unavailable: {e}")
+            continue
+        rows.append((backend, rate, recall(reference, neighbours(vectors))))
+
+    print(f"\n{'backend':<20} {'sent/s':>10} {'speedup':>8} {'recall@10':>10}")
+    for name, rate, rec in rows:
+        speed = f"{rate:10.1f} {rate / base_rate:7.2f}x" if rate else f"{'-':>10} {'-':>8}"
+        print(f"{name:<20} {speed} {rec:10.3f}")
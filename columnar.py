@@ -0,0 +1,283 @@
+# columnar.py
+# Bulk import of the JSON stores + partitioned Parquet / Arrow export
+# - Streams storage.json (Selenium schema: discount_label_*) and ai_storage.json
+#   (automated schema: discount_percent_*, plus banners) item by item — the indented
+#   JSON is never loaded whole — into one normalized, typed schema
+# - Writes export/products/scrape_date=YYYY-MM-DD/*.parquet (and export/banners/...),
+#   hive-partitioned by UTC scrape date; only the partitions present in the input are
+#   replaced, so re-exports are idempotent
+# - Analysts read it with predicate pushdown, e.g.
+#     pyarrow.dataset.dataset("export/products", partitioning="hive")
+#         .to_table(filter=(ds.field("scrape_date") >= "2025-09-10") & (ds.field("discount_percent") >= 50))
+# - Items without `scraped_at` (storage.json) are dated by the source file's mtime
+#
+# Usage:
+#   python columnar.py export [--format parquet|arrow] [--out export] [--inputs storage.json ai_storage.json]
+#   python columnar.py stats [--out export]
+
+import argparse
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+
+from deal_feed import discount_percent
+from records import link_key, parse_price, parse_timestamp
+
+EXPORT_DIR = Path("export")
+INPUTS = (Path("storage.json"), Path("ai_storage.json"))
+BATCH_ROWS = 50_000
+FORMATS = ("parquet", "arrow")
+
+# ----------------------------
+# Streaming JSON reader
+# ----------------------------
+_DELIMITERS = frozenset(" \t\r\n,]}")
+
+class JsonStream:
+    """
+    Yields (section, item) for the elements of a top-level array (section None) or of
+    the arrays under a top-level object's keys ({"products": [...], "banners": [...]}),
+    decoding one element at a time from a chunked buffer.
+    """
+
+    def __init__(self, f, chunk_size: int = 1 << 20):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buf, self.pos, self.eof = "", 0, False
+
+    def _fill(self) -> bool:
+        chunk = self.f.read(self.chunk_size)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk)
+
+    def _peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos].isspace():
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return None
+
+    def _expect(self, char: str):
+        if self._peek() != char:
+            raise ValueError(f"expected '{char}' at offset {self.pos}")
+        self.pos += 1
+
+    def _value(self):
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+                # A number is only complete before a delimiter ("12." + "5", "1e" + "3" span chunks)
+                number = isinstance(value, (int, float)) and not isinstance(value, bool)
+                if self.eof or (end < len(self.buf) and not (number and self.buf[end] not in _DELIMITERS)):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+    def _array(self, section):
+        self._expect("[")
+        while True:
+            char = self._peek()
+            if char == "]":
+                self.pos += 1
+                return
+            if char == ",":
+                self.pos += 1
+                continue
+            yield section, self._value()
+
+    def __iter__(self):
+        char = self._peek()
+        if char == "[":
+            yield from self._array(None)
+        elif char == "{":
+            self.pos += 1
+            while True:
+                char = self._peek()
+                if char in ("}", None):
+                    return
+                if char == ",":
+                    self.pos += 1
+                    continue
+                key = self._value()
+                self._expect(":")
+                if self._peek() == "[":
+                    yield from self._array(key)
+                else:
+                    self._value()   # scalar / object sections are not items
+
+# ----------------------------
+# Normalized schema
+# ----------------------------
+def _schemas():
+    import pyarrow as pa
+    products = pa.schema([
+        ("source", pa.string()),
+        ("title_ja", pa.string()),
+        ("title_en", pa.string()),
+        ("original_price", pa.int64()),
+        ("discounted_price", pa.int64()),
+        ("discount_percent", pa.int16()),
+        ("discount_label_ja", pa.string()),
+        ("discount_label_en", pa.string()),
+        ("image_url", pa.string()),
+        ("image_id", pa.string()),
+        ("link", pa.string()),
+        ("link_key", pa.int64()),
+        ("scraped_at", pa.timestamp("s", tz="UTC")),
+        ("scrape_date", pa.string()),
+    ])
+    banners = pa.schema([
+        ("source", pa.string()),
+        ("text_ja", pa.string()),
+        ("text_en", pa.string()),
+        ("image_url", pa.string()),
+        ("image_id", pa.string()),
+        ("scraped_at", pa.timestamp("s", tz="UTC")),
+        ("scrape_date", pa.string()),
+    ])
+    return {"products": products, "banners": banners}
+
+def _timestamp(item, fallback: int) -> int:
+    try:
+        return parse_timestamp(item.get("scraped_at")) or fallback
+    except ValueError:
+        return fallback
+
+def _date(epoch: int) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m-%d")
+
+def normalize_product(item: dict, source: str, fallback_ts: int) -> dict:
+    at = _timestamp(item, fallback_ts)
+    link = item.get("link")
+    return {
+        "source": source,
+        "title_ja": item.get("title_ja"),
+        "title_en": item.get("title_en"),
+        "original_price": parse_price(item.get("original_price")),
+        "discounted_price": parse_price(item.get("discounted_price")),
+        "discount_percent": discount_percent(item),
+        # Selenium: discount_label_*, automated: discount_percent_* (the same free-text label)
+        "discount_label_ja": item.get("discount_label_ja") or item.get("discount_percent_ja"),
+        "discount_label_en": item.get("discount_label_en") or item.get("discount_percent_en"),
+        "image_url": item.get("image_url"),
+        "image_id": item.get("image_id"),
+        "link": link,
+        "link_key": link_key(link) if link else None,
+        "scraped_at": at,
+        "scrape_date": _date(at),
+    }
+
+def normalize_banner(item: dict, source: str, fallback_ts: int) -> dict:
+    at = _timestamp(item, fallback_ts)
+    return {
+        "source": source,
+        "text_ja": item.get("text_ja"),
+        "text_en": item.get("text_en"),
+        "image_url": item.get("image_url"),
+        "image_id": item.get("image_id"),
+        "scraped_at": at,
+        "scrape_date": _date(at),
+    }
+
+def import_stores(inputs=INPUTS):
+    """Bulk importer: (kind, normalized row) for every item of every JSON store, streamed."""
+    for path in map(Path, inputs):
+        if not path.exists() or path.stat().st_size == 0:
+            continue
+        fallback_ts = int(path.stat().st_mtime)
+        with open(path, "r", encoding="utf-8") as f:
+            for section, item in JsonStream(f):
+                if section is None:   # storage.json: a bare list of Selenium products
+                    yield "products", normalize_product(item, "selenium", fallback_ts)
+                elif section == "products":
+                    yield "products", normalize_product(item, "automated", fallback_ts)
+                elif section == "banners":
+                    yield "banners", normalize_banner(item, "automated", fallback_ts)
+
+# ----------------------------
+# Export
+# ----------------------------
+def _batches(rows, schema):
+    import pyarrow as pa
+    buffer = []
+    for row in rows:
+        buffer.append(row)
+        if len(buffer) >= BATCH_ROWS:
+            yield pa.RecordBatch.from_pylist(buffer, schema=schema)
+            buffer = []
+    if buffer:
+        yield pa.RecordBatch.from_pylist(buffer, schema=schema)
+
+def export(inputs=INPUTS, out=EXPORT_DIR, fmt: str = "parquet") -> dict:
+    """Write the hive-partitioned datasets; returns {kind: {"rows", "files"}}."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format '{fmt}' (choose from {', '.join(FORMATS)})")
+    schemas = _schemas()
+    out = Path(out)
+    manifest = {}
+    for kind, schema in schemas.items():
+        # One pass per kind keeps memory at one batch; the JSON is re-streamed, not re-loaded
+        rows = (row for k, row in import_stores(inputs) if k == kind)
+        counted = {"rows": 0}
+
+        def count(batches):
+            for batch in batches:
+                counted["rows"] += batch.num_rows
+                yield batch
+
+        files = []
+        ds.write_dataset(
+            count(_batches(rows, schema)), out / kind, schema=schema,
+            format="parquet" if fmt == "parquet" else "ipc",
+            partitioning=ds.partitioning(pa.schema([("scrape_date", pa.string())]), flavor="hive"),
+            basename_template="part-{i}." + ("parquet" if fmt == "parquet" else "arrow"),
+            existing_data_behavior="delete_matching",
+            file_visitor=lambda written: files.append(os.path.relpath(written.path, out)),
+        )
+        manifest[kind] = {"rows": counted["rows"], "files": sorted(files)}
+    print(f"📦 Exported {manifest['products']['rows']} products and {manifest['banners']['rows']} banners to {out}/ ({fmt})")
+    return manifest
+
+def dataset_stats(out=EXPORT_DIR) -> dict:
+    """Rows per partition, read from file metadata only."""
+    import pyarrow.dataset as ds
+    stats = {}
+    for kind in ("products", "banners"):
+        root = Path(out) / kind
+        if not root.exists():
+            continue
+        partitions = {}
+        for path in sorted(root.rglob("part-*")):
+            fmt = "parquet" if path.suffix == ".parquet" else "ipc"
+            partition = str(path.relative_to(root).parent)
+            partitions[partition] = partitions.get(partition, 0) + ds.dataset(str(path), format=fmt).count_rows()
+        stats[kind] = partitions
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of the JSON stores and columnar export")
+    sub = parser.add_subparsers(dest="command", required=True)
+    ex = sub.add_parser("export")
+    ex.add_argument("--format", choices=FORMATS, default="parquet")
+    ex.add_argument("--out", type=Path, default=EXPORT_DIR)
+    ex.add_argument("--inputs", type=Path, nargs="+", default=list(INPUTS))
+    st = sub.add_parser("stats")
+    st.add_argument("--out", type=Path, default=EXPORT_DIR)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        print(json.dumps(export(args.inputs, args.out, args.format), indent=2))
+    else:
+        print(json.dumps(dataset_stats(args.out), indent=2))
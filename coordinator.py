@@ -0,0 +1,273 @@
+# coordinator.py
+# Multi-process sharded scraping with a shared work queue
+# - SQLite-backed queue (WAL) acts as a local stand-in broker: any process that
+#   can open the DB file can claim work, so extra workers can run on other nodes
+#   against a shared volume without code changes
+# - Work is sharded per URL and per card range (offset/limit) of a page
+# - Each worker is a separate process with its own GIL, browser and translator
+# - Results come back through the queue and are deduplicated centrally
+#
+# Examples:
+#   python coordinator.py run --url URL1 --url URL2 --limit 200 --shards 4 --workers 4
+#   python coordinator.py worker --db work_queue.db     # attach an extra worker
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import socket
+import sqlite3
+import sys
+import time
+import uuid
+from pathlib import Path
+
+from records import banner_key, link_key, to_jsonable
+
+QUEUE_DB = Path("work_queue.db")
+LEASE_SECONDS = 600     # a claimed shard is handed out again if its worker dies
+MAX_ATTEMPTS = 3
+
+# ----------------------------
+# Work queue
+# ----------------------------
+class WorkQueue:
+    """Durable job queue with leases, shared by the coordinator and all workers."""
+
+    def __init__(self, path=QUEUE_DB):
+        self.path = Path(path)
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                batch TEXT NOT NULL,
+                url TEXT NOT NULL,
+                card_offset INTEGER NOT NULL DEFAULT 0,
+                card_limit INTEGER NOT NULL,
+                with_banners INTEGER NOT NULL DEFAULT 1,
+                status TEXT NOT NULL DEFAULT 'pending',
+                worker TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_until REAL,
+                result TEXT,
+                error TEXT
+            )"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_batch ON jobs (batch)")
+
+    def enqueue(self, batch: str, url: str, card_offset: int, card_limit: int, with_banners: bool = True):
+        self.conn.execute(
+            "INSERT INTO jobs (batch, url, card_offset, card_limit, with_banners) VALUES (?, ?, ?, ?, ?)",
+            (batch, url, card_offset, card_limit, int(with_banners)),
+        )
+
+    def claim(self, worker: str, lease: float = LEASE_SECONDS, max_attempts: int = MAX_ATTEMPTS):
+        """
+        Atomically take the oldest pending (or lease-expired) job. A lease-expired job
+        that already used its attempts (its worker keeps crashing) is marked failed.
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                """UPDATE jobs SET status = 'failed', lease_until = NULL,
+                                   error = 'worker died (lease expired)'
+                   WHERE status = 'running' AND lease_until < ? AND attempts >= ?""",
+                (now, max_attempts),
+            )
+            row = self.conn.execute(
+                """SELECT id, url, card_offset, card_limit, with_banners FROM jobs
+                   WHERE status = 'pending' OR (status = 'running' AND lease_until < ? AND attempts < ?)
+                   ORDER BY id LIMIT 1""",
+                (now, max_attempts),
+            ).fetchone()
+            if row:
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', worker = ?, attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                    (worker, now + lease, row[0]),
+                )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if not row:
+            return None
+        return {"id": row[0], "url": row[1], "offset": row[2], "limit": row[3], "with_banners": bool(row[4])}
+
+    def complete(self, job_id: int, result: dict):
+        self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, lease_until = NULL WHERE id = ?",
+            (json.dumps(result, ensure_ascii=False, default=to_jsonable), job_id),
+        )
+
+    def fail(self, job_id: int, error: str, max_attempts: int = MAX_ATTEMPTS):
+        self.conn.execute(
+            """UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                               error = ?, lease_until = NULL WHERE id = ?""",
+            (max_attempts, error, job_id),
+        )
+
+    def progress(self, batch: str) -> dict:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM jobs WHERE batch = ? GROUP BY status", (batch,)).fetchall()
+        return dict(rows)
+
+    def results(self, batch: str):
+        for (raw,) in self.conn.execute("SELECT result FROM jobs WHERE batch = ? AND status = 'done' ORDER BY id", (batch,)):
+            yield json.loads(raw)
+
+    def purge(self, batch: str):
+        self.conn.execute("DELETE FROM jobs WHERE batch = ?", (batch,))
+
+    def close(self):
+        self.conn.close()
+
+# ----------------------------
+# Worker
+# ----------------------------
+def worker_loop(db_path=QUEUE_DB, worker_id: str = None, idle_exit: bool = True, poll: float = 1.0):
+    """Claim and run shards until the queue is empty (or forever if idle_exit is False)."""
+    from run_scraper import load_automated_scraper
+
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    scraper = load_automated_scraper()
+    queue = WorkQueue(db_path)
+    done = 0
+
+    while True:
+        job = queue.claim(worker_id)
+        if not job:
+            if idle_exit:
+                break
+            time.sleep(poll)
+            continue
+
+        print(f"👷 [{worker_id}] shard {job['id']}: {job['url']} cards {job['offset']}–{job['offset'] + job['limit']}")
+        try:
+            # Dedup happens centrally, so each shard starts with empty known sets
+            result, _, _ = scraper.scrape_products(
+                job["url"], job["limit"], set(), set(),
+                offset=job["offset"], with_banners=job["with_banners"],
+            )
+            if not result["total_found"]:
+                queue.fail(job["id"], "page did not load")
+            else:
+                queue.complete(job["id"], result)
+                done += 1
+        except Exception as e:
+            queue.fail(job["id"], repr(e))
+
+    queue.close()
+    print(f"👷 [{worker_id}] finished {done} shards")
+    return done
+
+# ----------------------------
+# Coordinator
+# ----------------------------
+def make_shards(urls, limit: int, shards_per_url: int):
+    """Split each URL into card ranges; only the first shard of a page collects banners."""
+    if not limit:
+        return [(url, 0, sys.maxsize, True) for url in urls]
+    shards_per_url = max(1, min(shards_per_url, limit))
+    size = -(-limit // shards_per_url)  # ceil
+    return [
+        (url, i * size, min(size, limit - i * size), i == 0)
+        for url in urls
+        for i in range(shards_per_url)
+        if i * size < limit
+    ]
+
+def merge_results(results):
+    """Central dedup across shards: products by link, banners by (image_url, text_ja)."""
+    merged = {"products": [], "banners": [], "total_found": 0}
+    seen_links, seen_banners = set(), set()
+    for result in results:
+        merged["total_found"] = max(merged["total_found"], result.get("total_found", 0))
+        for p in result["products"]:
+            key = link_key(p["link"])
+            if key not in seen_links:
+                seen_links.add(key)
+                merged["products"].append(p)
+        for b in result["banners"]:
+            key = banner_key(b["image_url"], b["text_ja"])
+            if key not in seen_banners:
+                seen_banners.add(key)
+                merged["banners"].append(b)
+    return merged
+
+def run_sharded(urls, limit: int = 0, shards_per_url: int = 1, workers: int = None,
+                db_path=QUEUE_DB, poll: float = 1.0, save: bool = True):
+    workers = workers or os.cpu_count() or 1
+    batch = uuid.uuid4().hex
+    queue = WorkQueue(db_path)
+
+    shards = make_shards(urls, limit, shards_per_url)
+    for url, offset, card_limit, with_banners in shards:
+        queue.enqueue(batch, url, offset, card_limit, with_banners)
+    print(f"🧩 Queued {len(shards)} shards for {len(urls)} URLs, starting {workers} workers")
+
+    start = time.time()
+    ctx = mp.get_context("spawn")  # fresh interpreter per worker, no inherited browser state
+    procs = [ctx.Process(target=worker_loop, args=(str(db_path),)) for _ in range(min(workers, len(shards)))]
+    for proc in procs:
+        proc.start()
+
+    while True:
+        status = queue.progress(batch)
+        if not status.get("pending") and not status.get("running"):
+            break
+        if not any(proc.is_alive() for proc in procs):
+            break  # every worker exited (crashed); leftovers stay queued for the next run
+        time.sleep(poll)
+    for proc in procs:
+        proc.join()
+
+    merged = merge_results(queue.results(batch))
+    status = queue.progress(batch)
+    if not status.get("pending") and not status.get("running"):
+        queue.purge(batch)
+    queue.close()
+
+    print(
+        f"✅ {status.get('done', 0)} shards done, {status.get('failed', 0)} failed in {time.time() - start:.1f}s — "
+        f"{len(merged['products'])} unique products, {len(merged['banners'])} unique banners"
+    )
+    if save and (merged["products"] or merged["banners"]):
+        from run_scraper import load_automated_scraper
+        load_automated_scraper().save_to_json(merged)
+    return merged, status
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main(argv=None) -> int:
+    from run_scraper import DEFAULT_URL, EXIT_OK, EXIT_PARTIAL, EXIT_ALL_FAILED
+
+    parser = argparse.ArgumentParser(description="Sharded multi-process Rakuten scraper")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_p = sub.add_parser("run", help="queue shards, start workers and merge the results")
+    run_p.add_argument("--url", dest="urls", action="append", help="page to scrape (repeatable)")
+    run_p.add_argument("--limit", type=int, default=0, help="products per page (needed for card sharding)")
+    run_p.add_argument("--shards", type=int, default=1, help="card shards per page")
+    run_p.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes")
+    run_p.add_argument("--db", type=Path, default=QUEUE_DB, help="queue database")
+
+    worker_p = sub.add_parser("worker", help="attach a worker to an existing queue")
+    worker_p.add_argument("--db", type=Path, default=QUEUE_DB, help="queue database")
+    worker_p.add_argument("--forever", action="store_true", help="keep polling when the queue is empty")
+
+    args = parser.parse_args(argv)
+    if args.command == "worker":
+        worker_loop(args.db, idle_exit=not args.forever)
+        return EXIT_OK
+
+    merged, status = run_sharded(args.urls or [DEFAULT_URL], args.limit, args.shards, args.workers, args.db)
+    if not status.get("done"):
+        return EXIT_ALL_FAILED
+    return EXIT_PARTIAL if status.get("failed") or status.get("pending") else EXIT_OK
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# deal_feed.py
+# Push feed of newly detected deals (event log in SQLite)
+# - The save paths append one event per new product, price change or new banner;
+#   the autoincrement id is the cursor clients resume from
+# - main.py streams the log over SSE (/feed/sse) and WebSocket (/feed/ws) with
+#   filter subscriptions (min discount, keywords, kind); GET /feed is the catch-up read
+# - One FeedHub per server process polls the log and fans events out to every
+#   subscriber, so N connected clients cost one indexed query per interval
+#
+# Usage:
+#   python deal_feed.py                # print the latest events
+#   python deal_feed.py <cursor>       # events after a cursor
+
+import asyncio
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from records import parse_price, to_jsonable
+
+FEED_DB = Path("deal_feed.db")
+POLL_INTERVAL = 1.0      # seconds between hub polls of the event log
+KEEPALIVE = 15.0         # seconds of silence before an SSE comment / WS ping
+READ_LIMIT = 500         # events per read (backlog replays page through this)
+QUEUE_SIZE = 1000        # per-subscriber buffer; a slower client is dropped and resumes by cursor
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    at INTEGER NOT NULL,
+    kind TEXT NOT NULL,          -- product | banner
+    change TEXT NOT NULL,        -- new | price_change
+    discount INTEGER,            -- percent off (products)
+    text TEXT NOT NULL,          -- lowercased ja + en text for keyword filters
+    payload TEXT NOT NULL        -- the item as JSON
+);
+"""
+
+def discount_percent(item) -> Optional[int]:
+    original = parse_price(item.get("original_price"))
+    discounted = parse_price(item.get("discounted_price"))
+    if not original or discounted is None or discounted > original:
+        return None
+    return round((original - discounted) * 100 / original)
+
+def item_text(item) -> str:
+    fields = ("title_ja", "title_en", "text_ja", "text_en")
+    return " ".join(str(item.get(f)) for f in fields if item.get(f)).lower()
+
+# ----------------------------
+# Event log
+# ----------------------------
+class DealFeed:
+    def __init__(self, path=FEED_DB):
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()    # reads run on asyncio.to_thread workers
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def publish(self, kind: str, items: Iterable, change: str = "new") -> int:
+        now = int(time.time())
+        rows = [
+            (now, kind, change, discount_percent(item) if kind == "product" else None, item_text(item),
+             json.dumps(item, ensure_ascii=False, default=to_jsonable))
+            for item in items
+        ]
+        with self.lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO events (at, kind, change, discount, text, payload) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def read(self, after: int = 0, limit: int = READ_LIMIT) -> List[dict]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, at, kind, change, discount, text, payload FROM events WHERE id > ? ORDER BY id LIMIT ?",
+                (after, limit),
+            ).fetchall()
+        return [
+            {"id": i, "at": at, "kind": kind, "change": change, "discount": discount, "text": text,
+             "item": json.loads(payload)}
+            for i, at, kind, change, discount, text, payload in rows
+        ]
+
+    def latest(self) -> int:
+        with self.lock:
+            return self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+
+def publish_items(kind: str, items, change: str = "new", path=FEED_DB) -> int:
+    """Convenience wrapper for the save paths (a feed failure never fails a save)."""
+    items = list(items)
+    if not items:
+        return 0
+    try:
+        with DealFeed(path) as feed:
+            return feed.publish(kind, items, change)
+    except Exception as e:
+        print(f"⚠️ Could not publish deal events: {e}")
+        return 0
+
+# ----------------------------
+# Subscriptions
+# ----------------------------
+class FeedFilter:
+    """Subscription filter: `kind`, minimum percent off, any-of keywords (case-insensitive)."""
+
+    def __init__(self, kind: str = None, min_discount: int = None, keywords: str = None):
+        self.kind = kind
+        self.min_discount = min_discount
+        self.keywords = [k.strip().lower() for k in (keywords or "").split(",") if k.strip()]
+
+    def __call__(self, event: dict) -> bool:
+        if self.kind and event["kind"] != self.kind:
+            return False
+        if self.min_discount is not None and (event["discount"] or 0) < self.min_discount:
+            return False
+        return not self.keywords or any(k in event["text"] for k in self.keywords)
+
+def public(event: dict) -> dict:
+    """Event as sent to clients (without the filter-only text column)."""
+    return {k: v for k, v in event.items() if k != "text"}
+
+class FeedHub:
+    """Single poller per process; subscribers get every new event on their own queue."""
+
+    def __init__(self, path=FEED_DB, interval: float = POLL_INTERVAL):
+        self.feed = DealFeed(path)
+        self.interval = interval
+        self.subscribers = set()
+        self.cursor = None
+        self.task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self._poll())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    async def _poll(self):
+        if self.cursor is None:
+            self.cursor = await asyncio.to_thread(self.feed.latest)
+        while self.subscribers:
+            events = await asyncio.to_thread(self.feed.read, self.cursor)
+            for event in events:
+                self.cursor = event["id"]
+                for queue in list(self.subscribers):
+                    try:
+                        queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self.unsubscribe(queue)   # too slow: the client reconnects with its cursor
+            if len(events) < READ_LIMIT:
+                await asyncio.sleep(self.interval)
+
+    async def stream(self, cursor: int = None, match: FeedFilter = None):
+        """
+        Async iterator of matching events: the backlog after `cursor` (if given), then live
+        events. Yields None after KEEPALIVE seconds of silence so callers can ping.
+        """
+        match = match or FeedFilter()
+        queue = self.subscribe()   # before the backlog read, so nothing falls in between
+        try:
+            last = cursor if cursor is not None else await asyncio.to_thread(self.feed.latest)
+            while cursor is not None:
+                backlog = await asyncio.to_thread(self.feed.read, last)
+                for event in backlog:
+                    last = event["id"]
+                    if match(event):
+                        yield event
+                if len(backlog) < READ_LIMIT:
+                    break
+            while queue in self.subscribers or not queue.empty():   # dropped when it falls behind
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=KEEPALIVE)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event["id"] <= last:
+                    continue   # already sent from the backlog
+                last = event["id"]
+                if match(event):
+                    yield event
+        finally:
+            self.unsubscribe(queue)
+
+if __name__ == "__main__":
+    with DealFeed() as feed:
+        after = int(sys.argv[1]) if len(sys.argv) > 1 else max(feed.latest() - 20, 0)
+        for event in feed.read(after):
+            item = event["item"]
+            title = item.get("title_ja") or item.get("text_ja") or ""
+            print(f"#{event['id']} {event['kind']} {event['change']} {event['discount'] or '-'}% {title[:60]}")
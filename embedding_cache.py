@@ -0,0 +1,100 @@
+# embedding_cache.py
+# On-disk text → vector cache in front of the embedder
+# - Campaign pages repeat the same snippets ("送料無料", "ポイント10倍", banner copy)
+#   on every URL; each unique text is embedded once per model/backend
+# - SQLite, keyed by a 128-bit hash of (model, backend, text); vectors stored as float16
+# - LRU eviction by last-used time once `max_entries` is exceeded
+# - Hit/miss counters for run stats
+
+import hashlib
+import sqlite3
+import time
+from pathlib import Path
+
+import numpy as np
+
+CACHE_DB = Path("embedding_cache.db")
+MAX_ENTRIES = 500_000   # ~0.4 KB per MiniLM vector in float16 → ~200 MB at the cap
+
+class EmbeddingCache:
+    def __init__(self, namespace: str, path=CACHE_DB, max_entries: int = MAX_ENTRIES):
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS vectors (
+                key BLOB PRIMARY KEY,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID"""
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS vectors_last_used ON vectors (last_used)")
+
+    def _key(self, text: str) -> bytes:
+        return hashlib.blake2b(f"{self.namespace}\x1f{text}".encode("utf-8"), digest_size=16).digest()
+
+    def get_many(self, texts) -> dict:
+        """{text: float32 vector} for the texts already cached (and mark them used)."""
+        keys = {self._key(t): t for t in set(texts)}
+        found = {}
+        key_list = list(keys)
+        for start in range(0, len(key_list), 500):  # stay under SQLite's variable limit
+            chunk = key_list[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT key, vector FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for key, blob in rows:
+                found[keys[key]] = np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+        if found:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany("UPDATE vectors SET last_used = ? WHERE key = ?",
+                                      [(now, self._key(t)) for t in found])
+        return found
+
+    def put_many(self, texts, vectors):
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+                [(self._key(t), np.asarray(v, dtype=np.float16).tobytes(), now) for t, v in zip(texts, vectors)],
+            )
+        self.evict()
+
+    def evict(self):
+        count = self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            with self.conn:
+                self.conn.execute(
+                    "DELETE FROM vectors WHERE key IN (SELECT key FROM vectors ORDER BY last_used LIMIT ?)", (excess,)
+                )
+
+    def encode(self, texts, encode_fn) -> np.ndarray:
+        """Vectors for `texts`, calling `encode_fn` only for texts never seen before."""
+        texts = list(texts)
+        cached = self.get_many(texts)
+        novel = list(dict.fromkeys(t for t in texts if t not in cached))
+        # Repeats inside one call count as hits: they are embedded once
+        self.misses += len(novel)
+        self.hits += len(texts) - len(novel)
+        if novel:
+            fresh = np.asarray(encode_fn(novel), dtype=np.float32)
+            self.put_many(novel, fresh)
+            cached.update(zip(novel, fresh))
+        return np.stack([cached[t] for t in texts])
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "entries": self.conn.execute("SELECT COUNT(*) FROM vectors").fetchone()[0],
+        }
+
+    def close(self):
+        self.conn.close()
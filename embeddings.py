@@ -0,0 +1,117 @@
+# embeddings.py
+# Selectable CPU embedding backends for paraphrase-MiniLM-L3-v2
+# - torch:     stock SentenceTransformer (baseline)
+# - int8:      PyTorch dynamic int8 quantization of the Linear layers
+# - onnx:      ONNX Runtime (sentence-transformers >= 3.2, `pip install optimum onnxruntime`)
+# - onnx-int8: ONNX Runtime with a dynamically quantized int8 graph (exported once, cached)
+# - Dynamic batching: texts are sorted by token length and packed under a token budget,
+#   so short snippets are not padded to the longest title in a fixed batch of 32
+# - Vectors are returned normalized; store them as float16 with `as_storage()`
+# - Repeated snippets are served from the on-disk embedding cache (embedding_cache.py);
+#   set EMBEDDING_CACHE=0 to always run the model
+
+import os
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+MODEL_NAME = "sentence-transformers/paraphrase-MiniLM-L3-v2"
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+USE_CACHE = os.environ.get("EMBEDDING_CACHE", "1") != "0"
+MODEL_CACHE = Path("models")
+STORAGE_DTYPE = np.float16
+
+def as_storage(vectors) -> np.ndarray:
+    """float16 halves the index size; cosine scores move by ~1e-3."""
+    return np.asarray(vectors, dtype=STORAGE_DTYPE)
+
+class Embedder:
+    def __init__(self, backend: str = DEFAULT_BACKEND, model_name: str = MODEL_NAME, max_tokens: int = 4096,
+                 cache: bool = USE_CACHE):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown embedding backend '{backend}' (choose from {', '.join(BACKENDS)})")
+        self.backend = backend
+        self.model_name = model_name
+        self.max_tokens = max_tokens
+        print(f"🚀 Loading embeddings model ({model_name}, backend={backend})...")
+        self.model = self._load()
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.cache = None
+        if cache:
+            from embedding_cache import EmbeddingCache
+            self.cache = EmbeddingCache(f"{model_name}|{backend}")
+        print("✅ Embeddings model loaded!")
+
+    def _load(self):
+        from sentence_transformers import SentenceTransformer
+
+        if self.backend == "torch":
+            return SentenceTransformer(self.model_name, device="cpu")
+
+        if self.backend == "int8":
+            import torch
+            model = SentenceTransformer(self.model_name, device="cpu")
+            return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if self.backend == "onnx":
+            return SentenceTransformer(self.model_name, device="cpu", backend="onnx")
+
+        # onnx-int8: export a quantized graph next to the other cached models once
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+        target = MODEL_CACHE / f"{self.model_name.split('/')[-1]}-onnx-int8"
+        quantized = target / "onnx" / "model_qint8_avx2.onnx"
+        if not quantized.exists():
+            print(f"🔧 Exporting int8 ONNX model to {target} (one time)...")
+            model = SentenceTransformer(self.model_name, device="cpu", backend="onnx")
+            model.save(str(target))
+            export_dynamic_quantized_onnx_model(model, "avx2", str(target))
+        return SentenceTransformer(str(target), device="cpu", backend="onnx",
+                                   model_kwargs={"file_name": "onnx/model_qint8_avx2.onnx"})
+
+    def token_lengths(self, texts):
+        tokenizer = self.model.tokenizer
+        encoded = tokenizer(list(texts), add_special_tokens=True, truncation=True,
+                            max_length=self.model.max_seq_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    def batches(self, texts):
+        """Yield lists of indices, longest-first, each under the padded token budget."""
+        lengths = self.token_lengths(texts)
+        order = sorted(range(len(texts)), key=lambda i: lengths[i], reverse=True)
+        batch, width = [], 0
+        for i in order:
+            width = max(width, lengths[i])  # first item of a batch is its longest
+            if batch and (len(batch) + 1) * width > self.max_tokens:
+                yield batch
+                batch, width = [], lengths[i]
+            batch.append(i)
+        if batch:
+            yield batch
+
+    def encode(self, texts, batch_size: int = None, show_progress_bar: bool = False, normalize: bool = True) -> np.ndarray:
+        """Drop-in for SentenceTransformer.encode (batch_size is ignored: batches are sized by tokens)."""
+        if isinstance(texts, str):
+            return self.encode([texts], normalize=normalize)[0]
+        texts = list(texts)
+        if not texts:
+            return np.empty((0, self.dim), dtype=np.float32)
+        if self.cache is not None and normalize:
+            return self.cache.encode(texts, self._encode)
+        return self._encode(texts, normalize)
+
+    def _encode(self, texts, normalize: bool = True) -> np.ndarray:
+        out = np.empty((len(texts), self.dim), dtype=np.float32)
+        for batch in self.batches(texts):
+            vectors = self.model.encode([texts[i] for i in batch], batch_size=len(batch),
+                                        normalize_embeddings=normalize, convert_to_numpy=True)
+            out[batch] = vectors
+        return out
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {}
+
+@lru_cache(maxsize=None)
+def get_embedder(backend: str = DEFAULT_BACKEND) -> Embedder:
+    return Embedder(backend)
@@ -0,0 +1,236 @@
+# http_fetch.py
+# Browserless fetch mode: pooled HTTP session + lxml parsing of the server-rendered HTML
+# - StaticPage runs the same selector-profile plans as the browser (ExtractionPlan.run),
+#   so callers get the same {"items", "stats", "total", "skipped"} result
+# - FetchEngine tries the cheap path first and escalates to the browser only when the
+#   profile's required selectors are missing, too few cards are in the initial HTML, or
+#   (without a card limit) the HTML shows the profile's lazy-load markers
+# - Cheap vs escalated page counts are kept in fetch_stats.json
+#
+# Usage:
+#   python http_fetch.py stats
+#   python http_fetch.py <url> [profile]     # try the cheap path on one page
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from urllib.parse import urljoin
+
+FETCH_MODE = os.environ.get("FETCH_MODE", "auto")   # auto | http | browser
+FETCH_MODES = ("auto", "http", "browser")
+FETCH_STATS = Path("fetch_stats.json")
+_HAS = re.compile(r"^(.*?):has\((.+)\)$")
+
+def make_session(workers: int = 8, headers: dict = None):
+    """requests.Session with a connection pool sized for `workers` threads and retries."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=workers,
+                          max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504)))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/116.0.0.0 Safari/537.36"
+    )
+    session.headers.update(headers or {})
+    return session
+
+# ----------------------------
+# Static page
+# ----------------------------
+_BLOCK_TAGS = {
+    "div", "p", "li", "ul", "ol", "br", "h1", "h2", "h3", "h4", "h5", "h6", "section", "article",
+    "header", "footer", "table", "tr", "td", "th", "dl", "dt", "dd", "figure", "figcaption",
+}
+
+def inner_text(el) -> str:
+    """Approximate innerText: block elements on their own lines, inline text joined, scripts dropped."""
+    out = []
+
+    def walk(node):
+        tag = node.tag if isinstance(node.tag, str) else None  # comments / processing instructions
+        if tag in ("script", "style", "noscript"):
+            return
+        if tag in _BLOCK_TAGS:
+            out.append("\n")
+        if tag and node.text:
+            out.append(node.text)
+        for child in node:
+            walk(child)
+            if child.tail:
+                out.append(child.tail)
+        if tag in _BLOCK_TAGS:
+            out.append("\n")
+
+    walk(el)
+    lines = (" ".join(line.split()) for line in "".join(out).split("\n"))
+    return "\n".join(line for line in lines if line)
+
+class StaticPage:
+    """Parsed HTML with the same plan interface as a Playwright page / Selenium driver."""
+
+    def __init__(self, url: str, html):
+        from lxml import html as lxml_html
+        self.url = url
+        self.tree = lxml_html.fromstring(html)
+        self._order = None
+
+    def serialize(self) -> str:
+        from lxml import html as lxml_html
+        return lxml_html.tostring(self.tree, encoding="unicode")
+
+    def images(self):
+        return [urljoin(self.url, src) for src in self.tree.xpath("//img/@src")]
+
+    def select(self, root, selector: str):
+        """cssselect plus `sel:has(inner)` (not supported by cssselect), in document order."""
+        found = []
+        for part in (p.strip() for p in selector.split(",")):
+            m = _HAS.match(part)
+            if m:
+                found += [el for el in root.cssselect(m.group(1) or "*") if el.cssselect(m.group(2))]
+            else:
+                found += root.cssselect(part)
+        if self._order is None:
+            self._order = {el: i for i, el in enumerate(self.tree.iter())}
+        return sorted(set(found), key=lambda el: self._order.get(el, 0))
+
+    def _read(self, el, field: dict):
+        nodes = self.select(el, field["selector"]) if field.get("selector") else [el]
+        if not nodes:
+            return None
+        node = nodes[0]
+        attrs = field.get("attr") or "text"
+        for attr in attrs if isinstance(attrs, list) else [attrs]:
+            value = inner_text(node) if attr == "text" else node.get(attr)
+            if value and field.get("absolute"):
+                value = urljoin(self.url, value)
+            if value and value.strip():
+                return value.strip()
+        return None
+
+    def extract(self, spec: dict, opts: dict) -> dict:
+        """Python twin of the compiled in-page function (selector_profiles._JS_EXTRACT)."""
+        containers = self.select(self.tree, spec["container"])
+        if spec.get("contains_text"):
+            containers = [el for el in containers if spec["contains_text"] in inner_text(el)]
+        start = opts.get("offset") or 0
+        limit = opts.get("limit") if opts.get("limit") is not None else spec.get("limit")
+        patterns = {name: re.compile(f["pattern"]) for name, f in spec["fields"].items() if f.get("pattern")}
+        items, stats, skipped = [], {}, 0
+        for el in containers[start:start + limit if limit is not None else None]:
+            values, ok = {}, True
+            for name, field in spec["fields"].items():
+                value = self._read(el, field)
+                status = "missing" if value is None else (
+                    "invalid" if name in patterns and not patterns[name].search(value) else "ok")
+                values[name] = value if status == "ok" else None
+                stats.setdefault(name, {"ok": 0, "missing": 0, "invalid": 0})[status] += 1
+                if field.get("required") and status != "ok":
+                    ok = False
+            if ok:
+                items.append(values)
+            else:
+                skipped += 1
+        return {"items": items, "stats": stats, "total": len(containers), "skipped": skipped}
+
+# ----------------------------
+# Engine
+# ----------------------------
+class FetchEngine:
+    def __init__(self, session=None, stats_file=FETCH_STATS):
+        self._session = session
+        self.stats_file = Path(stats_file)
+        self.stats = {"cheap": 0, "escalated": 0, "failed": 0}
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = make_session(headers={"Accept-Language": "ja,en;q=0.8"})
+        return self._session
+
+    def fetch(self, url: str):
+        """StaticPage for `url`, or None when the request fails."""
+        try:
+            response = self.session.get(url, timeout=20)
+            response.raise_for_status()
+            return StaticPage(response.url, response.content)  # bytes: lxml honours <meta charset>
+        except Exception as e:
+            print(f"⚠️ HTTP fetch failed for {url}: {e}")
+            self.stats["failed"] += 1
+            return None
+
+    def try_cheap(self, url: str, profile, needed: int = 1, mode: str = FETCH_MODE):
+        """
+        (StaticPage, products result) when the server-rendered HTML has what the profile
+        needs, else None (caller escalates to the browser). `mode="http"` never escalates.
+        `needed` of sys.maxsize or more (no --limit) asks for every card: the static HTML
+        is enough only when it shows none of the profile's lazy-load markers.
+        """
+        if mode == "browser":
+            return None
+        page = self.fetch(url)
+        if page is None and mode == "http":
+            return None
+        if page is not None:
+            from layout_drift import DRIFT_THRESHOLD, hit_rates
+            result = profile.plan("products").evaluate(page)
+            rates = hit_rates(result["stats"])
+            complete = all(rates.get(f, 0.0) >= DRIFT_THRESHOLD for f in profile.plan("products").required)
+            lazy = False
+            if needed >= sys.maxsize:
+                # Unlimited: every card is already in the HTML unless more load while scrolling
+                lazy = bool(profile.lazy_markers and page.select(page.tree, profile.lazy_markers))
+                needed = len(result["items"])
+            if mode == "http" or (result["total"] and complete and not lazy and len(result["items"]) >= needed):
+                self.record("cheap")
+                return page, result
+            if lazy:
+                print(f"🔁 Static HTML has {len(result['items'])} cards but loads more while scrolling, escalating to the browser")
+            else:
+                print(f"🔁 Static HTML has {len(result['items'])} usable cards (need {needed}), escalating to the browser")
+        self.record("escalated")
+        return None
+
+    def record(self, path: str):
+        self.stats[path] += 1
+        totals = load_stats(self.stats_file)
+        totals[path] = totals.get(path, 0) + 1
+        try:
+            self.stats_file.write_text(json.dumps(totals), encoding="utf-8")
+        except OSError:
+            pass
+
+    def report(self) -> str:
+        pages = self.stats["cheap"] + self.stats["escalated"]
+        return f"{self.stats['cheap']}/{pages} pages via HTTP, {self.stats['escalated']} escalated to the browser"
+
+def load_stats(path=FETCH_STATS) -> dict:
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["stats"]:
+        totals = load_stats()
+        pages = totals.get("cheap", 0) + totals.get("escalated", 0)
+        print(f"{totals.get('cheap', 0)}/{pages} pages took the cheap path ({totals})")
+    elif len(sys.argv) > 1:
+        from selector_profiles import load_profile
+        url = sys.argv[1]
+        profile = load_profile(sys.argv[2]) if len(sys.argv) > 2 else load_profile(url=url)
+        outcome = FetchEngine().try_cheap(url, profile, mode="http")
+        if outcome is None:
+            sys.exit(1)
+        page, result = outcome
+        print(json.dumps({k: result[k] for k in ("total", "skipped", "stats")}, indent=2, ensure_ascii=False))
+        print(json.dumps(result["items"][:5], indent=2, ensure_ascii=False))
+    else:
+        print("Usage: python http_fetch.py stats | python http_fetch.py <url> [profile]")
@@ -0,0 +1,177 @@
+# layout_drift.py
+# Layout-drift detection with automatic fallback to the price-text heuristic
+# - Right after DOMContentLoaded the profile's plan is probed for a few seconds:
+#   containers present and required fields hitting at least DRIFT_THRESHOLD
+# - A page that is still loading when the probe runs out gets up to SLOW_TIMEOUT more;
+#   if it never finishes that is a timeout (slow network), not drift: the profile's
+#   plan is kept and the check is logged as timed out, separately from selector misses
+# - On drift the scrape fails fast and switches to the "generic" profile
+#   (any block with an image and a "N円" price, parsed with records.parse_prices)
+#   instead of waiting out a 15 s selector timeout on every round
+# - Every check is appended to layout_drift.jsonl; `drift_summary()` / GET /layout-drift
+#   show per-profile drift rates and the latest field hit rates
+#
+# Usage:
+#   python layout_drift.py            # print the drift summary
+
+import json
+import time
+from pathlib import Path
+
+from records import parse_prices
+from selector_profiles import load_profile
+
+DRIFT_LOG = Path("layout_drift.jsonl")
+DRIFT_THRESHOLD = 0.5     # minimum hit rate of each required field
+PROBE_TIMEOUT = 4.0       # seconds to wait for the expected markup after DOMContentLoaded
+SLOW_TIMEOUT = 15.0       # extra seconds while the document is still loading
+PROBE_INTERVAL = 0.25
+PROBE_SAMPLE = 40         # containers inspected per probe
+FALLBACK_PROFILE = "generic"
+
+# ----------------------------
+# Detection
+# ----------------------------
+def hit_rates(stats: dict) -> dict:
+    out = {}
+    for field, counts in (stats or {}).items():
+        total = sum(counts.values())
+        out[field] = round(counts.get("ok", 0) / total, 3) if total else 0.0
+    return out
+
+def ready_state(target) -> str:
+    """
+    document.readyState of a Playwright page / Selenium driver ("loading" while it is
+    being replaced); parsed HTML (http_fetch.StaticPage, snapshots) is always complete.
+    """
+    if hasattr(target, "extract"):
+        return "complete"
+    try:
+        if hasattr(target, "execute_script"):
+            return target.execute_script("return document.readyState;")
+        return target.evaluate("document.readyState")
+    except Exception:
+        return "loading"
+
+def probe(target, plan, timeout: float = PROBE_TIMEOUT, threshold: float = DRIFT_THRESHOLD,
+          slow_timeout: float = SLOW_TIMEOUT) -> dict:
+    """
+    Poll the plan on a Playwright page / Selenium driver until the expected markup
+    shows up or `timeout` passes (+ `slow_timeout` while the document is still loading).
+    Returns a report with "drifted" set when the loaded page misses the selectors and
+    "timed_out" when it never finished loading.
+    """
+    start = time.monotonic()
+    while True:
+        try:
+            result = plan.evaluate(target, limit=PROBE_SAMPLE)
+        except Exception:
+            result = {"total": 0, "stats": {}}  # document still being replaced (redirect)
+        rates = hit_rates(result["stats"])
+        weak = [f for f in plan.required if rates.get(f, 0.0) < threshold]
+        elapsed = time.monotonic() - start
+        if result["total"] and not weak:
+            break
+        if elapsed >= timeout:
+            loading = ready_state(target) != "complete"
+            if not loading or elapsed >= timeout + slow_timeout:
+                break
+        time.sleep(PROBE_INTERVAL)
+
+    reason, timed_out = None, False
+    if not result["total"] or weak:
+        timed_out = ready_state(target) != "complete"
+    if timed_out:
+        reason = f"page still loading after {elapsed:.0f}s"
+    elif not result["total"]:
+        reason = f"no '{plan.container}' containers"
+    elif weak:
+        reason = "low hit rate: " + ", ".join(f"{f} {rates.get(f, 0.0):.0%}" for f in weak)
+    return {
+        "drifted": reason is not None and not timed_out,
+        "timed_out": timed_out,
+        "reason": reason,
+        "containers": result["total"],
+        "hit_rates": rates,
+        "probe_seconds": round(elapsed, 2),
+    }
+
+def check_layout(target, profile, url: str, timeout: float = PROBE_TIMEOUT):
+    """
+    Returns (products plan to use, report). On drift the plan comes from the
+    fallback profile; cards from it must go through `heuristic_card()`. A page
+    that timed out keeps the profile's plan (its cards may still render).
+    """
+    report = probe(target, profile.plan("products"), timeout=timeout)
+    report.update({"profile": profile.name, "url": url, "fallback": None})
+    if report["timed_out"]:
+        print(f"⏳ {profile.name}: {report['reason']} (a timeout, not layout drift); keeping the profile's selectors")
+        plan = profile.plan("products")
+    elif report["drifted"]:
+        print(f"⚠️ Layout drift on {profile.name} ({report['reason']}), falling back to the price-text heuristic")
+        fallback = load_profile(FALLBACK_PROFILE)
+        report["fallback"] = fallback.name
+        plan = fallback.plan("products")
+    else:
+        plan = profile.plan("products")
+    record_drift(report)
+    return plan, report
+
+# ----------------------------
+# Fallback
+# ----------------------------
+def heuristic_card(raw: dict):
+    """generic-profile block {text, image_url, link} → raw product card, or None."""
+    text = raw.get("text") or ""
+    original_price, discounted_price, discount_percent = parse_prices(text)
+    if not discounted_price or not raw.get("link"):
+        return None
+    title = next((line.strip() for line in text.split("\n") if line.strip() and "円" not in line), "")
+    return {
+        "idx": raw.get("idx"),
+        "title": title[:100],
+        "original_price": original_price,
+        "discounted_price": discounted_price,
+        "label": discount_percent,
+        "image_url": raw.get("image_url"),
+        "link": raw["link"],
+    }
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def record_drift(report: dict, path=DRIFT_LOG):
+    try:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"at": int(time.time()), **report}, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"⚠️ Could not record layout check: {e}")
+
+def drift_summary(path=DRIFT_LOG, last: int = 1000) -> dict:
+    """Per-profile check / drift / timeout counts over the last `last` checks."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        lines = f.readlines()[-last:]
+    summary = {}
+    for line in lines:
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue  # torn last line
+        s = summary.setdefault(entry["profile"], {"checks": 0, "drifts": 0, "timeouts": 0, "last_drift": None})
+        s["checks"] += 1
+        if entry.get("timed_out"):
+            s["timeouts"] += 1   # slow load: not counted as drift
+        elif entry["drifted"]:
+            s["drifts"] += 1
+            s["last_drift"] = {"at": entry["at"], "url": entry["url"], "reason": entry["reason"]}
+        s["last_hit_rates"] = entry["hit_rates"]
+        s["last_probe_seconds"] = entry["probe_seconds"]
+    for s in summary.values():
+        s["drift_rate"] = round(s["drifts"] / s["checks"], 3)
+    return summary
+
+if __name__ == "__main__":
+    print(json.dumps(drift_summary(), indent=2, ensure_ascii=False))
@@ -1,7 +1,31 @@
 # main.py
+import json
+import re
+import threading
 import time
-from fastapi import FastAPI, Query
-from scraper import scrape_rakuten_discounts, load_data
+from datetime import datetime, timezone
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
+from scraper import DATA_FILE, get_governor, scrape_rakuten_discounts, load_data
+from scheduler import AdaptiveScheduler, DEFAULT_SALE_WINDOWS, parse_sale_windows
+from price_history import PriceHistory
+from search_index import SearchIndex
+from translations import TranslationStore
+from layout_drift import DRIFT_LOG, drift_summary
+from thumbnails import ImageStore, thumb_path
+from deal_feed import DealFeed, FeedFilter, FeedHub, public
+from columnar import EXPORT_DIR, FORMATS, dataset_stats, export as export_stores
+from response_cache import ResponseCache
+from profiling import PROFILERS, profiled
+
+SCRAPE_URL = "rakuten_supersale"
+IMAGE_ID = re.compile(r"^[0-9a-f]{32}$")
+SCRAPE_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_vector_index = None
+_feed_hub = None
+_export_job = {"status": "idle"}   # the one background export (POST /export) and its manifest
+_export_lock = threading.Lock()
+response_cache = ResponseCache()   # ETag / 304 + pre-compressed bodies, per store version
 
 app = FastAPI()
 
@@ -10,27 +34,341 @@ def home():
     return {"message": "Rakuten Discounts Scraper API"}
 
 @app.get("/scrape")
-def run_scraper(interval: int = Query(default=0, description="Interval in seconds (0 = run once)")):
+def run_scraper(
+    interval: int = Query(default=0, description="Interval in seconds (0 = run once)"),
+    adaptive: bool = Query(default=False, description="Adapt the interval to how often the page changes"),
+    min_interval: int = Query(default=0, description="Lower bound for adaptive interval (0 = interval / 4)"),
+    max_interval: int = Query(default=0, description="Upper bound for adaptive interval (0 = interval * 4)"),
+    sale_windows: str = Query(default=",".join(DEFAULT_SALE_WINDOWS), description="JST windows checked more often, e.g. 20:00-02:00"),
+    profile: bool = Query(default=False, description="Profile the run (the first round with interval); artifacts go to profiling/"),
+    profiler: str = Query(default="cprofile", description="cprofile or pyinstrument"),
+):
     """
     Run scraper immediately.
     If interval > 0, it will scrape repeatedly every X seconds.
     Example: /scrape?interval=120  → scrape every 2 mins
+    With adaptive=true the interval shrinks while the page keeps changing
+    and grows while it stays the same.
+    Example: /scrape?interval=300&adaptive=true
+    With profile=true the run is wrapped in cProfile + tracemalloc.
+    Example: /scrape?profile=true
     """
+    if profiler not in PROFILERS:
+        raise HTTPException(status_code=400, detail=f"profiler must be one of {', '.join(PROFILERS)}")
+    try:
+        parse_sale_windows(sale_windows)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     results = []
+    profile_dir = None
+
+    def scrape_once(profile_run: bool):
+        nonlocal profile_dir
+        with profiled("scrape", enabled=profile_run, engine=profiler) as run:
+            data = scrape_rakuten_discounts()
+            if run:
+                run.summary["items"] = len(data)
+        if run:
+            profile_dir = str(run.dir)
+        return data
 
     if interval > 0:
+        scheduler = None
+        if adaptive:
+            scheduler = AdaptiveScheduler(
+                interval,
+                min_interval=min_interval or None,
+                max_interval=max_interval or None,
+                sale_windows=sale_windows,
+            )
+        last_seen = None
+
         # Repeat until stopped (Ctrl+C in server)
+        first = True
         while True:
-            data = scrape_rakuten_discounts()
+            data = scrape_once(profile and first)
+            first = False
             results = data
-            print(f"⏳ Waiting {interval} seconds before next scrape...")
-            time.sleep(interval)
+            delay = interval
+            if scheduler:
+                if not data:
+                    delay = scheduler.record_failure(SCRAPE_URL)
+                else:
+                    seen = {(item.get("link"), item.get("discounted_price")) for item in data}
+                    scheduler.record(SCRAPE_URL, changed=seen != last_seen)
+                    last_seen = seen
+                    delay = scheduler.next_delay(SCRAPE_URL)
+            print(f"🧠 Resources: {get_governor().round_done()}")
+            print(f"⏳ Waiting {delay:.0f} seconds before next scrape...")
+            time.sleep(delay)
     else:
-        results = scrape_rakuten_discounts()
+        results = scrape_once(profile)
 
-    return {"status": "success", "count": len(results), "data": results}
+    return {"status": "success", "count": len(results), "data": results, "resources": get_governor().stats,
+            "profile": profile_dir}
+
+@app.get("/resources")
+def resources():
+    """RSS of the server and its browser processes, browser launches and orphans killed."""
+    governor = get_governor()
+    governor.sample()
+    return governor.stats
 
 @app.get("/data")
-def get_data():
-    data = load_data()
-    return {"count": len(data), "data": data}
+def get_data(
+    request: Request,
+    lang: str = Query(default=None, description="Add title/label translations for this language, e.g. zh or ko"),
+):
+    """
+    Stored items. Example: /data?lang=zh adds title_zh / discount_label_zh from the translation table.
+    Send the returned ETag as If-None-Match: 304 until something new is scraped.
+    """
+    def build():
+        data = load_data()
+        if lang and lang not in ("ja", "en"):
+            with TranslationStore() as store:
+                data = store.localize(data, lang, {"title_ja": f"title_{lang}", "discount_label_ja": f"discount_label_{lang}"})
+        return {"count": len(data), "data": data}
+
+    return response_cache.respond(request, build, files=(DATA_FILE,))
+
+def parse_since(value: str) -> int:
+    """Accept epoch seconds or an ISO date/datetime (UTC if no offset)."""
+    if value.isdigit():
+        return int(value)
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"invalid time '{value}'")
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+@app.get("/history")
+def price_history(
+    request: Request,
+    link: str = Query(default=None, description="Product link"),
+    id: int = Query(default=None, description="Product id (as returned by /price-drops)"),
+    since: str = Query(default=None, description="Epoch seconds or ISO date"),
+    until: str = Query(default=None, description="Epoch seconds or ISO date"),
+):
+    """Price history of one product. Example: /history?link=https://...&since=2025-09-01"""
+    if link is None and id is None:
+        raise HTTPException(status_code=400, detail="link or id is required")
+
+    def build():
+        with PriceHistory() as store:
+            product = store.product(link=link, pid=id)
+            if not product:
+                raise HTTPException(status_code=404, detail="product not found")
+            history = store.history(
+                pid=product["id"],
+                since=parse_since(since) if since else None,
+                until=parse_since(until) if until else None,
+            )
+        return {"product": product, "count": len(history), "history": history}
+
+    return response_cache.respond(request, build)
+
+@app.get("/price-drops")
+def price_drops(
+    request: Request,
+    since: str = Query(description="Epoch seconds or ISO date"),
+    limit: int = Query(default=100, le=1000),
+):
+    """Items whose price is lower now than at `since`. Example: /price-drops?since=2025-09-10T00:00"""
+    def build():
+        with PriceHistory() as store:
+            drops = store.dropped_since(parse_since(since), limit=limit)
+        return {"count": len(drops), "data": drops}
+
+    return response_cache.respond(request, build)
+
+@app.get("/search")
+def search(
+    request: Request,
+    q: str = Query(description="Keywords (Japanese or English); all terms must match"),
+    kind: str = Query(default=None, description="product or banner"),
+    page: int = Query(default=1, ge=1),
+    page_size: int = Query(default=20, ge=1, le=100),
+):
+    """Ranked keyword search over titles and banner texts. Example: /search?q=半額 リュック"""
+    def build():
+        with SearchIndex() as index:
+            return index.search(q, kind=kind, page=page, page_size=page_size)
+
+    return response_cache.respond(request, build)
+
+@app.get("/layout-drift")
+def layout_drift(request: Request, last: int = Query(default=1000, ge=1, le=100000, description="Number of recent page checks")):
+    """Per-profile layout checks, drift rate, last drift reason and field hit rates."""
+    return response_cache.respond(request, lambda: drift_summary(last=last), files=(DRIFT_LOG,))
+
+@app.get("/thumbnails/{image_id}.webp")
+def thumbnail(image_id: str, request: Request):
+    """WebP thumbnail by content digest (the `image_id` of stored items). Immutable, so cached for a year."""
+    path = thumb_path(image_id) if IMAGE_ID.match(image_id) else None
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail="thumbnail not found")
+    etag = f'"{image_id}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/webp", headers=headers)
+
+@app.get("/thumbnail")
+def thumbnail_for(url: str = Query(description="Original image_url of a product or banner")):
+    """Redirect to the thumbnail of an image URL. Example: /thumbnail?url=https://tshop.r10s.jp/..."""
+    with ImageStore() as store:
+        image_id = store.image_ids([url]).get(url)
+    if not image_id:
+        raise HTTPException(status_code=404, detail="image not processed yet")
+    return RedirectResponse(f"/thumbnails/{image_id}.webp", headers={"Cache-Control": "public, max-age=3600"})
+
+def run_export(fmt: str):
+    try:
+        manifest = export_stores(fmt=fmt)
+        job = {"status": "done", "manifest": manifest}
+    except Exception as e:
+        print(f"❌ Export failed: {e}")
+        job = {"status": "failed", "error": str(e)}
+    with _export_lock:
+        _export_job.update(job, finished_at=int(time.time()))
+
+@app.post("/export", status_code=202)
+def export(background_tasks: BackgroundTasks, format: str = Query(default="parquet", description="parquet or arrow")):
+    """
+    Start re-exporting storage.json + ai_storage.json as datasets partitioned by scrape
+    date, in the background. Poll GET /export for the manifest, then download a
+    partition with /export/products/2025-09-10 (or banners).
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {', '.join(FORMATS)}")
+    with _export_lock:
+        if _export_job["status"] == "running":
+            raise HTTPException(status_code=409, detail="an export is already running")
+        _export_job.clear()
+        _export_job.update({"status": "running", "format": format, "started_at": int(time.time())})
+    background_tasks.add_task(run_export, format)
+    return dict(_export_job)
+
+@app.get("/export")
+def export_status():
+    """The last export's status / manifest and the rows per exported partition (file metadata only)."""
+    with _export_lock:
+        job = dict(_export_job)
+    return {**job, "partitions": dataset_stats()}
+
+@app.get("/export/{kind}/{scrape_date}")
+def export_partition(kind: str, scrape_date: str, format: str = Query(default="parquet", description="parquet or arrow")):
+    """One exported partition file (run POST /export first)."""
+    if kind not in ("products", "banners") or not SCRAPE_DATE.match(scrape_date) or format not in FORMATS:
+        raise HTTPException(status_code=400, detail="expected /export/{products|banners}/YYYY-MM-DD")
+    path = EXPORT_DIR / kind / f"scrape_date={scrape_date}" / f"part-0.{format}"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="partition not exported")
+    media_type = "application/vnd.apache.parquet" if format == "parquet" else "application/vnd.apache.arrow.file"
+    return FileResponse(path, media_type=media_type, filename=f"{kind}-{scrape_date}.{format}")
+
+def get_vector_index():
+    """Load the ANN index once per server process (numpy / sentence-transformers are imported lazily)."""
+    global _vector_index
+    if _vector_index is None:
+        from vector_index import VectorIndex
+        _vector_index = VectorIndex()
+    return _vector_index
+
+@app.get("/semantic-search")
+def semantic_search(
+    q: str = Query(description="Free-text query (Japanese or English)"),
+    k: int = Query(default=10, ge=1, le=100),
+    alpha: float = Query(default=0.7, ge=0, le=1, description="Weight of vector score vs keyword score"),
+    kind: str = Query(default=None, description="product or banner"),
+):
+    """Hybrid vector + keyword search. Build/refresh vectors with `python vector_index.py sync`."""
+    from vector_index import hybrid_search
+    index = get_vector_index()
+    result = hybrid_search(index, q, k=k, alpha=alpha, kind=kind)
+    result["ann_latency"] = index.latency.summary()
+    return result
+
+@app.get("/semantic-search/stats")
+def semantic_search_stats():
+    index = get_vector_index()
+    return {"vectors": len(index), "lists": 0 if index.centroids is None else len(index.centroids),
+            "nprobe": index.nprobe, "ann_latency": index.latency.summary()}
+
+# ----------------------------
+# Deal feed (push instead of polling /data)
+# ----------------------------
+def get_feed_hub() -> FeedHub:
+    """One event-log poller per server process, shared by every SSE / WebSocket client."""
+    global _feed_hub
+    if _feed_hub is None:
+        _feed_hub = FeedHub()
+    return _feed_hub
+
+@app.get("/feed")
+def feed(
+    cursor: int = Query(default=0, ge=0, description="Return events after this id"),
+    limit: int = Query(default=100, ge=1, le=500),
+    min_discount: int = Query(default=None, ge=0, le=100, description="Minimum percent off (products)"),
+    keywords: str = Query(default=None, description="Comma-separated; any must occur in the title/banner text"),
+    kind: str = Query(default=None, description="product or banner"),
+):
+    """Catch-up read of the deal feed. Pass the returned `cursor` back to continue."""
+    match = FeedFilter(kind, min_discount, keywords)
+    with DealFeed() as store:
+        events = store.read(cursor, limit)
+    return {
+        "cursor": events[-1]["id"] if events else cursor,
+        "events": [public(e) for e in events if match(e)],
+    }
+
+@app.get("/feed/sse")
+async def feed_sse(
+    request: Request,
+    cursor: int = Query(default=None, ge=0, description="Replay events after this id first (or send Last-Event-ID)"),
+    min_discount: int = Query(default=None, ge=0, le=100, description="Minimum percent off (products)"),
+    keywords: str = Query(default=None, description="Comma-separated; any must occur in the title/banner text"),
+    kind: str = Query(default=None, description="product or banner"),
+):
+    """
+    Server-sent events: one event per new product, price change or new banner.
+    Example: /feed/sse?min_discount=50&keywords=バッグ,bag
+    Browsers reconnect with Last-Event-ID automatically, so nothing is missed.
+    """
+    last_event_id = request.headers.get("last-event-id", "")
+    if cursor is None and last_event_id.isdigit():
+        cursor = int(last_event_id)
+    match = FeedFilter(kind, min_discount, keywords)
+
+    async def events():
+        yield "retry: 3000\n\n"
+        async for event in get_feed_hub().stream(cursor, match):
+            if await request.is_disconnected():
+                break
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            data = json.dumps(public(event), ensure_ascii=False)
+            yield f"id: {event['id']}\nevent: {event['kind']}\ndata: {data}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.websocket("/feed/ws")
+async def feed_ws(
+    websocket: WebSocket,
+    cursor: int = Query(default=None, ge=0),
+    min_discount: int = Query(default=None, ge=0, le=100),
+    keywords: str = Query(default=None),
+    kind: str = Query(default=None),
+):
+    """Same feed as /feed/sse as JSON messages; {"type": "ping"} is sent while idle."""
+    await websocket.accept()
+    try:
+        async for event in get_feed_hub().stream(cursor, FeedFilter(kind, min_discount, keywords)):
+            await websocket.send_json({"type": "ping"} if event is None else {"type": "event", **public(event)})
+    except WebSocketDisconnect:
+        pass
@@ -0,0 +1,267 @@
+# near_dup.py
+# Near-duplicate detection for noisy OCR banner text and product titles (MinHash + LSH)
+# - Text is NFKC-normalized, lowercased, common OCR misreads are undone (5O% → 50%,
+#   一 / — → ー) and whitespace, punctuation and decorative symbols (★ ！ 【】 ...) are
+#   stripped, then cut into character shingles (2-grams: Japanese has no word
+#   boundaries and OCR errors are single characters)
+# - A NUM_PERM-value MinHash signature estimates Jaccard similarity; signatures are cut
+#   into LSH bands whose buckets are indexed in near_dup.db, so a lookup reads a few
+#   buckets instead of comparing against the whole store
+# - Candidates from the buckets are confirmed on the estimated similarity (THRESHOLD)
+# - Namespaced by `kind`: banners by their numbers (banner_kind: "最大50%OFF" and
+#   "最大70%OFF" are different deals however similar the text), titles by image and
+#   price (title_kind); parameters are stored and the bands are rebuilt when the
+#   threshold changes
+#
+# Usage:
+#   index = NearDupIndex()
+#   match = index.seen(banner_kind(text_ja, "ocr"), text_ja, ref=image_url)   # None → new (and now indexed)
+#   python near_dup.py "テキスト1" "テキスト2"               # estimated similarity
+
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from records import parse_price
+
+NEAR_DUP_DB = Path("near_dup.db")
+THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0.7"))   # estimated Jaccard for "the same text"
+TITLE_THRESHOLD = 0.9   # titles: only decoration may differ ("M" vs "L" sizes score ~0.7)
+NUM_PERM = 128
+SHINGLE = 2
+NORMALIZE_VERSION = "2"   # bump when normalize() changes: stored signatures are rebuilt
+MERSENNE = (1 << 61) - 1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ref TEXT,                    -- caller's reference (image URL, link, ...)
+    text TEXT NOT NULL,
+    sig BLOB NOT NULL            -- NUM_PERM uint32 minimums
+);
+CREATE TABLE IF NOT EXISTS buckets (
+    kind TEXT NOT NULL,
+    bucket INTEGER NOT NULL,     -- 64-bit hash of (band number, the band's rows)
+    id INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS buckets_lookup ON buckets (kind, bucket);
+"""
+
+_SKIP = re.compile(r"\s+")
+_DASHES = str.maketrans({"一": "ー", "―": "ー", "—": "ー", "‐": "ー", "-": "ー"})   # long-vowel mark misreads
+_OCR_DIGITS = [   # letters OCR reads for digits, touching a number and not part of a word (5O% → 50%, l00 → 100)
+    (re.compile(r"(?<=\d)o+(?![a-z])|(?<![a-z])o+(?=\d)"), "0"),
+    (re.compile(r"(?<=\d)[il|]+(?![a-z])|(?<![a-z])[il|]+(?=\d)"), "1"),
+]
+
+def normalize(text: str) -> str:
+    """NFKC, lowercase, OCR misreads undone, no whitespace / punctuation / symbols (【SALE】★ → sale)."""
+    text = _SKIP.sub("", unicodedata.normalize("NFKC", text or "").lower()).translate(_DASHES)
+    for pattern, digit in _OCR_DIGITS:
+        text = pattern.sub(lambda m: digit * len(m.group()), text)
+    return "".join(c for c in text if unicodedata.category(c)[0] not in "PS")
+
+def numbers(text: str) -> list:
+    """The digit runs of the normalized text (1,980円 → ["1980"])."""
+    return re.findall(r"\d+", normalize(text))
+
+def shingles(text: str, k: int = SHINGLE) -> set:
+    text = normalize(text)
+    return {text[i:i + k] for i in range(len(text) - k + 1)} or ({text} if text else set())
+
+def jaccard(a: str, b: str) -> float:
+    sa, sb = shingles(a), shingles(b)
+    return len(sa & sb) / len(sa | sb) if sa and sb else 0.0
+
+@lru_cache(maxsize=None)
+def lsh_params(threshold: float, num_perm: int):
+    """(bands, rows) minimizing false positives below + false negatives above `threshold`."""
+    def area(f, lo, hi, steps=100):
+        width = (hi - lo) / steps
+        return sum(f(lo + (i + 0.5) * width) for i in range(steps)) * width
+
+    best, best_error = (1, num_perm), float("inf")
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        false_pos = area(lambda s: 1 - (1 - s ** rows) ** bands, 0.0, threshold)
+        false_neg = area(lambda s: (1 - s ** rows) ** bands, threshold, 1.0)
+        if false_pos + false_neg < best_error:
+            best, best_error = (bands, rows), false_pos + false_neg
+    return best
+
+# ----------------------------
+# MinHash
+# ----------------------------
+class MinHasher:
+    def __init__(self, num_perm: int = NUM_PERM, shingle: int = SHINGLE, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle = shingle
+        rng = np.random.RandomState(seed)   # fixed: signatures must be comparable across runs
+        self.a = rng.randint(1, MERSENNE, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, MERSENNE, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        grams = shingles(text, self.shingle)
+        if not grams:
+            return None
+        hashes = np.array(
+            [int.from_bytes(hashlib.blake2b(g.encode("utf-8"), digest_size=4).digest(), "little") for g in grams],
+            dtype=np.uint64,
+        )
+        # (a·x + b) mod p per permutation (uint64 wrap-around is part of the hash family)
+        permuted = (hashes[:, None] * self.a + self.b) % np.uint64(MERSENNE) & np.uint64(0xFFFFFFFF)
+        return permuted.min(axis=0).astype(np.uint32)
+
+def similarity(sig_a: np.ndarray, sig_b: np.ndarray) -> float:
+    return float(np.count_nonzero(sig_a == sig_b)) / len(sig_a)
+
+# ----------------------------
+# Index
+# ----------------------------
+class NearDupIndex:
+    def __init__(self, path=NEAR_DUP_DB, threshold: float = THRESHOLD, num_perm: int = NUM_PERM, shingle: int = SHINGLE):
+        self.threshold = threshold
+        self.hasher = MinHasher(num_perm, shingle)
+        self.bands, self.rows = lsh_params(threshold, num_perm)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        if str(path) != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._check_params()
+        self.stats = {"checked": 0, "duplicates": 0, "candidates": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _check_params(self):
+        stored = dict(self.conn.execute("SELECT key, value FROM meta"))
+        params = {"num_perm": str(self.hasher.num_perm), "shingle": str(self.hasher.shingle),
+                  "normalize": NORMALIZE_VERSION, "bands": str(self.bands), "rows": str(self.rows)}
+        if all(stored.get(k) == v for k, v in params.items()):
+            return
+        signature_params = ("num_perm", "shingle", "normalize")
+        with self.conn:
+            if stored and any(stored.get(k) != params[k] for k in signature_params):
+                print("⚠️ Near-duplicate signature parameters changed: index cleared")
+                self.conn.execute("DELETE FROM docs")
+                self.conn.execute("DELETE FROM meta")   # stores are backfilled again
+            # Same signatures, new threshold: only the band buckets change
+            self.conn.execute("DELETE FROM buckets")
+            docs = self.conn.execute("SELECT id, kind, sig FROM docs").fetchall()
+            self.conn.executemany("INSERT INTO buckets VALUES (?, ?, ?)", [
+                (kind, bucket, i) for i, kind, sig in docs for bucket in self._buckets(np.frombuffer(sig, dtype=np.uint32))
+            ])
+            self.conn.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", params.items())
+
+    def _buckets(self, sig: np.ndarray):
+        for band in range(self.bands):
+            rows = band.to_bytes(2, "big") + sig[band * self.rows:(band + 1) * self.rows].tobytes()
+            yield int.from_bytes(hashlib.blake2b(rows, digest_size=8).digest(), "big", signed=True)
+
+    def find(self, kind: str, text: str, sig: np.ndarray = None) -> Optional[dict]:
+        """Most similar indexed text of `kind` at or above the threshold, or None."""
+        sig = self.hasher.signature(text) if sig is None else sig
+        if sig is None:
+            return None
+        rows = self.conn.execute(
+            f"SELECT id, ref, text, sig FROM docs WHERE id IN "
+            f"(SELECT id FROM buckets WHERE kind = ? AND bucket IN ({', '.join('?' * self.bands)}))",
+            [kind, *self._buckets(sig)],
+        ).fetchall()
+        self.stats["candidates"] += len(rows)
+        best = None
+        for i, ref, stored, blob in rows:
+            score = similarity(sig, np.frombuffer(blob, dtype=np.uint32))
+            if score >= self.threshold and (best is None or score > best["similarity"]):
+                best = {"id": i, "ref": ref, "text": stored, "similarity": round(score, 3)}
+        return best
+
+    def add(self, kind: str, text: str, ref: str = None, sig: np.ndarray = None, commit: bool = True) -> Optional[int]:
+        sig = self.hasher.signature(text) if sig is None else sig
+        if sig is None:
+            return None
+        i = self.conn.execute("INSERT INTO docs (kind, ref, text, sig) VALUES (?, ?, ?, ?)",
+                              (kind, ref, text, sig.tobytes())).lastrowid
+        self.conn.executemany("INSERT INTO buckets VALUES (?, ?, ?)", [(kind, bucket, i) for bucket in self._buckets(sig)])
+        if commit:
+            self.conn.commit()
+        return i
+
+    def commit(self):
+        self.conn.commit()
+
+    def seen(self, kind: str, text: str, ref: str = None, threshold: float = None, commit: bool = True) -> Optional[dict]:
+        """
+        The near-duplicate already indexed, or None after indexing `text` as new.
+        `threshold` can only be stricter than the index's (the LSH bands are tuned for it).
+        With commit=False new texts are only visible to this index until commit(): a save
+        path commits after its JSON write, so a failed save does not mark texts as seen.
+        """
+        self.stats["checked"] += 1
+        sig = self.hasher.signature(text)
+        match = self.find(kind, text, sig)
+        if match is not None and match["similarity"] >= (threshold or 0):
+            self.stats["duplicates"] += 1
+            return match
+        self.add(kind, text, ref, sig, commit)
+        return None
+
+    def count(self, kind: str = None) -> int:
+        if kind is None:
+            return self.conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM docs WHERE kind = ?", (kind,)).fetchone()[0]
+
+    def backfill(self, name: str, records):
+        """Index the (kind, text, ref) records of an existing store, once per `name`."""
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = ?", (f"backfilled:{name}",)).fetchone():
+            return 0
+        added = sum(self.add(kind, text, ref, commit=False) is not None for kind, text, ref in records)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (f"backfilled:{name}", str(added)))
+        if added:
+            print(f"🧬 Indexed {added} existing {name} texts for near-duplicate checks")
+        return added
+
+def title_kind(item, source: str) -> str:
+    """Titles are only compared under the same image and price (size / colour variants differ there)."""
+    image = item.get("image_id") or item.get("image_url") or ""
+    return f"{source}:title:{image}:{parse_price(item.get('discounted_price'))}"
+
+def banner_kind(text: str, source: str) -> str:
+    """Banners are only compared when their numbers match (50% vs 70% OFF, 47 vs 41 倍 are different deals)."""
+    return f"{source}:banner:{'-'.join(numbers(text))}"
+
+def store_records(products, banners, source: str):
+    """(kind, text, ref) of a JSON store's items, for NearDupIndex.backfill."""
+    for p in products:
+        yield title_kind(p, source), p.get("title_ja") or "", p.get("link")
+    for b in banners:
+        yield banner_kind(b.get("text_ja") or "", source), b.get("text_ja") or "", b.get("image_url")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print('Usage: python near_dup.py "text 1" "text 2"')
+        sys.exit(2)
+    hasher = MinHasher()
+    a, b = sys.argv[1], sys.argv[2]
+    print(f"jaccard={jaccard(a, b):.3f} minhash={similarity(hasher.signature(a), hasher.signature(b)):.3f} "
+          f"threshold={THRESHOLD} bands/rows={lsh_params(THRESHOLD, NUM_PERM)}")
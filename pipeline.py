@@ -0,0 +1,309 @@
+# pipeline.py
+# Streaming result pipeline: extract → normalize → dedupe → translate (batched) → sink
+# - Extraction stays in the caller's thread (Playwright / Selenium are not thread-safe)
+#   and hands raw items over through a bounded queue
+# - The remaining stages are chained generators on one background thread, so
+#   translation of earlier cards overlaps with extraction of later ones
+# - Translation fans out to several target languages; each (text, language) pair is
+#   requested once and kept in a shared persistent cache (translations.py)
+# - Sinks persist items as they arrive (append-only journal), so a crash
+#   mid-run loses at most the item being written
+
+import json
+import os
+import queue
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+_DONE = object()
+
+# ----------------------------
+# Sinks
+# ----------------------------
+class ListSink:
+    """Keep items in memory (used when the caller needs the results back)."""
+
+    def __init__(self):
+        self.data = {"products": [], "banners": []}
+
+    def write(self, kind: str, item: dict):
+        self.data[kind].append(item)
+
+    def close(self):
+        return self.data
+
+class JournalSink:
+    """Append every item to a JSON Lines journal, then fold it into the store on close."""
+
+    def __init__(self, journal: Path, commit: Callable[[dict], None], fsync_every: int = 20, default=None):
+        self.journal = Path(journal)
+        self.commit = commit
+        self.default = default  # json `default=` hook for non-dict items (e.g. records)
+        self.fsync_every = fsync_every
+        self.count = 0
+        self.recover()
+        self.journal.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(self.journal, "a", encoding="utf-8")
+
+    def write(self, kind: str, item: dict):
+        self._f.write(json.dumps({"kind": kind, "item": item}, ensure_ascii=False, default=self.default) + "\n")
+        self.count += 1
+        self._f.flush()
+        if self.count % self.fsync_every == 0:
+            os.fsync(self._f.fileno())
+
+    def close(self):
+        self._f.close()
+        return self._fold()
+
+    def recover(self):
+        """Commit a journal left behind by a crashed run."""
+        if self.journal.exists() and self.journal.stat().st_size:
+            print(f"♻️ Recovering unsaved items from {self.journal}")
+            self._fold()
+
+    def _fold(self):
+        data = {"products": [], "banners": []}
+        with open(self.journal, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line after a crash
+                data[entry["kind"]].append(entry["item"])
+        if data["products"] or data["banners"]:
+            self.commit(data)
+        self.journal.unlink()
+        return data
+
+class TeeSink:
+    """Write to several sinks; close() returns the first sink's result."""
+
+    def __init__(self, *sinks):
+        self.sinks = sinks
+
+    def write(self, kind: str, item: dict):
+        for sink in self.sinks:
+            sink.write(kind, item)
+
+    def close(self):
+        results = [sink.close() for sink in self.sinks]
+        return results[0]
+
+# ----------------------------
+# Translation helper
+# ----------------------------
+def join_translate(texts: List[str], translate_one: Callable[[str], str], max_chars: int = 4500) -> List[str]:
+    """
+    Translate many short strings with few requests by sending them newline-joined.
+    Falls back to one request per string for a chunk whose line count comes back different.
+    """
+    out, chunk, size = [], [], 0
+
+    def flush():
+        if not chunk:
+            return
+        lines = (translate_one("\n".join(chunk)) or "").split("\n")
+        if len(lines) == len(chunk):
+            out.extend(line.strip() for line in lines)
+        else:
+            out.extend(translate_one(t) for t in chunk)
+        chunk.clear()
+
+    for text in texts:
+        text = " ".join(text.split())  # embedded newlines would break the line mapping
+        if chunk and size + len(text) + 1 > max_chars:
+            flush()
+            size = 0
+        chunk.append(text)
+        size += len(text) + 1
+    flush()
+    return out
+
+# ----------------------------
+# Stages
+# ----------------------------
+def batches(q: "queue.Queue", max_size: int) -> Iterator[List[Tuple[str, dict]]]:
+    """Block for one item, then take whatever else is already queued (up to max_size)."""
+    while True:
+        first = q.get()
+        if first is _DONE:
+            return
+        batch = [first]
+        while len(batch) < max_size:
+            try:
+                nxt = q.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _DONE:
+                yield batch
+                return
+            batch.append(nxt)
+        yield batch
+
+def normalize_stage(source, normalizers: Dict[str, Callable[[dict], Optional[dict]]]):
+    for batch in source:
+        out = []
+        for kind, raw in batch:
+            item = normalizers[kind](raw) if kind in normalizers else raw
+            if item:
+                out.append((kind, item))
+        yield out
+
+class TranslateStage:
+    """
+    Translate `src` fields into every target language with one batched call per
+    language per batch of items. The `record_lang` translation fills the `dst`
+    fields on the item; all languages go to the shared persistent `store`
+    (translations.TranslationStore), which is also checked before any request.
+    """
+
+    def __init__(self, translate_batch: Callable[[List[str], str], List[str]],
+                 fields: Dict[str, List[Tuple[str, str]]], targets: Iterable[str] = ("en",),
+                 store=None, record_lang: str = "en", cache_size: int = 2000):
+        self.translate_batch = translate_batch
+        self.fields = fields
+        self.targets = list(dict.fromkeys([record_lang, *targets]))
+        self.store = store
+        self.record_lang = record_lang
+        self.cache = OrderedDict()   # (lang, text) → translation
+        self.cache_size = cache_size
+        self.calls = 0
+        self.calls_by_lang = {lang: 0 for lang in self.targets}
+        self.store_hits = 0
+
+    def _lookup(self, texts: List[str], lang: str) -> Dict[str, str]:
+        found, missing = {}, []
+        for t in texts:
+            if (lang, t) in self.cache:
+                self.cache.move_to_end((lang, t))
+                found[t] = self.cache[(lang, t)]
+            else:
+                missing.append(t)
+        if missing and self.store is not None:
+            stored = self.store.get_many(missing, lang)
+            self.store_hits += len(stored)
+            found.update(stored)
+            missing = [t for t in missing if t not in stored]
+        fresh = []
+        if missing:
+            self.calls += 1
+            self.calls_by_lang[lang] += 1
+            try:
+                translated = self.translate_batch(missing, lang)
+            except Exception as e:
+                print(f"⚠️ Batch translation to {lang} failed ({e}), keeping original text")
+                translated = missing
+            for src, dst in zip(missing, translated):
+                found[src] = dst or src
+                if dst and dst != src:  # failures come back unchanged: retry them next time
+                    fresh.append((src, dst))
+        if fresh and self.store is not None:
+            self.store.put_many(lang, fresh)
+        for t in texts:
+            if t in found:
+                self.cache[(lang, t)] = found[t]
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return found
+
+    def __call__(self, source):
+        for batch in source:
+            if not batch:
+                continue
+            texts = sorted({item[src] for kind, item in batch for src, _ in self.fields.get(kind, []) if item.get(src)})
+            for lang in self.targets:
+                translated = self._lookup(texts, lang)
+                if lang != self.record_lang:
+                    continue  # side table only
+                for kind, item in batch:
+                    for src, dst in self.fields.get(kind, []):
+                        if dst not in item or item[dst] is None:
+                            item[dst] = translated.get(item[src]) if item.get(src) else item.get(src)
+            yield batch
+
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+
+def dedupe_stage(source, keys: Dict[str, Callable[[dict], object]], known: Dict[str, set], stats: dict):
+    """Drop items already seen (this run or earlier rounds) before they cost a translation."""
+    for batch in source:
+        out = []
+        for kind, item in batch:
+            key = keys[kind](item)
+            if key in known[kind]:
+                stats[f"duplicate_{kind}"] += 1
+                continue
+            known[kind].add(key)
+            out.append((kind, item))
+        yield out
+
+# ----------------------------
+# Pipeline
+# ----------------------------
+class Pipeline:
+    """
+    Usage:
+        pipe = Pipeline(normalizers, translate, keys, known, sink).start()
+        for card in cards:
+            pipe.put("products", raw)
+        data, stats = pipe.close()
+    """
+
+    def __init__(self, normalizers: dict, translate: TranslateStage, keys: dict, known: dict,
+                 sink, batch_size: int = 16, buffer_size: int = 64):
+        self.normalizers = normalizers
+        self.translate = translate
+        self.keys = keys
+        self.known = known
+        self.sink = sink
+        self.batch_size = batch_size
+        self.queue = queue.Queue(maxsize=buffer_size)  # back-pressure on extraction
+        self.stats = {"extracted": 0, "products": 0, "banners": 0,
+                      "duplicate_products": 0, "duplicate_banners": 0}
+        self.error = None
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name="result-pipeline", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, kind: str, raw: dict):
+        self.stats["extracted"] += 1
+        self.queue.put((kind, raw))
+
+    def _run(self):
+        try:
+            stream = batches(self.queue, self.batch_size)
+            stream = normalize_stage(stream, self.normalizers)
+            stream = dedupe_stage(stream, self.keys, self.known, self.stats)
+            for batch in self.translate(stream):
+                for kind, item in batch:
+                    self.sink.write(kind, item)
+                    self.stats[kind] += 1
+        except Exception as e:
+            self.error = e
+            print(f"❌ Pipeline error: {e}")
+            # Keep draining so put() never blocks on a dead consumer
+            while True:
+                try:
+                    if self.queue.get(timeout=0.5) is _DONE:
+                        break
+                except queue.Empty:
+                    if self._closing:
+                        break
+
+    def close(self):
+        self._closing = True
+        if self.error is None:
+            self.queue.put(_DONE)
+        self._thread.join()
+        self.stats["translate_calls"] = self.translate.calls
+        self.stats["translate_calls_by_lang"] = dict(self.translate.calls_by_lang)
+        self.stats["translation_cache_hits"] = self.translate.store_hits
+        self.translate.close()
+        return self.sink.close(), self.stats
@@ -0,0 +1,314 @@
+# price_history.py
+# Price-history time series per product (SQLite)
+# - One row per *change* of (original, discounted, label); unchanged rounds only bump last_seen
+# - Per-product clustered index: "history of X" is a single range scan
+# - products.last_drop_at index: "items whose price dropped since T" only visits candidates
+# - compact(): older observations are folded into one delta-encoded varint blob per product;
+#   record_items() runs it at most once a day for observations older than PRICE_HISTORY_COMPACT_DAYS
+#
+# Usage:
+#   python price_history.py compact [--older-than DAYS]
+
+import argparse
+import os
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from records import link_key, parse_price, parse_timestamp
+
+HISTORY_DB = Path("price_history.db")
+COMPACT_AFTER_DAYS = int(os.environ.get("PRICE_HISTORY_COMPACT_DAYS", "30"))  # 0 disables automatic compaction
+COMPACT_EVERY = 24 * 3600   # seconds between automatic compactions
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,              -- link_key() of the product link
+    link TEXT NOT NULL,
+    title_ja TEXT,
+    source TEXT,
+    first_seen INTEGER NOT NULL,
+    last_seen INTEGER NOT NULL,
+    last_change INTEGER NOT NULL,
+    cur_original INTEGER,
+    cur_discounted INTEGER,
+    cur_label INTEGER,
+    last_drop_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS products_last_drop ON products (last_drop_at);
+
+CREATE TABLE IF NOT EXISTS labels (
+    id INTEGER PRIMARY KEY,
+    text TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS observations (
+    product_id INTEGER NOT NULL,
+    observed_at INTEGER NOT NULL,
+    original INTEGER,
+    discounted INTEGER,
+    label INTEGER,
+    PRIMARY KEY (product_id, observed_at)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS packed (
+    product_id INTEGER PRIMARY KEY,
+    first_at INTEGER NOT NULL,
+    last_at INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    blob BLOB NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+
+# ----------------------------
+# Delta / varint encoding
+# ----------------------------
+_NONE = -1  # sentinel for a missing price/label before zigzag encoding
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+def _unzigzag(n: int) -> int:
+    return (n >> 1) ^ -(n & 1)
+
+def _write_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _read_varint(buf: bytes, pos: int):
+    result, shift = 0, 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        result |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return result, pos
+        shift += 7
+
+def encode_series(rows) -> bytes:
+    """rows: [(observed_at, original, discounted, label), ...] sorted by time → delta varints."""
+    out = bytearray()
+    prev = (0, 0, 0, 0)
+    for row in rows:
+        cur = tuple(_NONE if v is None else v for v in row)
+        for a, b in zip(cur, prev):
+            _write_varint(out, _zigzag(a - b))
+        prev = cur
+    return bytes(out)
+
+def decode_series(blob: bytes, count: int):
+    rows, pos = [], 0
+    prev = [0, 0, 0, 0]
+    for _ in range(count):
+        for i in range(4):
+            delta, pos = _read_varint(blob, pos)
+            prev[i] += _unzigzag(delta)
+        rows.append(tuple(None if (i and v == _NONE) else v for i, v in enumerate(prev)))
+    return rows
+
+# ----------------------------
+# Store
+# ----------------------------
+class PriceHistory:
+    def __init__(self, path=HISTORY_DB):
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._labels = dict(self.conn.execute("SELECT text, id FROM labels"))
+        self._label_names = {v: k for k, v in self._labels.items()}
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _label_id(self, text: Optional[str]) -> Optional[int]:
+        if not text:
+            return None
+        if text not in self._labels:
+            self.conn.execute("INSERT OR IGNORE INTO labels (text) VALUES (?)", (text,))
+            label_id = self.conn.execute("SELECT id FROM labels WHERE text = ?", (text,)).fetchone()[0]
+            self._labels[text] = label_id
+            self._label_names[label_id] = text
+        return self._labels[text]
+
+    def record_many(self, items: Iterable, source: str = "automated", observed_at: Optional[int] = None) -> int:
+        """Record a round of observations. Returns how many products changed price/label."""
+        now = int(observed_at or time.time())
+        changed = 0
+        with self.conn:
+            for item in items:
+                link = item.get("link")
+                if not link:
+                    continue
+                pid = link_key(link)
+                at = parse_timestamp(item.get("scraped_at")) or now
+                original = parse_price(item.get("original_price"))
+                discounted = parse_price(item.get("discounted_price"))
+                label = self._label_id(item.get("discount_percent_ja") or item.get("discount_label_ja"))
+
+                row = self.conn.execute(
+                    "SELECT cur_original, cur_discounted, cur_label, last_change FROM products WHERE id = ?", (pid,)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute(
+                        """INSERT INTO products (id, link, title_ja, source, first_seen, last_seen, last_change,
+                                                 cur_original, cur_discounted, cur_label)
+                           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                        (pid, link, item.get("title_ja"), source, at, at, at, original, discounted, label),
+                    )
+                elif (row[0], row[1], row[2]) == (original, discounted, label) or at <= row[3]:
+                    # Unchanged (or out-of-order): only extend the "still seen" window
+                    self.conn.execute("UPDATE products SET last_seen = MAX(last_seen, ?) WHERE id = ?", (at, pid))
+                    continue
+                else:
+                    dropped = discounted is not None and row[1] is not None and discounted < row[1]
+                    self.conn.execute(
+                        """UPDATE products SET last_seen = ?, last_change = ?, cur_original = ?, cur_discounted = ?,
+                                               cur_label = ?, last_drop_at = CASE WHEN ? THEN ? ELSE last_drop_at END
+                           WHERE id = ?""",
+                        (at, at, original, discounted, label, dropped, at, pid),
+                    )
+                changed += 1
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO observations VALUES (?, ?, ?, ?, ?)",
+                    (pid, at, original, discounted, label),
+                )
+        return changed
+
+    # ----------------------------
+    # Queries
+    # ----------------------------
+    def _series(self, pid: int, since: Optional[int] = None, until: Optional[int] = None) -> List[tuple]:
+        rows = []
+        packed = self.conn.execute("SELECT first_at, last_at, count, blob FROM packed WHERE product_id = ?", (pid,)).fetchone()
+        if packed and (since is None or packed[1] >= since) and (until is None or packed[0] <= until):
+            rows.extend(decode_series(packed[3], packed[2]))
+        rows.extend(self.conn.execute(
+            """SELECT observed_at, original, discounted, label FROM observations
+               WHERE product_id = ? AND observed_at >= ? AND observed_at <= ? ORDER BY observed_at""",
+            (pid, since if since is not None else -2**62, until if until is not None else 2**62),
+        ))
+        return [r for r in rows if (since is None or r[0] >= since) and (until is None or r[0] <= until)]
+
+    def _label_text(self, label_id):
+        return self._label_names.get(label_id) if label_id is not None else None
+
+    def product(self, link: str = None, pid: int = None) -> Optional[dict]:
+        pid = pid if pid is not None else link_key(link)
+        row = self.conn.execute(
+            "SELECT id, link, title_ja, source, first_seen, last_seen, cur_original, cur_discounted FROM products WHERE id = ?",
+            (pid,),
+        ).fetchone()
+        if not row:
+            return None
+        keys = ("id", "link", "title_ja", "source", "first_seen", "last_seen", "original_price", "discounted_price")
+        return dict(zip(keys, row))
+
+    def history(self, link: str = None, pid: int = None, since: int = None, until: int = None) -> List[dict]:
+        pid = pid if pid is not None else link_key(link)
+        return [
+            {"observed_at": at, "original_price": o, "discounted_price": d, "label": self._label_text(l)}
+            for at, o, d, l in self._series(pid, since, until)
+        ]
+
+    def price_at(self, pid: int, at: int) -> Optional[int]:
+        """Discounted price in effect at time `at` (last change at or before it)."""
+        series = self._series(pid, until=at)
+        return series[-1][2] if series else None
+
+    def dropped_since(self, since: int, limit: int = 100) -> List[dict]:
+        """Products whose current price is below the price they had at `since`."""
+        out = []
+        candidates = self.conn.execute(
+            """SELECT id, link, title_ja, cur_original, cur_discounted, last_drop_at FROM products
+               WHERE last_drop_at >= ? ORDER BY last_drop_at DESC""",
+            (since,),
+        )
+        for pid, link, title, cur_original, cur_discounted, drop_at in candidates:
+            before = self.price_at(pid, since)
+            if before is None:  # first seen after `since`: compare with the first observed price
+                series = self._series(pid)
+                before = series[0][2] if series else None
+            if before is None or cur_discounted is None or cur_discounted >= before:
+                continue
+            out.append({
+                "id": pid, "link": link, "title_ja": title,
+                "price_before": before, "price_now": cur_discounted, "original_price": cur_original,
+                "drop": before - cur_discounted, "drop_percent": round((before - cur_discounted) / before * 100, 1),
+                "dropped_at": drop_at,
+            })
+            if len(out) >= limit:
+                break
+        return out
+
+    # ----------------------------
+    # Compaction
+    # ----------------------------
+    def compact(self, older_than: int) -> int:
+        """Fold observations older than `older_than` into the per-product delta blob."""
+        moved = 0
+        with self.conn:
+            pids = [r[0] for r in self.conn.execute(
+                "SELECT DISTINCT product_id FROM observations WHERE observed_at < ?", (older_than,))]
+            for pid in pids:
+                old = list(self.conn.execute(
+                    """SELECT observed_at, original, discounted, label FROM observations
+                       WHERE product_id = ? AND observed_at < ? ORDER BY observed_at""", (pid, older_than)))
+                packed = self.conn.execute("SELECT count, blob FROM packed WHERE product_id = ?", (pid,)).fetchone()
+                series = (decode_series(packed[1], packed[0]) if packed else []) + old
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO packed VALUES (?, ?, ?, ?, ?)",
+                    (pid, series[0][0], series[-1][0], len(series), encode_series(series)),
+                )
+                self.conn.execute("DELETE FROM observations WHERE product_id = ? AND observed_at < ?", (pid, older_than))
+                moved += len(old)
+        return moved
+
+    def compact_if_due(self, older_than_days: int = COMPACT_AFTER_DAYS, now: Optional[int] = None) -> int:
+        """compact() observations older than `older_than_days`, at most once per COMPACT_EVERY."""
+        if older_than_days <= 0:
+            return 0
+        now = int(now or time.time())
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'last_compact'").fetchone()
+        if row and now - row[0] < COMPACT_EVERY:
+            return 0
+        moved = self.compact(now - older_than_days * 86400)
+        with self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('last_compact', ?)", (now,))
+        return moved
+
+def record_items(items, source: str = "automated", path=HISTORY_DB) -> int:
+    """Convenience wrapper for the save paths."""
+    try:
+        with PriceHistory(path) as store:
+            changed = store.record_many(items, source=source)
+            store.compact_if_due()
+            return changed
+    except Exception as e:
+        print(f"⚠️ Could not record price history: {e}")
+        return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Price history store")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cp = sub.add_parser("compact", help="fold old observations into the delta-encoded blobs")
+    cp.add_argument("--older-than", type=int, default=COMPACT_AFTER_DAYS or 30, metavar="DAYS",
+                    help="compact observations older than this many days (default: %(default)s)")
+    args = parser.parse_args()
+
+    with PriceHistory() as store:
+        moved = store.compact(int(time.time()) - args.older_than * 86400)
+    print(f"🗜️ Compacted {moved} observations older than {args.older_than} days")
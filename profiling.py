@@ -0,0 +1,200 @@
+# profiling.py
+# Opt-in profiling of one scrape run (run_scraper.py --profile, /scrape?profile=true,
+# ai_scraper.py --profile, snapshots.py reprocess --profile, or SCRAPE_PROFILE=1)
+# - cProfile on the calling thread AND on every thread started during the run (pipeline
+#   translation, thumbnail downloads, OCR workers): one profiler per thread up to Python
+#   3.11; from 3.12 cProfile sits on the interpreter-wide sys.monitoring, so a single
+#   profiler already sees every thread (and a second one cannot be enabled)
+# - pyinstrument instead with --profiler pyinstrument (sampling, calling thread only)
+# - tracemalloc for the top allocation sites and the traced peak
+# - Artifacts go to profiling/<UTC time>-<name>/ next to the run summary (summary.json):
+#     profile.prof       pstats dump (snakeviz / flameprof / gprof2dot)
+#     profile.html, profile.speedscope.json   (pyinstrument)
+#     allocations.txt    top allocation sites
+# - summary.json splits the time into browser, translation, OCR, JSON and SQLite work
+#
+# Usage:
+#   with profiled("run_scraper", enabled=args.profile) as run:
+#       ...                                   # run.summary["rounds"] = 3 (extra fields)
+#   python -m pstats profiling/<run>/profile.prof
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+PROFILE_DIR = Path("profiling")
+PROFILE_ENABLED = os.environ.get("SCRAPE_PROFILE", "0") == "1"
+PROFILERS = ("cprofile", "pyinstrument")
+TRACE_FRAMES = 10
+TOP = 25
+PER_THREAD = sys.version_info < (3, 12)   # 3.12+: one cProfile per interpreter, covering all threads
+
+# Where the time went: time spent inside each component, entered from outside it
+COMPONENTS = {
+    "browser": re.compile(r"[/\\](playwright|selenium)[/\\]"),
+    "translation": re.compile(r"[/\\](googletrans|deep_translator|httpcore|httpx)[/\\]"),
+    "ocr": re.compile(r"[/\\](pytesseract|spacy)[/\\]"),
+    "json": re.compile(r"[/\\]json[/\\]"),
+    "sqlite": re.compile(r"sqlite3"),
+}
+
+def _label(func) -> str:
+    filename, line, name = func
+    return f"{filename}:{line}({name})" if filename != "~" else name
+
+# ----------------------------
+# Thread-aware cProfile
+# ----------------------------
+class ThreadProfiles:
+    """
+    One cProfile.Profile per thread; threads started while active enable their own
+    (PER_THREAD only: from 3.12 the calling thread's profiler already covers them).
+    """
+
+    def __init__(self):
+        self.profiles = [cProfile.Profile()]
+        self.lock = threading.Lock()
+
+    def _start_thread(self, frame, event, arg):
+        sys.setprofile(None)   # replaced by the thread's own profiler
+        try:
+            profile = cProfile.Profile()
+            profile.enable()
+        except Exception:
+            return   # runs inside the thread's bootstrap: never keep its target from running
+        with self.lock:
+            self.profiles.append(profile)
+
+    def start(self):
+        if PER_THREAD:
+            threading.setprofile(self._start_thread)
+        self.profiles[0].enable()
+
+    def stop(self) -> pstats.Stats:
+        if PER_THREAD:
+            threading.setprofile(None)
+        self.profiles[0].disable()
+        stats = pstats.Stats(self.profiles[0], stream=io.StringIO())
+        for profile in self.profiles[1:]:
+            try:
+                stats.add(profile)   # worker threads still running are snapshotted as they are
+            except TypeError:
+                pass   # a thread that made no profiled call yet
+        return stats
+
+def components(stats: pstats.Stats) -> dict:
+    """Seconds per COMPONENTS entry: cumulative time of calls crossing into it."""
+    totals = dict.fromkeys(COMPONENTS, 0.0)
+    for func, (_, _, _, ct, callers) in stats.stats.items():
+        for name, pattern in COMPONENTS.items():
+            if not pattern.search(_label(func)):
+                continue
+            if not callers:
+                totals[name] += ct   # called straight from the profiled block
+            for caller, edge in callers.items():
+                if not pattern.search(_label(caller)):
+                    totals[name] += edge[3]
+    return {name: round(seconds, 3) for name, seconds in totals.items()}
+
+def top_functions(stats: pstats.Stats, n: int = TOP) -> list:
+    rows = sorted(stats.stats.items(), key=lambda kv: kv[1][3], reverse=True)[:n]
+    return [
+        {"function": _label(func), "calls": nc, "own_s": round(tt, 4), "cumulative_s": round(ct, 4)}
+        for func, (_, nc, tt, ct, _) in rows
+    ]
+
+# ----------------------------
+# Run
+# ----------------------------
+class ProfileRun:
+    def __init__(self, name: str, engine: str = "cprofile", out=PROFILE_DIR):
+        if engine not in PROFILERS:
+            raise ValueError(f"unknown profiler '{engine}' (choose from {', '.join(PROFILERS)})")
+        self.name = name
+        self.engine = engine
+        self.dir = Path(out) / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}-{name}"
+        self.summary = {}   # extra fields from the caller (round stats, exit code, ...)
+        self.profiler = None
+
+    def start(self):
+        self.tracing = not tracemalloc.is_tracing()   # leave a caller's tracemalloc session running
+        if self.tracing:
+            tracemalloc.start(TRACE_FRAMES)
+        if self.engine == "pyinstrument":
+            from pyinstrument import Profiler  # optional: only needed with --profiler pyinstrument
+            self.profiler = Profiler(async_mode="disabled")
+        else:
+            self.profiler = ThreadProfiles()
+        self.started, self.cpu = time.time(), time.process_time()
+        self.profiler.start()
+        return self
+
+    def stop(self) -> Path:
+        """Stop profiling and write the artifacts; returns the run directory."""
+        wall, cpu = time.time() - self.started, time.process_time() - self.cpu
+        profiler_result = self.profiler.stop()
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        if self.tracing:
+            tracemalloc.stop()
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        summary = {
+            "name": self.name,
+            "profiler": self.engine,
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).strftime("%Y-%m-%d %H:%M:%S UTC"),
+            "wall_s": round(wall, 3),
+            "cpu_s": round(cpu, 3),
+            "traced_peak_mb": round(peak / 1024 / 1024, 1),
+            "traced_current_mb": round(current / 1024 / 1024, 1),
+        }
+        if self.engine == "pyinstrument":
+            from pyinstrument.renderers import SpeedscopeRenderer
+            (self.dir / "profile.html").write_text(self.profiler.output_html(), encoding="utf-8")
+            (self.dir / "profile.speedscope.json").write_text(
+                self.profiler.output(SpeedscopeRenderer()), encoding="utf-8")
+        else:
+            profiler_result.dump_stats(str(self.dir / "profile.prof"))
+            if PER_THREAD:
+                summary["threads"] = len(self.profiler.profiles)
+            summary["components_s"] = components(profiler_result)
+            summary["top_functions"] = top_functions(profiler_result)
+
+        allocations = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)]).statistics("lineno")[:TOP]
+        with open(self.dir / "allocations.txt", "w", encoding="utf-8") as f:
+            for stat in allocations:
+                f.write(f"{stat.size / 1024:10.1f} KiB  {stat.count:8d} blocks  {stat.traceback}\n")
+        summary["top_allocations"] = [
+            {"site": str(stat.traceback), "kib": round(stat.size / 1024, 1), "blocks": stat.count}
+            for stat in allocations[:10]
+        ]
+        summary.update(self.summary)
+        with open(self.dir / "summary.json", "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False, default=str)
+        print(f"🔬 Profile saved to {self.dir}/ ({wall:.1f}s wall, {cpu:.1f}s CPU, traced peak {summary['traced_peak_mb']} MB)")
+        return self.dir
+
+@contextmanager
+def profiled(name: str, enabled: bool = PROFILE_ENABLED, engine: str = "cprofile", out=PROFILE_DIR):
+    """Profile the block when `enabled` (yields the ProfileRun, or None when disabled)."""
+    if not enabled:
+        yield None
+        return
+    run = ProfileRun(name, engine, out).start()
+    try:
+        yield run
+    finally:
+        try:
+            run.stop()
+        except Exception as e:
+            print(f"⚠️ Could not save profile: {e}")  # profiling never fails the run
@@ -0,0 +1,208 @@
+# records.py
+# Compact in-memory product / banner records
+# - __slots__ instead of per-item dicts
+# - Interned discount labels (a handful of distinct values shared by every card)
+# - Integer prices (yen) and epoch timestamps for comparisons and keys
+# - 64-bit hashed (link, price) keys for the monitor's "already seen" sets
+# - Slot names match the stored JSON schema, and prices keep the scraped string
+#   ("1,980円(税込)") next to the integer when format_price() would not rebuild it,
+#   so to_dict() gives back what was scraped
+
+import hashlib
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S UTC"
+
+# ----------------------------
+# Keys
+# ----------------------------
+def hash_key(*parts) -> int:
+    """Stable 64-bit key (Python's hash() is salted per process)."""
+    raw = "\x1f".join("" if p is None else str(p) for p in parts).encode("utf-8")
+    return int.from_bytes(hashlib.blake2b(raw, digest_size=8).digest(), "big", signed=True)
+
+def link_key(link: str) -> int:
+    return hash_key(link)
+
+def product_key(link: str, discounted_price: Optional[int]) -> int:
+    """Dedup key for a product observation: a price change makes it "new" again."""
+    return hash_key(link, discounted_price)
+
+def banner_key(image_url: str, text_ja: str) -> int:
+    return hash_key(image_url, text_ja)
+
+# ----------------------------
+# Prices / timestamps
+# ----------------------------
+_AMOUNT = re.compile(r"[0-9][0-9,]*")
+_YEN_AMOUNT = re.compile(r"[¥￥]\s*([0-9][0-9,]*)|([0-9][0-9,]*)\s*円")
+
+def parse_price(text) -> Optional[int]:
+    """
+    "5,980円" / "¥5,980" / 5980 → 5980; "2個で3,000円" → 3000 (the yen amount).
+    Ambiguous labels ("1,980円～2,480円") → None rather than a made-up number.
+    """
+    if text is None or isinstance(text, int):
+        return text
+    text = str(text)
+    amounts = [a or b for a, b in _YEN_AMOUNT.findall(text)] or _AMOUNT.findall(text)
+    if len(amounts) != 1:
+        return None
+    return int(amounts[0].replace(",", ""))
+
+def parse_prices(text: str):
+    """
+    Free-text price heuristic: the first two "N円" amounts are (original, discounted),
+    a single one is the discounted price. Returns strings plus a "NN%" discount.
+    """
+    prices = re.findall(r"[0-9,]+円", text or "")
+    original_price, discounted_price, discount_percent = None, None, None
+
+    if len(prices) >= 2:
+        original_price, discounted_price = prices[0], prices[1]
+    elif len(prices) == 1:
+        discounted_price = prices[0]
+
+    op, dp = parse_price(original_price), parse_price(discounted_price)
+    if op and dp is not None:
+        discount_percent = round((1 - dp / op) * 100)
+
+    return original_price, discounted_price, f"{discount_percent}%" if discount_percent else None
+
+def format_price(value: Optional[int]) -> Optional[str]:
+    return f"{value:,}円" if value is not None else None
+
+def parse_timestamp(text) -> Optional[int]:
+    if not text:
+        return None
+    if isinstance(text, (int, float)):
+        return int(text)
+    return int(datetime.strptime(text, TIMESTAMP_FORMAT).replace(tzinfo=timezone.utc).timestamp())
+
+def format_timestamp(epoch: Optional[int]) -> Optional[str]:
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime(TIMESTAMP_FORMAT)
+
+def intern(text: Optional[str]) -> Optional[str]:
+    return sys.intern(text) if text else text
+
+# ----------------------------
+# Records
+# ----------------------------
+class _Record:
+    """Dict-style access so pipeline stages and dedup code work unchanged."""
+    __slots__ = ()
+    _formatters = {}
+    _parsers = {}
+    _texts = {}   # field → slot keeping the scraped string, returned unchanged
+
+    def __getitem__(self, name):
+        text_slot = self._texts.get(name)
+        if text_slot is not None and getattr(self, text_slot) is not None:
+            return getattr(self, text_slot)
+        try:
+            value = getattr(self, name)
+        except AttributeError:
+            raise KeyError(name)
+        fmt = self._formatters.get(name)
+        return fmt(value) if fmt else value
+
+    def __setitem__(self, name, value):
+        parse = self._parsers.get(name)
+        parsed = parse(value) if parse else value
+        if name in self._texts:
+            # Only a string the formatter would not reproduce is kept ("1,980円" is rebuilt on read)
+            keep = isinstance(value, str) and value != self._formatters[name](parsed)
+            setattr(self, self._texts[name], value if keep else None)
+        setattr(self, name, parsed)
+
+    def __contains__(self, name):
+        return name in self.__slots__
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [s for s in self.__slots__ if not s.startswith("_")]
+
+    def to_dict(self) -> dict:
+        return {name: self[name] for name in self.keys()}
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        record = cls.__new__(cls)
+        for name in cls.__slots__:
+            if not name.startswith("_"):
+                record[name] = data.get(name)
+        record._init_key()
+        return record
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+class ProductRecord(_Record):
+    __slots__ = (
+        "title_ja", "title_en", "original_price", "discounted_price",
+        "discount_percent_ja", "discount_percent_en", "image_url", "link", "scraped_at", "image_id", "_key",
+        "_original_price_text", "_discounted_price_text",
+    )
+    _formatters = {"original_price": format_price, "discounted_price": format_price, "scraped_at": format_timestamp}
+    _texts = {"original_price": "_original_price_text", "discounted_price": "_discounted_price_text"}
+    _parsers = {
+        "original_price": parse_price, "discounted_price": parse_price, "scraped_at": parse_timestamp,
+        "discount_percent_ja": intern, "discount_percent_en": intern,
+    }
+
+    def __init__(self, title_ja, title_en, original_price, discounted_price,
+                 discount_percent_ja, discount_percent_en, image_url, link, scraped_at):
+        self.title_ja = title_ja
+        self.title_en = title_en
+        self["original_price"] = original_price      # integer (+ the scraped string if not canonical)
+        self["discounted_price"] = discounted_price
+        self.discount_percent_ja = intern(discount_percent_ja)
+        self.discount_percent_en = intern(discount_percent_en)
+        self.image_url = image_url
+        self.link = link
+        self.scraped_at = parse_timestamp(scraped_at)
+        self.image_id = None  # canonical image digest, set by thumbnails.annotate_images
+        self._init_key()
+
+    def _init_key(self):
+        self._key = product_key(self.link, self.discounted_price)
+
+    @property
+    def key(self) -> int:
+        return self._key
+
+class BannerRecord(_Record):
+    __slots__ = ("text_ja", "text_en", "image_url", "scraped_at", "image_id", "_key")
+    _formatters = {"scraped_at": format_timestamp}
+    _parsers = {"scraped_at": parse_timestamp}
+
+    def __init__(self, text_ja, text_en, image_url, scraped_at):
+        self.text_ja = text_ja
+        self.text_en = text_en
+        self.image_url = image_url
+        self.scraped_at = parse_timestamp(scraped_at)
+        self.image_id = None
+        self._init_key()
+
+    def _init_key(self):
+        self._key = banner_key(self.image_url, self.text_ja)
+
+    @property
+    def key(self) -> int:
+        return self._key
+
+def to_jsonable(obj):
+    """`default=` hook for json.dump so records serialize without a conversion pass."""
+    if isinstance(obj, _Record):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
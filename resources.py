@@ -0,0 +1,240 @@
+# resources.py
+# Resource governor for long-running monitors (monitor loop, run_scraper.py, /scrape?interval=)
+# - Samples the RSS of this Python process and of its browser descendants (Chromium,
+#   chromedriver, the Playwright driver) via psutil, or /proc when psutil is missing
+# - Tells the browser session when to relaunch: browser RSS over BROWSER_MAX_MB or
+#   BROWSER_MAX_PAGES pages served by one browser
+# - Browser processes seen during the run are remembered (pid + start time, also in
+#   browser_pids/<pid>.json); after a close, survivors are killed, and a monitor that
+#   starts after a crashed one kills the crashed run's leftovers
+# - Between rounds the Python heap is collected and returned to the OS (glibc malloc_trim)
+# - `stats` / `report()` are the numbers for the run summary
+#
+# Usage:
+#   governor = ResourceGovernor()
+#   ... scrape a round ...
+#   print(f"🧠 Resources: {governor.round_done()}")
+
+import ctypes
+import gc
+import json
+import os
+import signal
+import sys
+import threading
+from collections import defaultdict
+from pathlib import Path
+
+MAX_BROWSER_MB = int(os.environ.get("BROWSER_MAX_MB", "1024"))       # relaunch the browser above this RSS
+MAX_BROWSER_PAGES = int(os.environ.get("BROWSER_MAX_PAGES", "100"))  # ... or after this many pages
+PID_DIR = Path("browser_pids")
+BROWSER_NAMES = ("chrome", "chromium", "headless_shell", "chromedriver", "node", "playwright")
+MB = 1024 * 1024
+
+def _psutil():
+    try:
+        import psutil  # optional: /proc is read directly without it (Linux)
+        return psutil
+    except ImportError:
+        return None
+
+# ----------------------------
+# Process table
+# ----------------------------
+def processes() -> dict:
+    """{pid: (ppid, rss bytes, start time, name)} for every visible process ({} when unknown)."""
+    psutil = _psutil()
+    table = {}
+    if psutil is not None:
+        for proc in psutil.process_iter(["ppid", "memory_info", "create_time", "name"]):
+            info = proc.info
+            if info["memory_info"] is not None:
+                table[proc.pid] = (info["ppid"], info["memory_info"].rss, info["create_time"], info["name"] or "")
+        return table
+    if not Path("/proc").is_dir():
+        return table
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            stat = Path(f"/proc/{entry}/stat").read_text()
+        except OSError:
+            continue  # exited while listing
+        name = stat[stat.index("(") + 1:stat.rindex(")")]
+        fields = stat[stat.rindex(")") + 2:].split()   # fields[0] is the state (field 3 of proc(5))
+        table[int(entry)] = (int(fields[1]), int(fields[21]) * page_size, int(fields[19]), name)
+    return table
+
+def descendants(table: dict, root: int) -> set:
+    children = defaultdict(list)
+    for pid, (ppid, *_) in table.items():
+        children[ppid].append(pid)
+    found, stack = set(), [root]
+    while stack:
+        for child in children[stack.pop()]:
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+def is_browser(name: str) -> bool:
+    return any(n in name.lower() for n in BROWSER_NAMES)
+
+def kill(pids, table: dict = None) -> int:
+    """SIGKILL {pid: start time} entries that are still the same process (pids get reused)."""
+    table = processes() if table is None else table
+    killed = 0
+    for pid, start in pids.items():
+        if pid in table and table[pid][2] == start and pid != os.getpid():
+            try:
+                os.kill(pid, getattr(signal, "SIGKILL", signal.SIGTERM))
+                killed += 1
+            except OSError:
+                pass  # already gone / not ours
+    return killed
+
+def kill_stale(pid_dir=PID_DIR) -> int:
+    """Kill browser processes recorded by monitors that are no longer running."""
+    pid_dir = Path(pid_dir)
+    if not pid_dir.is_dir():
+        return 0
+    table, killed = processes(), 0
+    for path in pid_dir.glob("*.json"):
+        try:
+            record = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            continue
+        owner = record.get("owner")
+        if owner in table and table[owner][2] == record.get("owner_start"):
+            continue  # that monitor is still alive and owns its browsers
+        killed += kill({int(pid): start for pid, start in record.get("pids", {}).items()}, table)
+        path.unlink(missing_ok=True)
+    return killed
+
+def trim_heap():
+    """Collect garbage and hand freed arenas back to the OS (no-op off glibc)."""
+    gc.collect()
+    if sys.platform.startswith("linux"):
+        try:
+            ctypes.CDLL("libc.so.6").malloc_trim(0)
+        except (OSError, AttributeError):
+            pass
+
+# ----------------------------
+# Governor
+# ----------------------------
+class ResourceGovernor:
+    def __init__(self, max_browser_mb: int = MAX_BROWSER_MB, max_pages: int = MAX_BROWSER_PAGES, pid_dir=PID_DIR):
+        self.max_browser_mb = max_browser_mb
+        self.max_pages = max_pages
+        self.pid_file = Path(pid_dir) / f"{os.getpid()}.json"
+        self.tracked = {}   # pid → start time of every browser process seen this run
+        self.pages = 0      # pages served by the current browser
+        self.open = 0       # browsers launched and not closed yet (threads may each hold one)
+        self.lock = threading.Lock()   # /scrape runs on the server's thread pool
+        self.stats = {
+            "python_mb": 0, "browser_mb": 0, "browser_procs": 0, "peak_python_mb": 0, "peak_browser_mb": 0,
+            "rounds": 0, "launches": 0, "recycles": 0, "pages": 0, "orphans_killed": kill_stale(pid_dir),
+        }
+
+    def _save(self):
+        owner = processes().get(os.getpid())
+        try:
+            self.pid_file.parent.mkdir(parents=True, exist_ok=True)
+            self.pid_file.write_text(json.dumps({
+                "owner": os.getpid(), "owner_start": owner[2] if owner else None,
+                "pids": {str(pid): start for pid, start in self.tracked.items()},
+            }), encoding="utf-8")
+        except OSError as e:
+            print(f"⚠️ Could not record browser pids: {e}")
+
+    def sample(self) -> dict:
+        """Refresh the RSS numbers and remember every browser process below this one."""
+        table = processes()
+        browsers = {pid for pid in descendants(table, os.getpid()) if is_browser(table[pid][3])}
+        with self.lock:
+            new = {pid: table[pid][2] for pid in browsers if pid not in self.tracked}
+            self.tracked.update(new)
+            s = self.stats
+            s["python_mb"] = round(table[os.getpid()][1] / MB) if os.getpid() in table else 0
+            s["browser_mb"] = round(sum(table[pid][1] for pid in browsers) / MB)
+            s["browser_procs"] = len(browsers)
+            s["peak_python_mb"] = max(s["peak_python_mb"], s["python_mb"])
+            s["peak_browser_mb"] = max(s["peak_browser_mb"], s["browser_mb"])
+        if new:
+            self._save()
+        return table
+
+    def launched(self):
+        with self.lock:
+            self.pages = 0
+            self.open += 1
+            self.stats["launches"] += 1
+        self.sample()  # track the new browser's processes right away
+
+    def closed(self):
+        with self.lock:
+            self.open = max(self.open - 1, 0)
+
+    def page_opened(self):
+        with self.lock:
+            self.pages += 1
+            self.stats["pages"] += 1
+
+    def should_recycle(self):
+        """Reason to relaunch the browser before its next page, or None."""
+        self.sample()
+        if self.stats["browser_mb"] > self.max_browser_mb:
+            return f"browser RSS {self.stats['browser_mb']} MB > {self.max_browser_mb} MB"
+        if self.pages >= self.max_pages:
+            return f"{self.pages} pages served"
+        return None
+
+    def recycled(self, reason: str):
+        with self.lock:
+            self.stats["recycles"] += 1
+        print(f"♻️ Relaunching browser ({reason})")
+
+    def reap(self) -> int:
+        """
+        Kill leaked browser processes: tracked ones that were re-parented away from this
+        process (their driver died), and with no browser open, every tracked survivor.
+        """
+        table = self.sample()
+        browser_open = self.open > 0
+        ours = descendants(table, os.getpid())
+        with self.lock:
+            alive = {pid: start for pid, start in self.tracked.items() if pid in table and table[pid][2] == start}
+            leaked = {pid: start for pid, start in alive.items() if not browser_open or pid not in ours}
+            self.tracked = {pid: start for pid, start in alive.items() if pid not in leaked}
+        killed = kill(leaked, table)
+        if killed:
+            print(f"🧹 Killed {killed} orphaned browser processes")
+            with self.lock:
+                self.stats["orphans_killed"] += killed
+        self._save()
+        return killed
+
+    def round_done(self) -> str:
+        """Reap, trim the heap and re-sample after a round; returns the report line."""
+        self.reap()
+        trim_heap()
+        self.sample()
+        with self.lock:
+            self.stats["rounds"] += 1
+        return self.report()
+
+    def report(self) -> str:
+        s = self.stats
+        return (
+            f"python {s['python_mb']} MB (peak {s['peak_python_mb']}), browser {s['browser_mb']} MB in "
+            f"{s['browser_procs']} processes (peak {s['peak_browser_mb']}), {s['launches']} launches, "
+            f"{s['recycles']} recycles, {s['orphans_killed']} orphans killed"
+        )
+
+    def close(self):
+        """Final reap (no browser may outlive the monitor) and drop the pid record."""
+        self.open = 0
+        self.reap()
+        self.pid_file.unlink(missing_ok=True)
@@ -0,0 +1,130 @@
+# response_cache.py
+# Versioned response cache for main.py's read endpoints
+# - The save paths bump a store version counter (store_version.db, shared by every
+#   process); a response is keyed on (path, query, version + JSON store file stats)
+# - ETag = hash of that key (plus "-gzip" / "-br" for the compressed variants), so
+#   `If-None-Match` → 304 is answered without loading or serializing anything, even
+#   right after a server restart
+# - Bodies are serialized once per version and kept pre-compressed (gzip, and brotli
+#   when the `brotli` package is installed); repeat polls only pick the encoding
+#
+# Usage (in main.py):
+#   @app.get("/data")
+#   def get_data(request: Request):
+#       return response_cache.respond(request, lambda: build_payload(), files=("storage.json",))
+
+import gzip
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from fastapi import Request, Response
+
+VERSION_DB = Path("store_version.db")
+CACHE_ENTRIES = 64
+MIN_COMPRESS = 1024     # bytes; smaller bodies are sent as-is
+
+def _brotli():
+    try:
+        import brotli  # optional: gzip only without it
+        return brotli
+    except ImportError:
+        return None
+
+# ----------------------------
+# Store version
+# ----------------------------
+def _connect(path):
+    conn = sqlite3.connect(str(path), timeout=30)
+    conn.execute("CREATE TABLE IF NOT EXISTS version (id INTEGER PRIMARY KEY CHECK (id = 0), value INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO version VALUES (0, 0)")
+    return conn
+
+def bump_version(path=VERSION_DB) -> int:
+    """Called by the save paths after new data is written (never fails a save)."""
+    try:
+        conn = _connect(path)
+        with conn:
+            conn.execute("UPDATE version SET value = value + 1 WHERE id = 0")
+        value = conn.execute("SELECT value FROM version WHERE id = 0").fetchone()[0]
+        conn.close()
+        return value
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not bump store version: {e}")
+        return 0
+
+def store_version(files=(), path=VERSION_DB) -> str:
+    """Counter + (mtime, size) of the JSON stores an endpoint reads (catches writes that skip the save paths)."""
+    conn = _connect(path)
+    counter = conn.execute("SELECT value FROM version WHERE id = 0").fetchone()[0]
+    conn.close()
+    parts = [str(counter)]
+    for f in files:
+        try:
+            st = Path(f).stat()
+            parts.append(f"{st.st_mtime_ns}:{st.st_size}")
+        except OSError:
+            parts.append("-")
+    return "/".join(parts)
+
+# ----------------------------
+# Cache
+# ----------------------------
+class ResponseCache:
+    def __init__(self, entries: int = CACHE_ENTRIES, version_db=VERSION_DB):
+        self.entries = entries
+        self.version_db = version_db
+        self.cache = OrderedDict()   # etag base → {"identity": body, "gzip": body, "br": body}
+        self.lock = threading.Lock()  # sync endpoints run on a thread pool
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0}
+
+    def _encode(self, payload) -> dict:
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+        bodies = {"identity": body}
+        if len(body) >= MIN_COMPRESS:
+            bodies["gzip"] = gzip.compress(body, compresslevel=6)
+            brotli = _brotli()
+            if brotli is not None:
+                bodies["br"] = brotli.compress(body, quality=5)
+        return bodies
+
+    def respond(self, request: Request, build, files=()) -> Response:
+        """
+        Serve `build()` (a JSON-serializable payload) for this request, rebuilt only when
+        the store version changes; 304 when the client already has this version.
+        """
+        key = f"{request.url.path}?{request.url.query}#{store_version(files, self.version_db)}"
+        base = hashlib.blake2b(key.encode("utf-8"), digest_size=12).hexdigest()
+        headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+
+        # Strong ETags differ per content-coding: "<base>", "<base>-gzip", "<base>-br"
+        for tag in request.headers.get("if-none-match", "").split(","):
+            tag = tag.strip().removeprefix("W/").strip('"')
+            if tag.split("-")[0] == base:
+                self.stats["not_modified"] += 1
+                return Response(status_code=304, headers={**headers, "ETag": f'"{tag}"'})
+
+        with self.lock:
+            bodies = self.cache.get(base)
+            if bodies is not None:
+                self.cache.move_to_end(base)
+        if bodies is None:
+            self.stats["misses"] += 1
+            bodies = self._encode(build())
+            with self.lock:
+                self.cache[base] = bodies
+                while len(self.cache) > self.entries:
+                    self.cache.popitem(last=False)
+        else:
+            self.stats["hits"] += 1
+
+        accepted = {e.split(";")[0].strip() for e in request.headers.get("accept-encoding", "").split(",")}
+        encoding = next((e for e in ("br", "gzip") if e in accepted and e in bodies), "identity")
+        if encoding == "identity":
+            headers["ETag"] = f'"{base}"'
+        else:
+            headers.update({"ETag": f'"{base}-{encoding}"', "Content-Encoding": encoding})
+        return Response(bodies[encoding], media_type="application/json", headers=headers)
@@ -0,0 +1,274 @@
+# run_scraper.py
+# Headless, non-interactive runner for "ai_scraper ( automated updated).py"
+# - All settings come from flags or a JSON config file (no input() prompts)
+# - One browser kept across rounds (no pre-count launch), relaunched past the
+#   --max-browser-mb / --max-browser-pages limits; resource stats are printed per round
+# - Exit codes for cron / container orchestration
+#
+# Examples:
+#   python run_scraper.py --limit 50
+#   python run_scraper.py --url URL1 --url URL2 --limit 20 --interval 5m --rounds 0 --adaptive
+#   python run_scraper.py --config scraper_config.json --output stdout
+#   python run_scraper.py --limit 30 --fetch-mode http      # no browser at all
+#   python run_scraper.py --limit 30 --profile               # cProfile + tracemalloc → profiling/
+
+import argparse
+import contextlib
+import importlib.util
+import json
+import sys
+import time
+import traceback
+from functools import lru_cache
+from pathlib import Path
+
+from http_fetch import FETCH_MODE, FETCH_MODES
+from profiling import PROFILE_ENABLED, PROFILERS, profiled
+from resources import MAX_BROWSER_MB, MAX_BROWSER_PAGES, ResourceGovernor
+from snapshots import SNAPSHOT_ENABLED
+from scheduler import AdaptiveScheduler
+
+AUTOMATED_SCRAPER = Path(__file__).with_name("ai_scraper ( automated updated).py")
+DEFAULT_URL = "https://event.rakuten.co.jp/campaign/supersale/?l-id=top_normal_emergency_pc_big01"
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1           # unexpected error (missing browser, crash, ...)
+EXIT_USAGE = 2           # bad flags / config
+EXIT_ALL_FAILED = 3      # no page loaded in any round
+EXIT_PARTIAL = 4         # some URL/round failed to load
+EXIT_INTERRUPTED = 130   # Ctrl+C / SIGINT
+
+# ----------------------------
+# Helpers
+# ----------------------------
+@lru_cache(maxsize=1)
+def load_automated_scraper():
+    """Import the automated scraper module (its filename is not a valid module name)."""
+    spec = importlib.util.spec_from_file_location("ai_scraper_automated", AUTOMATED_SCRAPER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def parse_interval(raw) -> int:
+    """Accept 60, "60", "60s", "5m" or "1h" and return seconds."""
+    raw = str(raw).strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if raw and raw[-1] in units:
+        return int(raw[:-1]) * units[raw[-1]]
+    return int(raw)
+
+class StdoutSink:
+    """Write one JSON line per product/banner as soon as it is scraped."""
+
+    def __init__(self):
+        self.data = {"products": [], "banners": []}
+
+    def write(self, kind: str, item: dict):
+        print(json.dumps({"type": kind[:-1], **item}, ensure_ascii=False), file=sys.__stdout__, flush=True)
+        self.data[kind].append(item)
+
+    def close(self):
+        return self.data
+
+def get_output_backend(name: str, scraper, output_file=None):
+    """Return a factory that builds a fresh pipeline sink for every scrape."""
+    backends = {
+        "json": lambda: scraper.journal_sink(output_file or scraper.DATA_FILE),
+        "stdout": StdoutSink,
+    }
+    if name not in backends:
+        raise ValueError(f"unknown output backend '{name}' (choose from {', '.join(backends)})")
+    return backends[name]
+
+# ----------------------------
+# CLI
+# ----------------------------
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Non-interactive Rakuten Super Sale scraper")
+    parser.add_argument("--config", type=Path, help="JSON file with any of the options below")
+    parser.add_argument("--url", dest="urls", action="append", help="page to scrape (repeatable)")
+    parser.add_argument("--urls-file", type=Path, help="file with one URL per line")
+    parser.add_argument("--limit", type=int, help="max products per page (default: all cards)")
+    parser.add_argument("--interval", default="0", help="seconds between rounds, e.g. 60, 5m, 1h")
+    parser.add_argument("--rounds", type=int, default=1, help="number of rounds (0 = until stopped)")
+    parser.add_argument("--adaptive", action="store_true", help="adapt the interval to page changes")
+    parser.add_argument("--min-interval", type=int, help="lower bound for the adaptive interval")
+    parser.add_argument("--max-interval", type=int, help="upper bound for the adaptive interval")
+    parser.add_argument("--output", default="json", help="output backend: json, stdout")
+    parser.add_argument("--output-file", type=Path, help="target file for the json backend")
+    parser.add_argument("--fetch-mode", choices=FETCH_MODES, default=FETCH_MODE,
+                        help="auto: plain HTTP first, browser when needed (default); http: never launch a browser; "
+                             "browser: always Chromium")
+    parser.add_argument("--snapshot", action="store_true", default=SNAPSHOT_ENABLED,
+                        help="archive each page's HTML for `python snapshots.py reprocess`")
+    parser.add_argument("--max-browser-mb", type=int, default=MAX_BROWSER_MB,
+                        help="relaunch Chromium when its processes use more RSS than this")
+    parser.add_argument("--max-browser-pages", type=int, default=MAX_BROWSER_PAGES,
+                        help="relaunch Chromium after this many pages")
+    parser.add_argument("--profile", action="store_true", default=PROFILE_ENABLED,
+                        help="profile the run (CPU + allocations); artifacts go to profiling/<run>/")
+    parser.add_argument("--profiler", choices=PROFILERS, default="cprofile",
+                        help="cprofile: all threads (default); pyinstrument: sampling, main thread")
+    return parser
+
+def config_value(parser: argparse.ArgumentParser, key: str, value):
+    """
+    (dest, value) for one config entry, checked like the matching flag: "limit" or
+    "max-browser-mb" name an option (its dest, e.g. "urls", works too), strings go
+    through the option's type / choices, on/off flags take true/false, "url" a list.
+    Raises ValueError for unknown keys and values argparse would reject.
+    """
+    actions = {}
+    for action in parser._actions:
+        if action.dest in ("help", "config"):
+            continue
+        actions[action.dest] = action
+        for option in action.option_strings:
+            actions[option.lstrip("-").replace("-", "_")] = action
+    action = actions.get(key.replace("-", "_"))
+    if action is None:
+        raise ValueError(f"unknown key '{key}'")
+
+    def convert(v):
+        if isinstance(v, bool) or not isinstance(v, (str, int)):
+            raise ValueError(f"'{key}' must be a string or number, not {json.dumps(v)}")
+        if isinstance(v, int) and action.type not in (None, int):
+            raise ValueError(f"'{key}' must be a string, not {v}")
+        try:
+            v = action.type(v) if action.type and isinstance(v, str) else v
+        except (TypeError, ValueError):
+            raise ValueError(f"invalid value for '{key}': {json.dumps(v)}") from None
+        if action.choices is not None and v not in action.choices:
+            raise ValueError(f"'{key}' must be one of {', '.join(map(str, action.choices))}")
+        return v
+
+    if isinstance(action, argparse._StoreTrueAction):
+        if not isinstance(value, bool):
+            raise ValueError(f"'{key}' must be true or false")
+        return action.dest, value
+    if isinstance(action, argparse._AppendAction):
+        return action.dest, [convert(v) for v in (value if isinstance(value, list) else [value])]
+    return action.dest, convert(value)
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.config:
+        try:
+            with open(args.config, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            parser.error(f"cannot read config {args.config}: {e}")
+        if not isinstance(config, dict):
+            parser.error(f"config {args.config} must be a JSON object")
+        # Flags given on the command line win over the config file
+        defaults = vars(parser.parse_args([]))
+        for key, value in config.items():
+            try:
+                dest, value = config_value(parser, key, value)
+            except ValueError as e:
+                parser.error(f"config {args.config}: {e}")
+            if getattr(args, dest) == defaults[dest]:
+                setattr(args, dest, value)
+
+    urls = list(args.urls or [])
+    if args.urls_file:
+        try:
+            urls += [line.strip() for line in Path(args.urls_file).read_text(encoding="utf-8").splitlines() if line.strip()]
+        except OSError as e:
+            parser.error(f"cannot read {args.urls_file}: {e}")
+    args.urls = urls or [DEFAULT_URL]
+
+    try:
+        args.interval = parse_interval(args.interval)
+    except ValueError:
+        parser.error(f"invalid interval '{args.interval}'")
+    if args.limit is not None and args.limit <= 0:
+        parser.error("--limit must be positive")
+    if args.rounds < 0:
+        parser.error("--rounds must be >= 0")
+    if args.rounds != 1 and args.interval <= 0:
+        parser.error("--interval is required when running more than one round")
+    if args.max_browser_mb <= 0 or args.max_browser_pages <= 0:
+        parser.error("--max-browser-mb and --max-browser-pages must be positive")
+    return args
+
+def run(args) -> int:
+    scraper = load_automated_scraper()
+    try:
+        make_sink = get_output_backend(args.output, scraper, args.output_file)
+    except ValueError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        return EXIT_USAGE
+
+    limit = args.limit or sys.maxsize
+    scheduler = None
+    if args.adaptive and args.interval > 0:
+        scheduler = AdaptiveScheduler(
+            args.interval,
+            min_interval=args.min_interval,
+            max_interval=args.max_interval,
+            state_file=Path("scheduler_state.json"),
+        )
+
+    known_links, known_banners = set(), set()
+    due = {url: 0.0 for url in args.urls}  # monotonic time each URL is next due
+    round_count, loaded, failed = 0, 0, 0
+    session = scraper.BrowserSession(ResourceGovernor(args.max_browser_mb, args.max_browser_pages))
+
+    try:
+        while args.rounds == 0 or round_count < args.rounds:
+            round_count += 1
+            print(f"\n🔄 Round {round_count} starting at {scraper.timestamp()} ...", file=sys.stderr)
+
+            for url in args.urls:
+                wait = due[url] - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+
+                # Progress logs go to stderr so stdout stays clean for the output backend
+                with contextlib.redirect_stdout(sys.stderr):
+                    results, known_links, known_banners = scraper.scrape_products(
+                        url, limit, known_links, known_banners, sink=make_sink(), fetch_mode=args.fetch_mode,
+                        snapshot=args.snapshot, session=session,
+                    )
+                if not results["total_found"]:
+                    failed += 1
+                    delay = scheduler.record_failure(url) if scheduler else args.interval
+                else:
+                    loaded += 1
+                    changed = bool(results["products"] or results["banners"])
+                    if scheduler:
+                        scheduler.record(url, changed)
+                    delay = scheduler.next_delay(url) if scheduler else args.interval
+                due[url] = time.monotonic() + delay
+
+            report = session.governor.round_done()
+            print(f"🧠 Resources: {report}", file=sys.stderr)
+    finally:
+        session.close()  # no browser outlives the run
+        print(f"🧠 Run resources: {json.dumps(session.governor.stats)}", file=sys.stderr)
+
+    if not loaded:
+        return EXIT_ALL_FAILED
+    return EXIT_PARTIAL if failed else EXIT_OK
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    code = EXIT_ERROR
+    with profiled("run_scraper", enabled=args.profile, engine=args.profiler) as profile:
+        try:
+            code = run(args)
+        except KeyboardInterrupt:
+            print("🛑 Interrupted", file=sys.stderr)
+            code = EXIT_INTERRUPTED
+        except Exception:
+            traceback.print_exc()
+        if profile:
+            profile.summary.update({"exit_code": code, "urls": args.urls, "rounds": args.rounds, "fetch_mode": args.fetch_mode})
+    return code
+
+if __name__ == "__main__":
+    sys.exit(main())
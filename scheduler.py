@@ -0,0 +1,169 @@
+# scheduler.py
+# Adaptive monitoring scheduler
+# - Learns per-URL change frequency (EWMA of the gap between changes)
+# - Shortens the interval during active sale windows (JST)
+# - Exponential backoff with jitter for timeouts / retries
+
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+JST = timezone(timedelta(hours=9))
+
+# Super Sale starts at 20:00 JST and most time sales drop in the first hours
+DEFAULT_SALE_WINDOWS = ["20:00-02:00"]
+
+# ----------------------------
+# Backoff
+# ----------------------------
+def backoff_delay(attempt: int, base: float = 5.0, cap: float = 120.0) -> float:
+    """Exponential backoff with "equal jitter": half fixed, half random."""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+# ----------------------------
+# Sale windows
+# ----------------------------
+_WINDOW = re.compile(r"^(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})$")
+
+def parse_sale_windows(spec) -> List[Tuple[int, int]]:
+    """
+    Parse "HH:MM-HH:MM" strings (or a comma separated string) into minute ranges.
+    Raises ValueError naming the first malformed window.
+    """
+    if not spec:
+        return []
+    if isinstance(spec, str):
+        spec = [s for s in spec.split(",") if s.strip()]
+
+    windows = []
+    for item in spec:
+        m = _WINDOW.match(str(item).strip())
+        if not m:
+            raise ValueError(f"invalid sale window '{item}' (expected HH:MM-HH:MM)")
+        sh, sm, eh, em = (int(x) for x in m.groups())
+        if sh > 23 or eh > 23 or sm > 59 or em > 59:
+            raise ValueError(f"invalid sale window '{item}' (hours 00-23, minutes 00-59)")
+        windows.append((sh * 60 + sm, eh * 60 + em))
+    return windows
+
+def in_sale_window(windows: List[Tuple[int, int]], now: Optional[float] = None) -> bool:
+    if not windows:
+        return False
+    t = datetime.fromtimestamp(now if now is not None else time.time(), JST)
+    minute = t.hour * 60 + t.minute
+    for start, end in windows:
+        if start <= end and start <= minute < end:
+            return True
+        if start > end and (minute >= start or minute < end):  # wraps past midnight
+            return True
+    return False
+
+# ----------------------------
+# Per-URL state
+# ----------------------------
+@dataclass
+class UrlState:
+    interval: float
+    change_gap: Optional[float] = None   # EWMA of seconds between observed changes
+    last_change: Optional[float] = None
+    checks: int = 0
+    changes: int = 0
+    failures: int = 0
+
+class AdaptiveScheduler:
+    """Decides how long to wait before the next scrape of each URL."""
+
+    def __init__(
+        self,
+        base_interval: float,
+        min_interval: Optional[float] = None,
+        max_interval: Optional[float] = None,
+        sale_windows=DEFAULT_SALE_WINDOWS,
+        sale_factor: float = 0.5,
+        growth: float = 1.5,
+        alpha: float = 0.3,
+        jitter: float = 0.1,
+        state_file: Optional[Path] = None,
+    ):
+        self.base_interval = float(base_interval)
+        self.min_interval = float(min_interval) if min_interval else max(5.0, self.base_interval / 4)
+        self.max_interval = float(max_interval) if max_interval else self.base_interval * 4
+        self.sale_windows = parse_sale_windows(sale_windows)
+        self.sale_factor = sale_factor
+        self.growth = growth
+        self.alpha = alpha
+        self.jitter = jitter
+        self.state_file = Path(state_file) if state_file else None
+        self.states: Dict[str, UrlState] = {}
+        self._load()
+
+    def _clamp(self, value: float) -> float:
+        return max(self.min_interval, min(self.max_interval, value))
+
+    def state(self, url: str) -> UrlState:
+        if url not in self.states:
+            self.states[url] = UrlState(interval=self._clamp(self.base_interval))
+        return self.states[url]
+
+    def record(self, url: str, changed: bool, now: Optional[float] = None):
+        """Feed the outcome of a successful check back into the model."""
+        now = now if now is not None else time.time()
+        s = self.state(url)
+        s.checks += 1
+        s.failures = 0
+
+        if changed:
+            s.changes += 1
+            if s.last_change is not None:
+                gap = now - s.last_change
+                s.change_gap = gap if s.change_gap is None else self.alpha * gap + (1 - self.alpha) * s.change_gap
+            s.last_change = now
+            # Sample at twice the observed change rate; halve until we have a gap estimate
+            s.interval = self._clamp(s.change_gap / 2 if s.change_gap else s.interval / 2)
+        else:
+            s.interval = self._clamp(s.interval * self.growth)
+        self._save()
+
+    def record_failure(self, url: str) -> float:
+        """Register a failed check and return the backoff delay before retrying."""
+        s = self.state(url)
+        s.failures += 1
+        self._save()
+        return min(self.max_interval, backoff_delay(s.failures - 1, base=self.min_interval, cap=self.max_interval))
+
+    def next_delay(self, url: str, now: Optional[float] = None) -> float:
+        delay = self.state(url).interval
+        if in_sale_window(self.sale_windows, now):
+            delay = max(self.min_interval, delay * self.sale_factor)
+        return max(1.0, delay * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def stats(self) -> Dict[str, dict]:
+        return {url: asdict(s) for url, s in self.states.items()}
+
+    # ----------------------------
+    # Persistence
+    # ----------------------------
+    def _load(self):
+        if not self.state_file or not self.state_file.exists():
+            return
+        try:
+            with open(self.state_file, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+            self.states = {url: UrlState(**s) for url, s in raw.items()}
+        except Exception as e:
+            print(f"⚠️ Could not load scheduler state: {e}")
+
+    def _save(self):
+        if not self.state_file:
+            return
+        try:
+            with open(self.state_file, "w", encoding="utf-8") as f:
+                json.dump(self.stats(), f, indent=2)
+        except Exception as e:
+            print(f"⚠️ Could not save scheduler state: {e}")
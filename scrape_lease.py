@@ -0,0 +1,215 @@
+# scrape_lease.py
+# Cross-process scrape coordination (FastAPI server, interactive monitor, cron runs)
+# - A scrape of a URL is claimed with a lease row in scrape_leases.db (SQLite, BEGIN
+#   IMMEDIATE), so only one process at a time opens a browser for it
+# - The owner renews the lease while it scrapes (heartbeat thread); a lease whose owner
+#   died (same host: pid gone, otherwise: not renewed within LEASE_TTL) is taken over
+# - Concurrent requesters wait for the in-flight scrape and get its result; a result
+#   younger than FRESH_FOR seconds is served from the lease table without scraping
+# - A failed scrape caches nothing: the next requester scrapes again
+# - Leases are per shard (offset / limit), so two shards of one URL can still run at
+#   once: the JSON stores' read-modify-write saves hold write_lock(<store>) as well
+#
+# Usage:
+#   result, source = coordinated(url, lambda: scrape(url))   # source: scraped | in_flight | cached
+#   with write_lock(DATA_FILE): ...                          # load + rewrite a JSON store
+#   python scrape_lease.py                                   # list leases
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from records import to_jsonable
+
+LEASE_DB = Path("scrape_leases.db")
+FRESH_FOR = int(os.environ.get("SCRAPE_FRESH_FOR", "30"))   # seconds a finished scrape answers other requesters
+LEASE_TTL = 120          # seconds without a heartbeat before a lease counts as abandoned
+WAIT_POLL = 1.0          # seconds between checks while another process scrapes
+WAIT_TIMEOUT = 900       # give up waiting and scrape anyway after this long
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    key TEXT PRIMARY KEY,        -- URL (+ shard / limit for the automated scraper)
+    token TEXT,                  -- current owner's token (NULL: nobody scraping)
+    host TEXT,
+    pid INTEGER,
+    expires_at REAL,
+    finished_at REAL,            -- last successful scrape
+    result TEXT                  -- its result as JSON
+);
+"""
+
+@contextmanager
+def write_lock(path):
+    """Exclusive cross-process lock on `path` (held on <path>.lock) around a load + rewrite."""
+    lock_path = Path(f"{path}.lock")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)   # retries for ~10 s per call
+                    break
+                except OSError:
+                    continue
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True   # exists, owned by another user
+
+class ScrapeLeases:
+    def __init__(self, path=LEASE_DB):
+        self.conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()   # shared with the owner's heartbeat thread
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def claim(self, key: str, fresh_for: float = FRESH_FOR, since: float = None):
+        """
+        ("cached", result) when the last scrape is fresh (or finished after `since`),
+        ("in_flight", None) while a live owner scrapes, otherwise ("scrape", token):
+        this process now holds the lease.
+        """
+        now, host = time.time(), socket.gethostname()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self.conn.execute(
+                    "SELECT token, host, pid, expires_at, finished_at, result FROM leases WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    token, owner_host, pid, expires_at, finished_at, result = row
+                    fresh = finished_at is not None and (now - finished_at < fresh_for or (since and finished_at >= since))
+                    if token is None and fresh:
+                        self.conn.execute("COMMIT")
+                        return "cached", json.loads(result)
+                    if token is not None and expires_at > now and not (owner_host == host and not _alive(pid)):
+                        self.conn.execute("COMMIT")
+                        return "in_flight", None
+                token = uuid.uuid4().hex
+                self.conn.execute(
+                    "INSERT INTO leases (key, token, host, pid, expires_at) VALUES (?, ?, ?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET token = excluded.token, host = excluded.host, "
+                    "pid = excluded.pid, expires_at = excluded.expires_at",
+                    (key, token, host, os.getpid(), now + LEASE_TTL),
+                )
+                self.conn.execute("COMMIT")
+                return "scrape", token
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def renew(self, key: str, token: str) -> bool:
+        with self.lock:
+            cur = self.conn.execute("UPDATE leases SET expires_at = ? WHERE key = ? AND token = ?",
+                                    (time.time() + LEASE_TTL, key, token))
+        return cur.rowcount == 1
+
+    def finish(self, key: str, token: str, result=None, ok: bool = True):
+        """Release the lease; a successful result is kept for FRESH_FOR-second reuse."""
+        with self.lock:
+            if ok:
+                self.conn.execute(
+                    "UPDATE leases SET token = NULL, finished_at = ?, result = ? WHERE key = ? AND token = ?",
+                    (time.time(), json.dumps(result, ensure_ascii=False, default=to_jsonable), key, token))
+            else:
+                self.conn.execute("UPDATE leases SET token = NULL WHERE key = ? AND token = ?", (key, token))
+
+    def list(self):
+        rows = self.conn.execute("SELECT key, token, host, pid, expires_at, finished_at FROM leases ORDER BY key")
+        return [
+            {"key": key, "scraping": token is not None, "host": host, "pid": pid, "expires_at": expires_at,
+             "finished_at": finished_at}
+            for key, token, host, pid, expires_at, finished_at in rows
+        ]
+
+def _heartbeat(leases: ScrapeLeases, key: str, token: str, stop: threading.Event):
+    while not stop.wait(LEASE_TTL / 3):
+        if not leases.renew(key, token):
+            print(f"⚠️ Lost the scrape lease for {key}")
+            return
+
+def coordinated(key: str, scrape, fresh_for: float = FRESH_FOR, succeeded=bool, wait_timeout: float = WAIT_TIMEOUT,
+                path=LEASE_DB):
+    """
+    Run `scrape()` unless another process is already scraping `key` (wait for and return
+    its result) or did so less than `fresh_for` seconds ago (return that result).
+    Results failing `succeeded` (default: empty) are returned but not shared.
+    Returns (result, source) with source "scraped", "in_flight" or "cached".
+    """
+    with ScrapeLeases(path) as leases:
+        deadline, waited_since = time.monotonic() + wait_timeout, None
+        while True:
+            state, value = leases.claim(key, fresh_for, since=waited_since)
+            if state == "cached":
+                print(f"♻️ Using the {'in-flight' if waited_since else 'recent'} scrape of {key} from another process")
+                return value, "in_flight" if waited_since else "cached"
+            if state == "scrape":
+                token = value
+                break
+            if time.monotonic() > deadline:
+                print(f"⚠️ Gave up waiting for the in-flight scrape of {key}; scraping anyway")
+                token = None
+                break
+            if waited_since is None:
+                print(f"⏳ {key} is being scraped by another process; waiting for its result...")
+                waited_since = time.time()
+            time.sleep(WAIT_POLL)
+
+        if token is None:
+            return scrape(), "scraped"
+        stop = threading.Event()
+        threading.Thread(target=_heartbeat, args=(leases, key, token, stop), daemon=True).start()
+        try:
+            result = scrape()
+        except BaseException:
+            leases.finish(key, token, ok=False)   # waiters take over instead of getting nothing
+            raise
+        finally:
+            stop.set()
+        leases.finish(key, token, result, ok=succeeded(result))
+        return result, "scraped"
+
+if __name__ == "__main__":
+    with ScrapeLeases() as leases:
+        now = time.time()
+        for lease in leases.list():
+            state = f"scraping (pid {lease['pid']} on {lease['host']})" if lease["scraping"] else "idle"
+            age = f"{now - lease['finished_at']:.0f}s ago" if lease["finished_at"] else "never"
+            print(f"{lease['key']}: {state}, last finished {age}")
@@ -112,32 +112,124 @@
 import json
 import time
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.options import Options
-from selenium.common.exceptions import NoSuchElementException
 from googletrans import Translator
-
+from price_history import record_items
+from search_index import index_items
+from pipeline import Pipeline, TranslateStage, ListSink, JournalSink, TeeSink, join_translate
+from selector_profiles import load_profile
+from layout_drift import check_layout, heuristic_card
+from snapshots import SNAPSHOT_ENABLED, archive_page
+from deal_feed import publish_items
+from alerts import check_alerts
+from response_cache import bump_version
+from resources import ResourceGovernor
+from near_dup import TITLE_THRESHOLD, NearDupIndex, store_records, title_kind
+from scrape_lease import FRESH_FOR, coordinated, write_lock
+from thumbnails import ImageSink, annotate_images, product_image_key
+from translations import SOURCE_LANG, TARGET_LANGS, TranslationStore, google_code
+
+SCRAPE_URL = "https://event.rakuten.co.jp/campaign/supersale/?l-id=top_normal_emergency_pc_big01"
 DATA_FILE = "storage.json"
+JOURNAL_FILE = "storage.journal.jsonl"
 translator = Translator()
+_governor = None
+
+def get_governor() -> ResourceGovernor:
+    """Process-wide resource governor (RSS stats, leaked Chrome / chromedriver cleanup)."""
+    global _governor
+    if _governor is None:
+        _governor = ResourceGovernor()
+    return _governor
 
-def translate_text(text: str) -> str:
-    """Translate Japanese text to English using Google Translate."""
+def translate_text(text: str, lang: str = "en") -> str:
+    """Translate Japanese text (to English by default) using Google Translate."""
     if not text:
         return text
     try:
-        result = translator.translate(text, src="ja", dest="en")
+        result = translator.translate(text, src=SOURCE_LANG, dest=google_code(lang))
         return result.text
     except Exception:
         return text  # fallback to original if translation fails
 
-def scrape_rakuten_discounts():
+def translate_batch(texts, lang: str = "en"):
+    """Translate many strings with as few requests as possible."""
+    return join_translate(texts, lambda text: translate_text(text, lang))
+
+def normalize_item(raw: dict):
+    if not (raw["original_price"] and raw["discounted_price"]):
+        return None
+    return {
+        "title_ja": raw["title"] or "No title",
+        "title_en": None,
+        "original_price": raw["original_price"],
+        "discounted_price": raw["discounted_price"],
+        "discount_label_ja": raw["label"],
+        "discount_label_en": None,
+        "image_url": raw["image_url"],
+        "link": raw["link"],
+    }
+
+def append_items(data: dict):
+    """Append new items to storage.json (used to fold the journal)."""
+    record_items(data["products"], source="selenium")
+    index_items(data["products"], source="selenium")
+    with write_lock(DATA_FILE):  # another process may fold its journal at the same time
+        existing = load_data()
+        # The same creative under another image URL / link is merged (perceptual hash)
+        annotate_images(data["products"])
+        seen = {product_image_key(p) for p in existing if product_image_key(p)}
+        # ... and so is a title that only differs in decoration (same image and price)
+        with NearDupIndex() as near:
+            near.backfill("selenium", store_records(existing, [], "selenium"))
+            new_items = []
+            for p in data["products"]:
+                key = product_image_key(p)
+                if key is not None and key in seen:
+                    continue
+                if near.seen(title_kind(p, "selenium"), p["title_ja"], ref=p["link"], threshold=TITLE_THRESHOLD, commit=False):
+                    continue
+                seen.add(key)
+                new_items.append(p)
+            all_items = existing + new_items
+            with open(DATA_FILE, "w", encoding="utf-8") as f:
+                json.dump(all_items, f, indent=4, ensure_ascii=False)
+            near.commit()
+    publish_items("product", new_items)  # push feed (main.py /feed/sse, /feed/ws)
+    check_alerts(new_items)             # alert rules (alert_rules.json)
+    bump_version()                      # main.py's cached responses / ETags are now stale
+
+def scrape_rakuten_discounts(fresh_for: float = FRESH_FOR):
+    """
+    One scrape per URL at a time across processes (scrape_lease.py): while another
+    process (API server, monitor, cron) scrapes SCRAPE_URL its result is awaited and
+    returned, and a result younger than `fresh_for` seconds is reused.
+    """
+    items, _ = coordinated(SCRAPE_URL, _scrape_rakuten_discounts, fresh_for)
+    return items
+
+def _scrape_rakuten_discounts():
     """
     Scrape discounted items from Rakuten's Super Sale page using Selenium.
     Extracts product title, original price, discounted price, 
     discount label, image URL, and product link.
     Translates Japanese text to English automatically.
+    Items are streamed through the pipeline and journaled as they are found.
+    Selectors come from the site profile (profiles/*.json) matching the URL.
+    The driver is always quit, and Chrome processes it leaves behind are killed.
     """
-    items = []
+    profile = load_profile(url=SCRAPE_URL)
+    pipe = Pipeline(
+        normalizers={"products": normalize_item},
+        translate=TranslateStage(translate_batch, {
+            "products": [("title_ja", "title_en"), ("discount_label_ja", "discount_label_en")],
+        }, targets=TARGET_LANGS, store=TranslationStore()),
+        keys={"products": lambda i: (i["link"], i["title_ja"], i["discounted_price"])},
+        known={"products": set()},
+        sink=ImageSink(TeeSink(ListSink(), JournalSink(JOURNAL_FILE, commit=append_items))),
+    ).start()
+    governor = get_governor()
+    driver = None
     try:
         # Setup Chrome options
         options = Options()
@@ -152,11 +244,14 @@ def scrape_rakuten_discounts():
         )
 
         driver = webdriver.Chrome(options=options)
+        governor.launched()
+        governor.page_opened()
 
         print("➡️ Navigating to Rakuten Super Sale page...")
-        driver.get("https://event.rakuten.co.jp/campaign/supersale/?l-id=top_normal_emergency_pc_big01")
+        driver.get(SCRAPE_URL)
 
-        time.sleep(5)  # wait for page load
+        # Wait (up to 5 s) for the expected cards; on changed markup fall back to the price-text heuristic
+        products_plan, drift = check_layout(driver, profile, SCRAPE_URL, timeout=5)
 
         # Auto-scroll to load lazy content
         for _ in range(5):
@@ -165,77 +260,36 @@ def scrape_rakuten_discounts():
 
         print("✅ Page loaded. Extracting items...")
 
-        product_blocks = driver.find_elements(By.CSS_SELECTOR, "div.ecm-ad")
-
-        for block in product_blocks:
-            try:
-                # Title
-                try:
-                    title = block.find_element(By.CSS_SELECTOR, ".ecm-ad-name").text.strip()
-                except NoSuchElementException:
-                    title = "No title"
-
-                # Prices
-                try:
-                    original_price = block.find_element(By.CSS_SELECTOR, ".ecm-ad-price-original").text.strip()
-                except NoSuchElementException:
-                    original_price = None
-
-                try:
-                    discounted_price = block.find_element(By.CSS_SELECTOR, ".ecm-ad-price-amount").text.strip()
-                except NoSuchElementException:
-                    discounted_price = None
-
-                # Discount label
-                try:
-                    discount_label = block.find_element(By.CSS_SELECTOR, ".ecm-ad-label").text.strip()
-                except NoSuchElementException:
-                    discount_label = None
-
-                # Image URL
-                try:
-                    image_url = block.find_element(By.TAG_NAME, "img").get_attribute("src")
-                except NoSuchElementException:
-                    image_url = None
-
-                # Product link
-                try:
-                    link_url = block.find_element(By.CSS_SELECTOR, "a.ecm-ad-link").get_attribute("href")
-                except NoSuchElementException:
-                    link_url = None
-
-                if original_price and discounted_price:
-                    items.append({
-                        "title_ja": title,
-                        "title_en": translate_text(title),
-                        "original_price": original_price,
-                        "discounted_price": discounted_price,
-                        "discount_label_ja": discount_label,
-                        "discount_label_en": translate_text(discount_label),
-                        "image_url": image_url,
-                        "link": link_url,
-                    })
-
-            except Exception as inner_e:
-                print(f"⚠️ Error parsing block: {inner_e}")
-
-        driver.quit()
-
-        # 🔹 Load old data first
-        existing_data = load_data()
-
-        # 🔹 Add new items to the old list
-        all_items = existing_data + items
-
-        # 🔹 Save everything back
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(all_items, f, indent=4, ensure_ascii=False)
+        # One script call extracts every card (selectors from the site profile)
+        result = products_plan.run(driver)
+        print(f"🔎 Found {result['total']} product blocks ({result['skipped']} incomplete)")
+        for raw in result["items"]:
+            if drift["drifted"]:
+                raw = heuristic_card(raw)
+            if raw:
+                pipe.put("products", raw)
+        if SNAPSHOT_ENABLED:
+            archive_page(driver, SCRAPE_URL, profile.name)
 
     except Exception as e:
         print(f"❌ Error during scraping: {e}")
+        pipe.close()  # items found before the error are still saved
         return []
-
-    print(f"✅ Scraping finished. Found {len(items)} items.")
+    finally:
+        if driver is not None:
+            try:
+                driver.quit()
+            except Exception as e:
+                print(f"⚠️ driver.quit() failed: {e}")
+            governor.closed()
+        governor.reap()  # whatever Chrome / chromedriver survived the quit
+
+    # 🔹 Journal is folded into storage.json (old data + new items) on close
+    data, stats = pipe.close()
+    items = data["products"]
+
+    print(f"✅ Scraping finished. Found {len(items)} items ({stats['translate_calls']} translation requests).")
+    print(f"🧪 Field hit rates: {products_plan.stats.report()}")
     return items
 
 
@@ -0,0 +1,212 @@
+# search_index.py
+# Persistent full-text index over product titles/labels and banner texts (SQLite FTS5)
+# - Japanese runs are indexed as overlapping character bigrams (+ trailing unigram),
+#   so any 1+ character substring of a Japanese title can be matched and ranked
+# - Latin text is indexed as lower-cased words (prefix match on the last query word)
+# - Updated incrementally from the save paths; `python search_index.py rebuild`
+#   re-indexes storage.json and ai_storage.json from scratch
+
+import json
+import re
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Iterable, Optional
+
+SEARCH_DB = Path("search_index.db")
+
+# Hiragana, katakana, CJK ideographs, full-width forms
+_CJK = r"぀-ヿ㐀-䶿一-鿿豈-﫿ｦ-ﾟ"
+_RUNS = re.compile(rf"([{_CJK}]+)|([0-9A-Za-z０-９Ａ-Ｚａ-ｚ]+)")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,          -- product | banner
+    ref TEXT NOT NULL,           -- link for products, image_url + text for banners
+    source TEXT,
+    payload TEXT NOT NULL,
+    UNIQUE (kind, ref)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(text_ja, text_en, tokenize = 'unicode61 remove_diacritics 2');
+"""
+
+# ----------------------------
+# Tokenization
+# ----------------------------
+def ngram_tokens(text: str):
+    """Japanese runs → bigrams + last char; latin/digit runs → lower-cased words."""
+    tokens = []
+    if not text:
+        return tokens
+    for cjk, word in _RUNS.findall(text):
+        if cjk:
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+            tokens.append(cjk[-1])
+        else:
+            tokens.append(word.lower())
+    return tokens
+
+def to_index_text(text: str) -> str:
+    return " ".join(ngram_tokens(text))
+
+def _quote(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+def build_match(query: str) -> Optional[str]:
+    """
+    Each whitespace-separated term must match (AND). A Japanese term becomes a
+    phrase of its bigrams; a single character becomes a prefix query.
+    """
+    clauses = []
+    for term in query.split():
+        for cjk, word in _RUNS.findall(term):
+            if cjk and len(cjk) == 1:
+                clauses.append(f"{_quote(cjk)}*")
+            elif cjk:
+                clauses.append(" + ".join(_quote(cjk[i:i + 2]) for i in range(len(cjk) - 1)))
+            else:
+                clauses.append(f"{_quote(word.lower())}*")
+    return " AND ".join(f"({c})" for c in clauses) if clauses else None
+
+# ----------------------------
+# Index
+# ----------------------------
+class SearchIndex:
+    def __init__(self, path=SEARCH_DB):
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _upsert(self, kind: str, ref: str, text_ja: str, text_en: str, source: str, payload: dict):
+        row = self.conn.execute("SELECT id FROM docs WHERE kind = ? AND ref = ?", (kind, ref)).fetchone()
+        body = json.dumps(payload, ensure_ascii=False)
+        if row:
+            doc_id = row[0]
+            self.conn.execute("UPDATE docs SET payload = ?, source = ? WHERE id = ?", (body, source, doc_id))
+            self.conn.execute("DELETE FROM docs_fts WHERE rowid = ?", (doc_id,))
+        else:
+            doc_id = self.conn.execute(
+                "INSERT INTO docs (kind, ref, source, payload) VALUES (?, ?, ?, ?)", (kind, ref, source, body)
+            ).lastrowid
+        self.conn.execute(
+            "INSERT INTO docs_fts (rowid, text_ja, text_en) VALUES (?, ?, ?)",
+            (doc_id, to_index_text(text_ja), to_index_text(text_en)),
+        )
+
+    def add(self, products: Iterable = (), banners: Iterable = (), source: str = "automated") -> int:
+        count = 0
+        with self.conn:
+            for p in products:
+                if not p.get("link"):
+                    continue
+                payload = p if isinstance(p, dict) else p.to_dict()
+                label_ja = p.get("discount_percent_ja") or p.get("discount_label_ja") or ""
+                label_en = p.get("discount_percent_en") or p.get("discount_label_en") or ""
+                self._upsert("product", p["link"], f"{p.get('title_ja') or ''} {label_ja}",
+                             f"{p.get('title_en') or ''} {label_en}", source, payload)
+                count += 1
+            for b in banners:
+                payload = b if isinstance(b, dict) else b.to_dict()
+                ref = f"{b.get('image_url')}\x1f{b.get('text_ja')}"
+                self._upsert("banner", ref, b.get("text_ja"), b.get("text_en"), source, payload)
+                count += 1
+        return count
+
+    def search(self, query: str, kind: Optional[str] = None, page: int = 1, page_size: int = 20) -> dict:
+        match = build_match(query)
+        if not match:
+            return {"total": 0, "page": page, "page_size": page_size, "results": []}
+
+        where = "docs_fts MATCH ?"
+        params = [match]
+        if kind:
+            where += " AND docs.kind = ?"
+            params.append(kind)
+
+        total = self.conn.execute(
+            f"SELECT COUNT(*) FROM docs_fts JOIN docs ON docs.id = docs_fts.rowid WHERE {where}", params
+        ).fetchone()[0]
+        rows = self.conn.execute(
+            f"""SELECT docs.kind, docs.source, docs.payload, bm25(docs_fts) AS score
+                FROM docs_fts JOIN docs ON docs.id = docs_fts.rowid
+                WHERE {where} ORDER BY score LIMIT ? OFFSET ?""",
+            params + [page_size, (page - 1) * page_size],
+        ).fetchall()
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "results": [
+                {"kind": k, "source": src, "score": round(-score, 4), **json.loads(payload)}
+                for k, src, payload, score in rows
+            ],
+        }
+
+    def search_ids(self, query: str, limit: int = 50) -> dict:
+        """{doc_id: relevance} for the best `limit` keyword matches (higher is better)."""
+        match = build_match(query)
+        if not match:
+            return {}
+        rows = self.conn.execute(
+            "SELECT rowid, bm25(docs_fts) AS score FROM docs_fts WHERE docs_fts MATCH ? ORDER BY score LIMIT ?",
+            (match, limit),
+        )
+        return {doc_id: -score for doc_id, score in rows}
+
+    def get_docs(self, ids, kind: Optional[str] = None) -> dict:
+        """{doc_id: (kind, payload)} in the order of `ids`."""
+        ids = list(ids)
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        rows = {
+            doc_id: (doc_kind, json.loads(payload))
+            for doc_id, doc_kind, payload in self.conn.execute(
+                f"SELECT id, kind, payload FROM docs WHERE id IN ({placeholders})", ids)
+            if kind is None or doc_kind == kind
+        }
+        return {doc_id: rows[doc_id] for doc_id in ids if doc_id in rows}
+
+def index_items(products=(), banners=(), source: str = "automated", path=SEARCH_DB) -> int:
+    """Convenience wrapper for the save paths."""
+    try:
+        with SearchIndex(path) as index:
+            return index.add(products, banners, source=source)
+    except Exception as e:
+        print(f"⚠️ Could not update search index: {e}")
+        return 0
+
+# ----------------------------
+# Rebuild
+# ----------------------------
+def rebuild(path=SEARCH_DB, storage="storage.json", ai_storage="ai_storage.json"):
+    Path(path).unlink(missing_ok=True)
+    total = 0
+    if Path(storage).exists():
+        with open(storage, "r", encoding="utf-8") as f:
+            total += index_items(products=json.load(f), source="selenium", path=path)
+    if Path(ai_storage).exists():
+        with open(ai_storage, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        total += index_items(data.get("products", []), data.get("banners", []), source="automated", path=path)
+    print(f"🔎 Indexed {total} documents into {path}")
+    return total
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["rebuild"]:
+        rebuild()
+    elif len(sys.argv) > 1:
+        with SearchIndex() as index:
+            print(json.dumps(index.search(" ".join(sys.argv[1:])), indent=2, ensure_ascii=False))
+    else:
+        print('Usage: python search_index.py rebuild | python search_index.py "検索語"')
@@ -0,0 +1,249 @@
+# selector_profiles.py
+# Declarative site profiles → compiled in-page extraction plans
+# - A profile (profiles/*.json, or .yaml when PyYAML is installed) lists, per page type
+#   ("products", "banners"), a container selector and the fields to read from each container
+# - Each page type compiles into ONE JavaScript function: a single evaluate() call returns
+#   every item plus per-field validation counts, instead of one round trip per element
+# - The same plan runs on a Playwright page or a Selenium driver (`run`) or as a
+#   MutationObserver harvester for streaming extraction (`harvester_js`)
+# - New Rakuten variants = a new profile file, no code changes
+#
+# Field spec:
+#   "selector": CSS relative to the container (omit → the container itself)
+#   "attr":     "text" (innerText, default), an attribute name, or a list tried in order
+#   "absolute": resolve href/src to an absolute URL
+#   "required": the item is skipped (counted as invalid) when this field is missing/invalid
+#   "pattern":  JS regular expression the value must match
+#
+# Profile-level "lazy_markers": CSS for markup that means more cards load while scrolling
+# (infinite-scroll sentinels, "load more" buttons, images without a src yet); an
+# unlimited HTTP scrape escalates to the browser when the static HTML contains any
+#
+# Usage:
+#   python selector_profiles.py                       # list profiles
+#   python selector_profiles.py rakuten_supersale     # print the compiled products plan
+
+import json
+import os
+import sys
+from collections import Counter, defaultdict
+from functools import lru_cache
+from pathlib import Path
+
+PROFILE_DIR = Path(__file__).resolve().parent / "profiles"
+DEFAULT_PROFILE = os.environ.get("SCRAPER_PROFILE", "rakuten_supersale")
+LAZY_MARKERS = (
+    "[data-infinite-scroll], [class*='infinite-scroll'], [class*='load-more'], [class*='loadmore'], "
+    "[class*='lazyload'], img[data-src]:not([src])"
+)
+
+# ----------------------------
+# JavaScript templates
+# ----------------------------
+# Shared by both templates: read one container into {values, status}
+_JS_PRELUDE = """
+  const PLAN = __PLAN__;
+  const FIELDS = Object.entries(PLAN.fields);
+  const read = (el, f) => {
+    const node = f.selector ? el.querySelector(f.selector) : el;
+    if (!node) return null;
+    for (const attr of [].concat(f.attr || "text")) {
+      let v = attr === "text" ? node.innerText : node.getAttribute(attr);
+      if (v && f.absolute && node[attr]) v = node[attr];  // resolved URL for href/src
+      if (v && v.trim()) return v.trim();
+    }
+    return null;
+  };
+  const patterns = {};
+  for (const [name, f] of FIELDS) if (f.pattern) patterns[name] = new RegExp(f.pattern);
+  const extract = (el) => {
+    const values = {}, status = {};
+    let ok = true;
+    for (const [name, f] of FIELDS) {
+      const v = read(el, f);
+      status[name] = v == null ? "missing" : (patterns[name] && !patterns[name].test(v) ? "invalid" : "ok");
+      values[name] = status[name] === "ok" ? v : null;
+      if (f.required && status[name] !== "ok") ok = false;
+    }
+    return { values, status, ok };
+  };
+  const tally = (stats, status) => {
+    for (const [name, s] of Object.entries(status)) {
+      stats[name] = stats[name] || { ok: 0, missing: 0, invalid: 0 };
+      stats[name][s] += 1;
+    }
+  };
+  const containers = () => {
+    let els = Array.from(document.querySelectorAll(PLAN.container));
+    if (PLAN.contains_text) els = els.filter((el) => (el.innerText || "").includes(PLAN.contains_text));
+    return els;
+  };
+"""
+
+# One-shot: every container currently in the DOM (optionally a slice of them)
+_JS_EXTRACT = """
+(opts) => {
+  opts = opts || {};
+""" + _JS_PRELUDE + """
+  const all = containers();
+  const start = opts.offset || 0;
+  const limit = opts.limit != null ? opts.limit : PLAN.limit;
+  const items = [], stats = {};
+  let skipped = 0;
+  for (const el of all.slice(start, limit != null ? start + limit : undefined)) {
+    const r = extract(el);
+    tally(stats, r.status);
+    if (r.ok) items.push(r.values); else skipped += 1;
+  }
+  return { items, stats, total: all.length, skipped };
+}
+"""
+
+# Streaming: a MutationObserver queues containers as they are inserted (numbered in
+# arrival order, so shard offsets stay stable); __harvest(force) returns the queued
+# ones whose required fields have rendered and leaves the rest for the next call
+# unless `force` is set. Installed once per page load.
+_JS_HARVESTER = """
+() => {
+  if (window.__harvest) return;
+""" + _JS_PRELUDE + """
+  const pending = [];
+  const seen = new WeakSet();
+  let next = 0;
+  const track = (el) => { if (!seen.has(el)) { seen.add(el); pending.push({ idx: next++, el }); } };
+  const accept = (el) => !PLAN.contains_text || (el.innerText || "").includes(PLAN.contains_text);
+  containers().forEach(track);
+  new MutationObserver((mutations) => {
+    for (const m of mutations) {
+      for (const node of m.addedNodes) {
+        if (node.nodeType !== 1) continue;
+        if (node.matches(PLAN.container) && accept(node)) track(node);
+        node.querySelectorAll(PLAN.container).forEach((el) => accept(el) && track(el));
+      }
+    }
+  }).observe(document.body, { childList: true, subtree: true });
+
+  window.__harvest = (force) => {
+    const cards = [], stats = {};
+    for (let i = 0; i < pending.length; ) {
+      const { idx, el } = pending[i];
+      const r = extract(el);
+      if (!r.ok && !force) { i++; continue; }
+      pending.splice(i, 1);
+      tally(stats, r.status);
+      cards.push(r.ok ? { idx, ...r.values } : { idx, invalid: true });
+    }
+    return { cards, stats, seen: next, height: document.body.scrollHeight };
+  };
+}
+"""
+
+# ----------------------------
+# Validation stats
+# ----------------------------
+class FieldStats:
+    """Per-field ok / missing / invalid counts accumulated over evaluate() calls."""
+
+    def __init__(self):
+        self.counts = defaultdict(Counter)
+
+    def add(self, stats: dict):
+        for field, counts in (stats or {}).items():
+            self.counts[field].update(counts)
+
+    def summary(self) -> dict:
+        out = {}
+        for field, c in self.counts.items():
+            total = sum(c.values())
+            out[field] = {**c, "hit_rate": round(c["ok"] / total, 3) if total else None}
+        return out
+
+    def report(self) -> str:
+        return ", ".join(f"{field} {s['hit_rate']:.0%}" for field, s in self.summary().items() if s["hit_rate"] is not None)
+
+# ----------------------------
+# Plans / profiles
+# ----------------------------
+class ExtractionPlan:
+    def __init__(self, page_type: str, spec: dict):
+        self.page_type = page_type
+        self.spec = spec
+        self.container = spec["container"]
+        self.required = [name for name, field in spec["fields"].items() if field.get("required")]
+        self.stats = FieldStats()
+        plan = json.dumps(spec, ensure_ascii=False)
+        self.js = _JS_EXTRACT.replace("__PLAN__", plan)
+        self.harvester_js = _JS_HARVESTER.replace("__PLAN__", plan)
+
+    def evaluate(self, target, offset: int = 0, limit: int = None) -> dict:
+        """Run the plan on a Playwright page, Selenium driver or http_fetch.StaticPage without touching `stats`."""
+        opts = {"offset": offset, "limit": limit}
+        if hasattr(target, "extract"):
+            return target.extract(self.spec, opts)  # parsed HTML, no browser
+        if hasattr(target, "execute_script"):
+            return target.execute_script(f"return ({self.js})(arguments[0]);", opts)
+        return target.evaluate(self.js, opts)
+
+    def run(self, target, offset: int = 0, limit: int = None) -> dict:
+        """One evaluate() → {"items", "stats", "total", "skipped"} (Playwright page or Selenium driver)."""
+        result = self.evaluate(target, offset, limit)
+        self.stats.add(result["stats"])
+        return result
+
+    def harvest(self, page, force: bool = False) -> dict:
+        """Drain the harvester installed with `page.evaluate(plan.harvester_js)`."""
+        result = page.evaluate("(force) => window.__harvest(force)", force)
+        self.stats.add(result["stats"])
+        return result
+
+class Profile:
+    def __init__(self, spec: dict):
+        self.name = spec["name"]
+        self.match = spec.get("match", [])
+        self.lazy_markers = spec.get("lazy_markers", LAZY_MARKERS)
+        self.plans = {page_type: ExtractionPlan(page_type, page) for page_type, page in spec["pages"].items()}
+
+    def plan(self, page_type: str) -> ExtractionPlan:
+        return self.plans[page_type]
+
+    def stats(self) -> dict:
+        return {page_type: plan.stats.summary() for page_type, plan in self.plans.items()}
+
+def _read_spec(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix in (".yaml", ".yml"):
+            import yaml  # optional: only needed for YAML profiles
+            return yaml.safe_load(f)
+        return json.load(f)
+
+@lru_cache(maxsize=None)
+def available_profiles(directory=PROFILE_DIR) -> dict:
+    specs = {}
+    for path in sorted(Path(directory).glob("*")):
+        if path.suffix in (".json", ".yaml", ".yml"):
+            spec = _read_spec(path)
+            specs[spec["name"]] = spec
+    return specs
+
+def load_profile(name: str = None, url: str = None) -> Profile:
+    """
+    A fresh Profile (own stats) by name, else the first whose `match`
+    patterns occur in `url`, else DEFAULT_PROFILE.
+    """
+    specs = available_profiles()
+    if name:
+        if name not in specs:
+            raise ValueError(f"unknown selector profile '{name}' (available: {', '.join(specs)})")
+        return Profile(specs[name])
+    if url:
+        for spec in specs.values():
+            if any(pattern in url for pattern in spec.get("match", [])):
+                return Profile(spec)
+    return Profile(specs[DEFAULT_PROFILE])
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(load_profile(sys.argv[1]).plan(sys.argv[2] if len(sys.argv) > 2 else "products").js)
+    else:
+        for name, spec in available_profiles().items():
+            print(f"{name}: {spec.get('description', '')} ({', '.join(spec['pages'])})")
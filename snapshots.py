@@ -0,0 +1,274 @@
+# snapshots.py
+# Compressed raw-page snapshot archive + offline reprocessing
+# - With SNAPSHOTS=1 (or `run_scraper.py --snapshot`) every scrape stores the rendered
+#   HTML and the page's image URLs, zstd-compressed (gzip when `zstandard` is missing)
+# - Content-addressed: snapshots/<2 hex>/<digest>.html.zst, digest = hash of the HTML,
+#   so an unchanged page across rounds is stored once; snapshots.db lists every capture
+# - `reprocess` re-runs extraction (selector profiles on the stored HTML, in worker
+#   processes), translation (shared translations.db cache) and optionally OCR over the
+#   archive, without a browser — parser/translator changes can be checked on old pages
+#
+# Usage:
+#   python snapshots.py stats
+#   python snapshots.py reprocess [--url URL] [--since UNIX_TS] [--workers N] [--ocr] [--output reprocessed.json] [--profile]
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+SNAPSHOT_DIR = Path("snapshots")
+SNAPSHOTS_DB = Path("snapshots.db")
+SNAPSHOT_ENABLED = os.environ.get("SNAPSHOTS", "0") == "1"
+ZSTD_LEVEL = 10
+REPROCESS_OUTPUT = Path("reprocessed.json")
+
+# Image URLs currently in the DOM (lazy images report currentSrc once loaded)
+IMAGES_JS = "() => Array.from(document.images, (img) => img.currentSrc || img.src).filter(Boolean)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    digest TEXT PRIMARY KEY,
+    codec TEXT NOT NULL,         -- zstd | gzip
+    size INTEGER NOT NULL,       -- uncompressed bytes
+    stored_size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    profile TEXT,
+    captured_at INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    images TEXT NOT NULL         -- JSON list of image URLs
+);
+CREATE INDEX IF NOT EXISTS snapshots_url ON snapshots (url, captured_at);
+"""
+
+# ----------------------------
+# Compression
+# ----------------------------
+def _zstd():
+    try:
+        import zstandard  # optional: gzip is used without it
+        return zstandard
+    except ImportError:
+        return None
+
+def compress(data: bytes):
+    """(codec, compressed bytes)."""
+    zstd = _zstd()
+    if zstd is not None:
+        return "zstd", zstd.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return "gzip", gzip.compress(data, compresslevel=9)
+
+def decompress(codec: str, data: bytes) -> bytes:
+    if codec == "zstd":
+        zstd = _zstd()
+        if zstd is None:
+            raise RuntimeError("snapshot is zstd-compressed: pip install zstandard")
+        return zstd.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def blob_path(digest: str, codec: str, root=SNAPSHOT_DIR) -> Path:
+    return Path(root) / digest[:2] / f"{digest}.html.{'zst' if codec == 'zstd' else 'gz'}"
+
+def read_html(path, codec: str) -> str:
+    return decompress(codec, Path(path).read_bytes()).decode("utf-8")
+
+# ----------------------------
+# Archive
+# ----------------------------
+class SnapshotArchive:
+    def __init__(self, path=SNAPSHOTS_DB, root=SNAPSHOT_DIR):
+        self.root = Path(root)
+        self.conn = sqlite3.connect(str(path), timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def put(self, url: str, html: str, images=(), profile: str = None) -> str:
+        """Store one capture; the HTML itself only when this exact page was never archived."""
+        data = html.encode("utf-8")
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        row = self.conn.execute("SELECT codec FROM blobs WHERE digest = ?", (digest,)).fetchone()
+        with self.conn:
+            if row is None:
+                codec, packed = compress(data)
+                path = blob_path(digest, codec, self.root)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(".tmp")
+                tmp.write_bytes(packed)
+                tmp.replace(path)
+                self.conn.execute("INSERT OR IGNORE INTO blobs VALUES (?, ?, ?, ?)", (digest, codec, len(data), len(packed)))
+            self.conn.execute(
+                "INSERT INTO snapshots (url, profile, captured_at, digest, images) VALUES (?, ?, ?, ?, ?)",
+                (url, profile, int(time.time()), digest, json.dumps(list(dict.fromkeys(images)))),
+            )
+        return digest
+
+    def capture(self, target, url: str, profile: str = None) -> str:
+        """Snapshot a Playwright page, Selenium driver or http_fetch.StaticPage."""
+        if hasattr(target, "extract"):
+            html, images = target.serialize(), target.images()
+        elif hasattr(target, "execute_script"):
+            html, images = target.page_source, target.execute_script(f"return ({IMAGES_JS})();")
+        else:
+            html, images = target.content(), target.evaluate(IMAGES_JS)
+        return self.put(url, html, images, profile)
+
+    def list(self, url: str = None, since: int = None):
+        """Captures (oldest first) as dicts with the blob location."""
+        sql = ("SELECT s.id, s.url, s.profile, s.captured_at, s.digest, s.images, b.codec "
+               "FROM snapshots s JOIN blobs b ON b.digest = s.digest WHERE 1=1")
+        args = []
+        if url:
+            sql += " AND s.url = ?"
+            args.append(url)
+        if since:
+            sql += " AND s.captured_at >= ?"
+            args.append(since)
+        rows = self.conn.execute(sql + " ORDER BY s.captured_at, s.id", args)
+        return [
+            {"id": i, "url": u, "profile": p, "captured_at": at, "digest": d, "images": json.loads(imgs),
+             "codec": codec, "path": str(blob_path(d, codec, self.root))}
+            for i, u, p, at, d, imgs, codec in rows
+        ]
+
+    def stats(self) -> dict:
+        snapshots = self.conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        blobs, size, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()
+        return {
+            "snapshots": snapshots,
+            "distinct_pages": blobs,
+            "html_bytes": size,
+            "stored_bytes": stored,
+            "compression_ratio": round(size / stored, 1) if stored else None,
+        }
+
+def archive_page(target, url: str, profile: str = None):
+    """Best-effort capture used by the scrapers; a failed snapshot never fails the scrape."""
+    try:
+        with SnapshotArchive() as archive:
+            digest = archive.capture(target, url, profile)
+        print(f"🗄️ Snapshot archived ({digest[:12]})")
+        return digest
+    except Exception as e:
+        print(f"⚠️ Could not archive snapshot: {e}")
+        return None
+
+# ----------------------------
+# Reprocessing
+# ----------------------------
+def extract_snapshot(snap: dict) -> dict:
+    """Worker: decompress, parse and run the selector profile on one snapshot (no browser)."""
+    from http_fetch import StaticPage
+    from layout_drift import FALLBACK_PROFILE, heuristic_card, probe
+    from selector_profiles import load_profile
+
+    page = StaticPage(snap["url"], read_html(snap["path"], snap["codec"]))
+    try:
+        profile = load_profile(snap["profile"]) if snap["profile"] else load_profile(url=snap["url"])
+    except ValueError:
+        profile = load_profile(url=snap["url"])  # profile was renamed / removed since
+    plan = profile.plan("products")
+    drift = probe(page, plan, timeout=0)  # a stored page does not change: one look is enough
+    if drift["drifted"]:
+        plan = load_profile(FALLBACK_PROFILE).plan("products")
+    products = []
+    for raw in plan.run(page)["items"]:
+        raw = heuristic_card(raw) if drift["drifted"] else raw
+        if raw:
+            products.append({**raw, "scraped_at": snap["captured_at"]})
+    banners = profile.plan("banners").run(page)["items"] if "banners" in profile.plans else []
+    banners = [{**raw, "scraped_at": snap["captured_at"]} for raw in banners]
+    return {"id": snap["id"], "products": products, "banners": banners, "drifted": drift["drifted"]}
+
+def reprocess(url: str = None, since: int = None, workers: int = None, ocr: bool = False,
+              output=REPROCESS_OUTPUT) -> dict:
+    """Re-run extraction → normalization → translation (and optionally OCR) over archived snapshots."""
+    from pipeline import ListSink
+    from records import to_jsonable
+    from run_scraper import load_automated_scraper
+
+    with SnapshotArchive() as archive:
+        snaps = archive.list(url, since)
+    if not snaps:
+        print("🗄️ No snapshots to reprocess")
+        return {"products": [], "banners": []}
+
+    started = time.monotonic()
+    scraper = load_automated_scraper()  # same normalizers/translator as live scrapes
+    pipe = scraper.make_pipeline(set(), set(), ListSink(), images=False)
+    drifted = 0
+    try:
+        # Parsing is CPU-bound: one process per core; the pipeline thread translates meanwhile
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for result in pool.map(extract_snapshot, snaps, chunksize=4):
+                drifted += result["drifted"]
+                for raw in result["products"]:
+                    pipe.put("products", raw)
+                for raw in result["banners"]:
+                    pipe.put("banners", raw)
+    finally:
+        data, stats = pipe.close()
+
+    data = {"products": data["products"], "banners": data["banners"]}
+    if ocr:
+        data["ocr_banners"] = ocr_images({u for s in snaps for u in s["images"]})
+
+    output = Path(output)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False, default=to_jsonable)
+    print(
+        f"✅ Reprocessed {len(snaps)} snapshots in {time.monotonic() - started:.1f}s ({drifted} with layout drift): "
+        f"{stats['products']} products, {stats['banners']} banners, {stats['translate_calls']} translation requests, "
+        f"{stats['translation_cache_hits']} cached translations → {output}"
+    )
+    return data
+
+def ocr_images(urls, workers: int = 4) -> list:
+    """OCR the archived image URLs with ai_scraper's Tesseract pipeline."""
+    from concurrent.futures import ThreadPoolExecutor
+    from ai_scraper import extract_text_from_image  # pytesseract/spaCy: only needed with --ocr
+
+    urls = sorted(u for u in urls if u.startswith("http"))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        found = [r for r in pool.map(extract_text_from_image, urls) if r]
+    print(f"🖼️ OCR extracted {len(found)} banners from {len(urls)} archived images")
+    return found
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Snapshot archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("stats")
+    rp = sub.add_parser("reprocess", help="re-extract, translate (and OCR) archived pages")
+    rp.add_argument("--url", help="only snapshots of this URL")
+    rp.add_argument("--since", type=int, help="only snapshots captured at or after this unix time")
+    rp.add_argument("--workers", type=int, help="extraction processes (default: CPU count)")
+    rp.add_argument("--ocr", action="store_true", help="also OCR the archived image URLs")
+    rp.add_argument("--output", type=Path, default=REPROCESS_OUTPUT)
+    rp.add_argument("--profile", action="store_true",
+                    help="profile translation / OCR / saving in this process (extraction workers are separate processes)")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        with SnapshotArchive() as archive:
+            print(json.dumps(archive.stats(), indent=2))
+    else:
+        from profiling import PROFILE_ENABLED, profiled
+        with profiled("reprocess", enabled=args.profile or PROFILE_ENABLED):
+            reprocess(args.url, args.since, args.workers, args.ocr, args.output)
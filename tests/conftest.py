@@ -0,0 +1,7 @@
+# tests/conftest.py
+# The modules are top-level scripts: make the repository root importable
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,47 @@
+# tests/test_columnar.py
+import io
+import json
+
+import pytest
+
+from columnar import JsonStream
+
+STORE = {
+    "products": [
+        {"title_ja": "長い商品名 \"引用\" と \\ バックスラッシュ", "discounted_price": "1,980円", "scraped_at": 1717495200,
+         "ratio": 12.5e-1, "tags": ["a", {"nested": [1, 2, {"deep": None}]}], "ok": True},
+        {"title_ja": "二つ目", "discounted_price": -1234567, "ok": False},
+    ],
+    "meta": {"version": 2, "items": [1, 2]},
+    "banners": [{"text_ja": "最大50%OFF", "image_url": "https://img/1.jpg"}],
+    "count": 3,
+}
+
+def stream(text: str, chunk_size: int):
+    return list(JsonStream(io.StringIO(text), chunk_size=chunk_size))
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_object_sections_at_any_chunk_boundary(chunk_size, indent):
+    items = stream(json.dumps(STORE, ensure_ascii=False, indent=indent), chunk_size)
+    assert items == [("products", p) for p in STORE["products"]] + [("banners", b) for b in STORE["banners"]]
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 5, 1 << 20])
+def test_top_level_array(chunk_size):
+    items = [{"link": "https://item/1", "price": 1980}, 3.25, "文字列", [1, [2]], None, 10]
+    assert stream(json.dumps(items, ensure_ascii=False, indent=4), chunk_size) == [(None, i) for i in items]
+
+def test_numbers_split_mid_number():
+    # "12.5" / "1e3" cut after the "." or the "e" must not decode as 12 / 1
+    text = "[12.5, 1e3, -7, 100]"
+    for chunk_size in range(1, len(text) + 1):
+        assert [v for _, v in stream(text, chunk_size)] == [12.5, 1000.0, -7, 100]
+
+def test_empty_inputs():
+    assert stream("[]", 1) == []
+    assert stream("{}", 1) == []
+    assert stream('{"products": [], "banners": []}', 3) == []
+
+def test_truncated_input_raises():
+    with pytest.raises(ValueError):
+        stream('[{"title": "cut', 4)
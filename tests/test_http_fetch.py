@@ -0,0 +1,44 @@
+# tests/test_http_fetch.py
+import sys
+
+from http_fetch import FetchEngine, StaticPage
+from selector_profiles import load_profile
+
+CARD = """<div class="ecm-ad"><a class="ecm-ad-link" href="/item/{i}/"><img src="/img/{i}.jpg"></a>
+<div class="ecm-ad-name">商品{i}</div><div class="ecm-ad-price-amount">{i},980円</div></div>"""
+
+class CannedEngine(FetchEngine):
+    def __init__(self, html, tmp_path):
+        super().__init__(stats_file=tmp_path / "fetch_stats.json")
+        self.html = html
+
+    def fetch(self, url):
+        return StaticPage(url, self.html)
+
+def page(extra=""):
+    return "<html><body>" + "".join(CARD.format(i=i) for i in range(1, 4)) + extra + "</body></html>"
+
+def test_unlimited_scrape_stays_on_http_without_lazy_markers(tmp_path):
+    engine = CannedEngine(page(), tmp_path)
+    outcome = engine.try_cheap("https://event.rakuten.co.jp/campaign/x/", load_profile("rakuten_supersale"),
+                               needed=sys.maxsize, mode="auto")
+    assert outcome is not None and len(outcome[1]["items"]) == 3
+    assert engine.stats["cheap"] == 1
+
+def test_unlimited_scrape_escalates_when_more_cards_load_while_scrolling(tmp_path):
+    for marker in ('<div class="infinite-scroll-sentinel"></div>', '<button class="load-more">もっと見る</button>',
+                   '<img data-src="/img/4.jpg">'):
+        engine = CannedEngine(page(marker), tmp_path)
+        assert engine.try_cheap("https://event.rakuten.co.jp/campaign/x/", load_profile("rakuten_supersale"),
+                                needed=sys.maxsize, mode="auto") is None
+        assert engine.stats["escalated"] == 1
+
+def test_limited_scrape_ignores_lazy_markers_when_enough_cards(tmp_path):
+    engine = CannedEngine(page('<div class="infinite-scroll-sentinel"></div>'), tmp_path)
+    assert engine.try_cheap("https://event.rakuten.co.jp/campaign/x/", load_profile("rakuten_supersale"),
+                            needed=2, mode="auto") is not None
+
+def test_http_mode_never_escalates(tmp_path):
+    engine = CannedEngine(page('<div class="infinite-scroll-sentinel"></div>'), tmp_path)
+    assert engine.try_cheap("https://event.rakuten.co.jp/campaign/x/", load_profile("rakuten_supersale"),
+                            needed=sys.maxsize, mode="http") is not None
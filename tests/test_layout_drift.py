@@ -0,0 +1,20 @@
+# tests/test_layout_drift.py
+import time
+
+from http_fetch import StaticPage
+from layout_drift import probe, ready_state
+from selector_profiles import load_profile
+
+CARD = '<div class="card"><img src="/i/{i}.jpg"><a href="/item/{i}">商品{i}</a><p>1,980円</p></div>'
+
+def test_static_pages_are_never_loading():
+    page = StaticPage("https://example.com/", "<html><body><p>変更されたマークアップ</p></body></html>")
+    assert ready_state(page) == "complete"
+
+def test_probe_on_a_static_page_reports_drift_without_waiting():
+    page = StaticPage("https://example.com/", "<html><body>" + "".join(CARD.format(i=i) for i in range(3)) + "</body></html>")
+    plan = load_profile("rakuten_supersale").plan("products")
+    start = time.monotonic()
+    report = probe(page, plan, timeout=0)
+    assert time.monotonic() - start < 1
+    assert report["drifted"] and not report["timed_out"]
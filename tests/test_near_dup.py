@@ -0,0 +1,85 @@
+# tests/test_near_dup.py
+import pytest
+
+from near_dup import NUM_PERM, MinHasher, NearDupIndex, banner_kind, lsh_params, normalize, numbers, similarity
+
+@pytest.fixture
+def index():
+    with NearDupIndex(":memory:") as index:
+        yield index
+
+def seen(index, text, source="ocr"):
+    return index.seen(banner_kind(text, source), text)
+
+@pytest.mark.parametrize("first, second", [
+    ("最大50%OFFクーポン配布中！スーパーセール", "最大70%OFFクーポン配布中！スーパーセール"),
+    ("ポイント最大47倍 楽天スーパーセール", "ポイント最大41倍 楽天スーパーセール"),
+])
+def test_different_numbers_are_different_banners(index, first, second):
+    assert seen(index, first) is None
+    assert seen(index, second) is None
+    assert index.count() == 2
+
+@pytest.mark.parametrize("clean, noisy", [
+    ("最大50%OFFクーポン配布中！スーパーセール", "最大5O%OFFクーポン配布中!スーパ一セール"),
+    ("【エントリー】ポイント10倍", "[エントリ一]ポイントl0倍"),
+])
+def test_ocr_noise_is_a_duplicate(index, clean, noisy):
+    assert seen(index, clean) is None
+    match = seen(index, noisy)
+    assert match is not None and match["text"] == clean
+
+def test_normalize_undoes_ocr_misreads():
+    assert normalize("最大5O%OFF") == normalize("最大50%OFF") == "最大50off"
+    assert normalize("スーパ一セール") == normalize("スーパーセール")
+    assert normalize("l00円") == "100円"
+    assert normalize("iPhone15 Pixel7") == "iphone15pixel7"  # letters inside words are kept
+    assert numbers("1,980円 ポイント5倍") == ["1980", "5"]
+
+def test_minhash_estimates_similarity():
+    hasher = MinHasher()
+    text = "楽天スーパーセール 半額 タイムセール 開催中"
+    assert similarity(hasher.signature(text), hasher.signature(text)) == 1.0
+    assert similarity(hasher.signature(text), hasher.signature("まったく関係のない商品説明文です")) < 0.2
+    assert hasher.signature("") is None
+
+def test_kinds_are_separate_namespaces(index):
+    assert index.seen("a", "楽天スーパーセール開催中") is None
+    assert index.seen("b", "楽天スーパーセール開催中") is None
+    assert index.seen("a", "楽天スーパーセール開催中!") is not None
+
+def test_lsh_params_cover_the_signature():
+    for threshold in (0.5, 0.7, 0.9):
+        bands, rows = lsh_params(threshold, NUM_PERM)
+        assert bands * rows <= NUM_PERM
+    assert lsh_params(0.9, NUM_PERM)[1] > lsh_params(0.5, NUM_PERM)[1]   # stricter: longer bands
+
+def test_lsh_finds_a_noisy_copy_among_unrelated_texts(index):
+    for i in range(300):
+        index.add("banner", f"商品{i}番 タイムセール限定 クーポン{i * 7}円引き", commit=False)
+    target = "楽天スーパーセール 半額アイテム多数 エントリーでポイントアップ"
+    index.add("banner", target)
+    match = index.find("banner", "楽天スーパーセール 半額アイテム多数 エントリ一でポイントアップ!")
+    assert match is not None and match["text"] == target
+    assert index.stats["candidates"] < 50   # read from the buckets, not the whole index
+
+def test_threshold_change_rebuilds_buckets(tmp_path):
+    path = tmp_path / "near_dup.db"
+    with NearDupIndex(path, threshold=0.7) as index:
+        index.add("banner", "楽天スーパーセール開催中 最大50%OFF")
+    with NearDupIndex(path, threshold=0.5) as index:
+        assert index.count() == 1
+        assert index.find("banner", "楽天スーパーセール開催中 最大50%OFF") is not None
+
+def test_failed_save_indexes_nothing(tmp_path):
+    path = tmp_path / "near_dup.db"
+    text = "楽天スーパーセール 最大半額 ワイヤレスイヤホン"
+    with pytest.raises(OSError):
+        with NearDupIndex(path) as near:   # the save paths' pattern: commit only after the JSON write
+            assert near.seen("title:automated", text, commit=False) is None
+            raise OSError("disk full")
+    with NearDupIndex(path) as near:
+        assert near.seen("title:automated", text, commit=False) is None
+        near.commit()
+    with NearDupIndex(path) as near:
+        assert near.seen("title:automated", text) is not None
@@ -0,0 +1,64 @@
+# tests/test_price_history.py
+import pytest
+
+from price_history import COMPACT_EVERY, PriceHistory, _read_varint, _unzigzag, _write_varint, _zigzag, decode_series, encode_series
+
+@pytest.mark.parametrize("n", [0, 1, -1, 63, -64, 64, 1 << 31, -(1 << 31), (1 << 62) - 1, -(1 << 62)])
+def test_zigzag_round_trip(n):
+    assert _zigzag(n) >= 0
+    assert _unzigzag(_zigzag(n)) == n
+
+def test_zigzag_keeps_small_deltas_small():
+    assert [_zigzag(n) for n in (0, -1, 1, -2, 2)] == [0, 1, 2, 3, 4]
+
+@pytest.mark.parametrize("n", [0, 1, 127, 128, 300, 16383, 16384, 1 << 40])
+def test_varint_round_trip(n):
+    out = bytearray(b"\xff")   # decoding starts at an offset
+    _write_varint(out, n)
+    assert _read_varint(bytes(out), 1) == (n, len(out))
+    assert len(out) - 1 == max(1, -(-n.bit_length() // 7))
+
+def test_series_round_trip_with_missing_values():
+    rows = [
+        (1717495200, 2480, 1980, 3),
+        (1717498800, 2480, 1780, 3),
+        (1717502400, None, 1780, None),   # original price / label gone
+        (1717506000, 2480, 2480, 1),      # price back up
+    ]
+    blob = encode_series(rows)
+    assert decode_series(blob, len(rows)) == rows
+    assert len(blob) < 4 * 8 * len(rows) // 2   # deltas, not fixed-width integers
+
+def test_empty_series():
+    assert encode_series([]) == b""
+    assert decode_series(b"", 0) == []
+
+DAY = 86400
+
+def _record_rounds(store, prices, start=1717495200):
+    for i, price in enumerate(prices):
+        store.record_many([{"link": "https://item.rakuten.co.jp/shop/a/", "original_price": "¥2,480",
+                            "discounted_price": f"¥{price:,}"}], observed_at=start + i * DAY)
+    return start + len(prices) * DAY
+
+def test_compact_keeps_the_history(tmp_path):
+    with PriceHistory(tmp_path / "h.db") as store:
+        end = _record_rounds(store, [1980, 1780, 1780, 2480, 1480])
+        before = store.history("https://item.rakuten.co.jp/shop/a/")
+        assert len(before) == 4   # the unchanged round is not stored
+        assert store.compact(end - 2 * DAY) == 2
+        assert store.conn.execute("SELECT count(*) FROM observations").fetchone()[0] == 2
+        assert store.history("https://item.rakuten.co.jp/shop/a/") == before
+        assert store.compact(end) == 2   # folds into the existing blob
+        assert store.history("https://item.rakuten.co.jp/shop/a/") == before
+        assert store.conn.execute("SELECT count FROM packed").fetchone()[0] == 4
+
+def test_compact_if_due_runs_once_per_period(tmp_path):
+    with PriceHistory(tmp_path / "h.db") as store:
+        end = _record_rounds(store, [1980, 1780, 2480])
+        assert store.compact_if_due(older_than_days=0, now=end) == 0   # disabled
+        assert store.compact_if_due(older_than_days=1, now=end) == 2
+        _record_rounds(store, [1480], start=end)
+        assert store.compact_if_due(older_than_days=0, now=end + 2 * DAY) == 0
+        assert store.compact_if_due(older_than_days=1, now=end + COMPACT_EVERY - 1) == 0
+        assert store.compact_if_due(older_than_days=1, now=end + 3 * DAY) == 2
@@ -0,0 +1,38 @@
+# tests/test_records.py
+import json
+
+import pytest
+
+from records import ProductRecord, parse_price, to_jsonable
+
+@pytest.mark.parametrize("text, price", [
+    ("5,980円", 5980),
+    ("¥5,980", 5980),
+    ("5,980円(税込)", 5980),
+    (5980, 5980),
+    ("2個で3,000円", 3000),             # the yen amount, not 23000
+    ("1,980円～2,480円", None),         # a range is not one price
+    ("送料無料", None),
+    (None, None),
+])
+def test_parse_price(text, price):
+    assert parse_price(text) == price
+
+def test_record_round_trip_keeps_scraped_strings():
+    raw = {
+        "title_ja": "タイトル", "title_en": None, "original_price": "2,480円", "discounted_price": "1,980円(税込)",
+        "discount_percent_ja": "20%OFF", "discount_percent_en": None, "image_url": "https://img/1.jpg",
+        "link": "https://item/1", "scraped_at": "2024-06-04 10:00:00 UTC", "image_id": None,
+    }
+    record = ProductRecord.from_dict(raw)
+    assert record.discounted_price == 1980
+    assert json.loads(json.dumps(record, default=to_jsonable)) == raw
+
+def test_only_non_canonical_price_strings_are_stored():
+    record = ProductRecord("タイトル", None, "2,480円", "￥1,980", None, None, None, "https://item/1", None)
+    assert record._original_price_text is None            # rebuilt by format_price on read
+    assert record["original_price"] == "2,480円"
+    assert record._discounted_price_text == "￥1,980"
+    assert record["discounted_price"] == "￥1,980"
+    record["discounted_price"] = 1780                       # an integer drops the stale scraped string
+    assert record._discounted_price_text is None and record["discounted_price"] == "1,780円"
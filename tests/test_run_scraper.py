@@ -0,0 +1,44 @@
+# tests/test_run_scraper.py
+import json
+
+import pytest
+
+from run_scraper import DEFAULT_URL, parse_args
+
+def with_config(tmp_path, config, *argv):
+    path = tmp_path / "scraper_config.json"
+    path.write_text(json.dumps(config), encoding="utf-8")
+    return parse_args(["--config", str(path), *argv])
+
+def test_config_keys_are_flag_names(tmp_path):
+    args = with_config(tmp_path, {"url": ["https://a/", "https://b/"], "limit": 50, "max-browser-mb": 512,
+                                  "adaptive": True, "fetch_mode": "http", "interval": "5m", "rounds": 0})
+    assert args.urls == ["https://a/", "https://b/"]
+    assert (args.limit, args.max_browser_mb, args.adaptive, args.fetch_mode, args.interval) == (50, 512, True, "http", 300)
+
+def test_config_strings_are_converted_like_flags(tmp_path):
+    args = with_config(tmp_path, {"limit": "50", "urls": "https://a/", "output_file": "out.json"})
+    assert args.limit == 50 and args.urls == ["https://a/"] and str(args.output_file) == "out.json"
+
+def test_command_line_wins_over_config(tmp_path):
+    args = with_config(tmp_path, {"limit": 50, "url": "https://a/"}, "--limit", "10")
+    assert args.limit == 10 and args.urls == ["https://a/"]
+    assert with_config(tmp_path, {}).urls == [DEFAULT_URL]
+
+@pytest.mark.parametrize("config, message", [
+    ({"limit": "fifty"}, "invalid value for 'limit'"),
+    ({"limit": True}, "'limit' must be a string or number"),
+    ({"rounds": 1.5}, "'rounds' must be a string or number"),
+    ({"adaptive": "yes"}, "'adaptive' must be true or false"),
+    ({"fetch-mode": "ftp"}, "'fetch-mode' must be one of auto, http, browser"),
+    ({"output_file": 3}, "'output_file' must be a string"),
+    ({"url": [{"href": "https://a/"}]}, "'url' must be a string or number"),
+    ({"lmit": 5}, "unknown key 'lmit'"),
+    ({"config": "other.json"}, "unknown key 'config'"),
+    ([50], "must be a JSON object"),
+])
+def test_bad_config_is_a_usage_error(tmp_path, capsys, config, message):
+    with pytest.raises(SystemExit) as exc:
+        with_config(tmp_path, config)
+    assert exc.value.code == 2
+    assert message in capsys.readouterr().err
@@ -0,0 +1,75 @@
+# tests/test_scheduler.py
+from datetime import datetime
+
+import pytest
+
+from scheduler import JST, AdaptiveScheduler, backoff_delay, in_sale_window, parse_sale_windows
+
+URL = "https://event.rakuten.co.jp/campaign/supersale/"
+
+def jst(hour, minute=0):
+    return datetime(2025, 9, 4, hour, minute, tzinfo=JST).timestamp()
+
+# ----------------------------
+# Backoff
+# ----------------------------
+@pytest.mark.parametrize("attempt, full", [(0, 5.0), (1, 10.0), (3, 40.0), (5, 120.0), (20, 120.0)])
+def test_backoff_delay_is_capped_equal_jitter(attempt, full):
+    for _ in range(50):
+        assert full / 2 <= backoff_delay(attempt) <= full
+
+# ----------------------------
+# Sale windows
+# ----------------------------
+def test_parse_sale_windows():
+    assert parse_sale_windows("20:00-02:00, 9:30-10:00") == [(1200, 120), (570, 600)]
+    assert parse_sale_windows(["12:00-13:00"]) == [(720, 780)]
+    assert parse_sale_windows("") == parse_sale_windows(None) == []
+
+@pytest.mark.parametrize("spec", ["20:00", "20-02", "20:00-02:00-03:00", "24:00-02:00", "20:60-21:00", "ab:cd-ef:gh"])
+def test_malformed_sale_windows_raise_value_error(spec):
+    with pytest.raises(ValueError, match="invalid sale window"):
+        parse_sale_windows(spec)
+
+def test_sale_window_wrapping_midnight():
+    windows = parse_sale_windows("20:00-02:00")
+    assert in_sale_window(windows, jst(20))
+    assert in_sale_window(windows, jst(1, 59))
+    assert not in_sale_window(windows, jst(2))
+    assert not in_sale_window(windows, jst(19, 59))
+    assert not in_sale_window([], jst(21))
+
+def test_sale_window_shortens_the_delay():
+    scheduler = AdaptiveScheduler(600, sale_windows="20:00-02:00", jitter=0)
+    assert scheduler.next_delay(URL, now=jst(12)) == 600
+    assert scheduler.next_delay(URL, now=jst(21)) == 300
+
+# ----------------------------
+# Change-rate model
+# ----------------------------
+def test_ewma_of_change_gaps():
+    scheduler = AdaptiveScheduler(600, min_interval=10, max_interval=10000, sale_windows=None, alpha=0.5, jitter=0)
+    scheduler.record(URL, changed=True, now=0)
+    assert scheduler.state(URL).change_gap is None
+    assert scheduler.state(URL).interval == 300   # no gap estimate yet: halve
+    scheduler.record(URL, changed=True, now=1000)
+    assert scheduler.state(URL).change_gap == 1000
+    scheduler.record(URL, changed=True, now=1200)
+    assert scheduler.state(URL).change_gap == 0.5 * 200 + 0.5 * 1000
+    assert scheduler.state(URL).interval == 300   # sample at twice the change rate
+
+def test_unchanged_pages_back_off_within_bounds():
+    scheduler = AdaptiveScheduler(600, sale_windows=None, growth=2, jitter=0)
+    for _ in range(10):
+        scheduler.record(URL, changed=False)
+    assert scheduler.state(URL).interval == scheduler.max_interval == 2400
+    assert scheduler.state(URL).failures == 0
+
+def test_failures_back_off_and_reset(tmp_path):
+    state = tmp_path / "scheduler_state.json"
+    scheduler = AdaptiveScheduler(600, sale_windows=None, state_file=state)
+    delays = [scheduler.record_failure(URL) for _ in range(6)]
+    assert all(150 / 2 <= d <= 2400 for d in delays)
+    assert delays[-1] >= 2400 / 2
+    scheduler.record(URL, changed=False)
+    assert AdaptiveScheduler(600, state_file=state).state(URL).failures == 0   # persisted
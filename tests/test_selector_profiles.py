@@ -0,0 +1,23 @@
+# tests/test_selector_profiles.py
+from http_fetch import StaticPage
+from selector_profiles import load_profile
+
+HTML = """<html><body>
+<div class="ecm-ad"><a class="ecm-ad-link" href="/item/1/"><img src="/img/1.jpg"></a>
+  <div class="ecm-ad-name">商品1</div><div class="ecm-ad-price-original">2,480円</div><div class="ecm-ad-price-amount">1,980円</div></div>
+<div class="ecm-ad"><div class="ecm-ad-name">商品2</div><div class="ecm-ad-price-amount">980円</div></div>
+<div class="ecm-ad"><div class="ecm-ad-name">商品3</div><div class="ecm-ad-price-amount">価格未定</div></div>
+</body></html>"""
+
+def test_rakuten_cards_without_image_or_link_are_kept():
+    result = load_profile("rakuten_supersale").plan("products").evaluate(StaticPage("https://event.rakuten.co.jp/campaign/x/", HTML))
+    assert result["total"] == 3 and result["skipped"] == 1   # only the card without a price is dropped
+    first, second = result["items"]
+    assert first["link"] == "https://event.rakuten.co.jp/item/1/"
+    assert first["image_url"] == "https://event.rakuten.co.jp/img/1.jpg"
+    assert second["title"] == "商品2" and second["link"] is None and second["image_url"] is None
+    assert result["stats"]["link"] == {"ok": 1, "missing": 2, "invalid": 0}
+
+def test_required_fields():
+    assert load_profile("rakuten_supersale").plan("products").required == ["discounted_price"]
+    assert load_profile("generic").plan("products").required == ["text"]
@@ -0,0 +1,281 @@
+# thumbnails.py
+# Image stage: download once, content-addressed WebP thumbnails, perceptual-hash merging
+# - Every image URL is fetched once over a pooled HTTP session (worker threads)
+# - Thumbnails live in thumbnails/<2 hex>/<digest>.webp, where digest = hash of the image
+#   bytes, so the same creative under several r10s.jp URLs is stored once
+# - A 64-bit difference hash (dHash) links visually identical images with different
+#   bytes (re-encodes, resizes); lookups use 4×16-bit bands, so a near-duplicate check
+#   touches only images sharing a band instead of the whole table
+# - Items get an `image_id` (the canonical digest of their image cluster); save paths
+#   use it to merge duplicate products/banners and main.py serves /thumbnails/<image_id>.webp
+#
+# Usage:
+#   python thumbnails.py backfill     # thumbnails for images in storage.json / ai_storage.json
+
+import hashlib
+import io
+import json
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from http_fetch import make_session
+
+THUMB_DIR = Path("thumbnails")
+IMAGES_DB = Path("images.db")
+THUMB_SIZE = (256, 256)
+WEBP_QUALITY = 80
+MAX_DISTANCE = 3          # dHash bits that may differ for "same creative" (≤ 3 → one band always matches)
+BANDS = 4
+FETCH_WORKERS = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT,                 -- NULL when the download failed
+    fetched_at INTEGER NOT NULL,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS digests (
+    digest TEXT PRIMARY KEY,
+    phash INTEGER NOT NULL,
+    canonical TEXT NOT NULL,     -- first digest seen in this near-duplicate cluster
+    width INTEGER,
+    height INTEGER
+);
+CREATE TABLE IF NOT EXISTS phash_bands (
+    band INTEGER NOT NULL,
+    value INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (band, value, digest)
+) WITHOUT ROWID;
+"""
+
+# ----------------------------
+# Hashing
+# ----------------------------
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def dhash(image) -> int:
+    """64-bit difference hash: is each pixel brighter than its right neighbour (9×8 grayscale)?"""
+    from PIL import Image
+    small = image.convert("L").resize((9, 8), Image.LANCZOS)
+    px = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = (bits << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return bits - (1 << 64) if bits >= 1 << 63 else bits  # SQLite integers are signed
+
+def bands(phash: int):
+    unsigned = phash & ((1 << 64) - 1)
+    return [(b, (unsigned >> (16 * b)) & 0xFFFF) for b in range(BANDS)]
+
+def hamming(a: int, b: int) -> int:
+    return bin((a ^ b) & ((1 << 64) - 1)).count("1")
+
+def thumb_path(digest: str, root=THUMB_DIR) -> Path:
+    return Path(root) / digest[:2] / f"{digest}.webp"
+
+# ----------------------------
+# Store
+# ----------------------------
+class ImageStore:
+    def __init__(self, path=IMAGES_DB, thumb_dir=THUMB_DIR, session=None):
+        self.thumb_dir = Path(thumb_dir)
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self.lock = threading.Lock()    # fetch() runs on worker threads
+        self._session = session
+        self.stats = {"fetched": 0, "reused": 0, "near_duplicates": 0, "failed": 0}
+
+    @property
+    def session(self):
+        if self._session is None:
+            self._session = make_session(FETCH_WORKERS)
+        return self._session
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def known(self, url: str) -> bool:
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM urls WHERE url = ? AND digest IS NOT NULL", (url,)).fetchone() is not None
+
+    def _similar(self, phash: int):
+        """Canonical digest of an existing image within MAX_DISTANCE bits, if any."""
+        for band, value in bands(phash):
+            rows = self.conn.execute(
+                "SELECT d.canonical, d.phash FROM phash_bands b JOIN digests d ON d.digest = b.digest "
+                "WHERE b.band = ? AND b.value = ?", (band, value))
+            for canonical, other in rows:
+                if hamming(phash, other) <= MAX_DISTANCE:
+                    return canonical
+        return None
+
+    def fetch(self, url: str):
+        """Download, thumbnail and hash one image; returns its canonical digest (None on failure)."""
+        try:
+            response = self.session.get(url, timeout=10)
+            response.raise_for_status()
+            data = response.content
+        except Exception as e:
+            return self._record_failure(url, e)
+
+        digest = content_digest(data)
+        with self.lock:
+            row = self.conn.execute("SELECT canonical FROM digests WHERE digest = ?", (digest,)).fetchone()
+        if row:
+            self.stats["reused"] += 1
+            self._record_url(url, digest)
+            return row[0]
+
+        try:
+            from PIL import Image
+            image = Image.open(io.BytesIO(data))
+            image.load()
+            phash = dhash(image)
+            width, height = image.size
+            thumb = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+            thumb.thumbnail(THUMB_SIZE)
+            path = thumb_path(digest, self.thumb_dir)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")  # same bytes may arrive via two URLs at once
+            thumb.save(tmp, "WEBP", quality=WEBP_QUALITY, method=4)
+            tmp.replace(path)
+        except Exception as e:
+            return self._record_failure(url, e)
+
+        with self.lock, self.conn:
+            canonical = self._similar(phash)
+            if canonical:
+                self.stats["near_duplicates"] += 1
+            self.conn.execute("INSERT OR IGNORE INTO digests VALUES (?, ?, ?, ?, ?)",
+                              (digest, phash, canonical or digest, width, height))
+            self.conn.executemany("INSERT OR IGNORE INTO phash_bands VALUES (?, ?, ?)",
+                                  [(b, v, digest) for b, v in bands(phash)])
+            self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, NULL)", (url, digest, int(time.time())))
+        self.stats["fetched"] += 1
+        return canonical or digest
+
+    def _record_url(self, url: str, digest: str):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, ?, ?, NULL)", (url, digest, int(time.time())))
+
+    def _record_failure(self, url: str, error):
+        self.stats["failed"] += 1
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO urls VALUES (?, NULL, ?, ?)", (url, int(time.time()), str(error)[:200]))
+        return None
+
+    def image_ids(self, urls) -> dict:
+        """{url: canonical digest} for the URLs that have a thumbnail."""
+        urls = list({u for u in urls if u})
+        found = {}
+        with self.lock:
+            for start in range(0, len(urls), 500):
+                chunk = urls[start:start + 500]
+                rows = self.conn.execute(
+                    f"SELECT u.url, d.canonical FROM urls u JOIN digests d ON d.digest = u.digest "
+                    f"WHERE u.url IN ({','.join('?' * len(chunk))})", chunk)
+                found.update(rows)
+        return found
+
+    def fetch_many(self, urls, workers: int = FETCH_WORKERS) -> dict:
+        todo = [u for u in dict.fromkeys(urls) if u and u.startswith("http") and not self.known(u)]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(self.fetch, todo))
+        return self.image_ids(urls)
+
+# ----------------------------
+# Pipeline sink + save-path helpers
+# ----------------------------
+class ImageSink:
+    """
+    Pass items through to `inner` while their images download in the background.
+    close() waits for the downloads, so the save path can look up image ids.
+    """
+
+    def __init__(self, inner, store: ImageStore = None, workers: int = FETCH_WORKERS):
+        self.inner = inner
+        self.store = store or ImageStore()
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="images")
+        self.futures = []
+        self.submitted = set()
+
+    def write(self, kind: str, item):
+        url = item.get("image_url")
+        if url and url.startswith("http") and url not in self.submitted:
+            self.submitted.add(url)
+            if not self.store.known(url):
+                self.futures.append(self.pool.submit(self.store.fetch, url))
+        self.inner.write(kind, item)
+
+    def close(self):
+        wait(self.futures)
+        self.pool.shutdown()
+        stats = self.store.stats
+        if self.submitted:
+            print(f"🖼️ Images: {stats['fetched']} new thumbnails, {stats['reused']} reused, "
+                  f"{stats['near_duplicates']} near-duplicates, {stats['failed']} failed")
+        self.store.close()
+        return self.inner.close()
+
+def annotate_images(items, path=IMAGES_DB) -> int:
+    """Set `image_id` on items whose image has been processed. Returns how many were set."""
+    items = list(items)
+    if not items or not Path(path).exists():
+        return 0
+    try:
+        with ImageStore(path) as store:
+            ids = store.image_ids(item.get("image_url") for item in items)
+    except sqlite3.Error as e:
+        print(f"⚠️ Could not read image ids: {e}")
+        return 0
+    count = 0
+    for item in items:
+        image_id = ids.get(item.get("image_url"))
+        if image_id:
+            item["image_id"] = image_id
+            count += 1
+    return count
+
+def product_image_key(p):
+    """Same creative + same title + same price under another URL = the same product."""
+    return (p.get("image_id"), p.get("title_ja"), str(p.get("discounted_price"))) if p.get("image_id") else None
+
+def banner_image_key(b):
+    return (b.get("image_id") or b.get("image_url"), b.get("text_ja"))
+
+# ----------------------------
+# Backfill
+# ----------------------------
+def backfill(storage="storage.json", ai_storage="ai_storage.json"):
+    urls = []
+    if Path(storage).exists():
+        with open(storage, "r", encoding="utf-8") as f:
+            urls += [p.get("image_url") for p in json.load(f)]
+    if Path(ai_storage).exists():
+        with open(ai_storage, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        urls += [i.get("image_url") for i in data.get("products", []) + data.get("banners", [])]
+    with ImageStore() as store:
+        ids = store.fetch_many(urls)
+        print(f"🖼️ {len(ids)} images with thumbnails ({len(set(ids.values()))} distinct creatives), stats: {store.stats}")
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["backfill"]:
+        backfill()
+    else:
+        print("Usage: python thumbnails.py backfill")
@@ -0,0 +1,119 @@
+# translations.py
+# Shared, persistent translation cache and side table (SQLite)
+# - Each source string is stored once (keyed by its 64-bit hash) with one row per
+#   target language, so zh/ko translations are not copied onto every record
+# - Records keep their `*_en` fields; other languages are looked up by source text
+# - The pipeline's TranslateStage reads/writes this table, so a string is translated
+#   once per language across runs, scrapers and processes
+#
+# Usage:
+#   python translations.py stats
+#   python translations.py zh "半額 セール"
+
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+from records import hash_key
+
+TRANSLATIONS_DB = Path("translations.db")
+SOURCE_LANG = "ja"
+# Targets translated by the scrapers (`en` also fills the records' *_en fields); every extra
+# language is another round of translation requests, so zh/ko etc. are opt-in (TRANSLATE_LANGS=en,zh,ko)
+TARGET_LANGS = [lang.strip() for lang in os.environ.get("TRANSLATE_LANGS", "en").split(",") if lang.strip()]
+# Our short codes → Google Translate codes (googletrans and deep_translator accept both casings)
+GOOGLE_CODES = {"zh": "zh-CN", "zh-tw": "zh-TW"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS texts (
+    id INTEGER PRIMARY KEY,     -- hash_key(source text)
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS translations (
+    text_id INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (text_id, lang)
+) WITHOUT ROWID;
+"""
+
+def google_code(lang: str) -> str:
+    return GOOGLE_CODES.get(lang.lower(), lang)
+
+def text_id(text: str) -> int:
+    return hash_key(" ".join(text.split()))
+
+class TranslationStore:
+    def __init__(self, path=TRANSLATIONS_DB):
+        # Written from the pipeline thread, read from request handlers
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def get_many(self, texts: Iterable[str], lang: str) -> Dict[str, str]:
+        """{text: translation} for the texts already translated into `lang`."""
+        by_id = {text_id(t): t for t in texts if t}
+        found = {}
+        ids = list(by_id)
+        for start in range(0, len(ids), 500):  # stay under SQLite's variable limit
+            chunk = ids[start:start + 500]
+            rows = self.conn.execute(
+                f"SELECT text_id, value FROM translations WHERE lang = ? AND text_id IN ({','.join('?' * len(chunk))})",
+                [lang] + chunk,
+            )
+            for tid, value in rows:
+                found[by_id[tid]] = value
+        return found
+
+    def put_many(self, lang: str, pairs: Iterable) -> int:
+        now = int(time.time())
+        rows = [(text_id(src), src, dst) for src, dst in pairs if src and dst]
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO texts (id, text) VALUES (?, ?)", [(i, s) for i, s, _ in rows])
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?)", [(i, lang, d, now) for i, _, d in rows]
+            )
+        return len(rows)
+
+    def localize(self, items: List[dict], lang: str, fields: Dict[str, str]) -> List[dict]:
+        """
+        Copies of `items` with translated fields added, e.g.
+        fields={"title_ja": "title_zh"}; untranslated texts stay None.
+        """
+        texts = {item.get(src) for item in items for src in fields if item.get(src)}
+        found = self.get_many(texts, lang)
+        out = []
+        for item in items:
+            item = dict(item)
+            for src, dst in fields.items():
+                item[dst] = found.get(item.get(src)) if item.get(src) else None
+            out.append(item)
+        return out
+
+    def stats(self) -> dict:
+        by_lang = dict(self.conn.execute("SELECT lang, COUNT(*) FROM translations GROUP BY lang"))
+        texts = self.conn.execute("SELECT COUNT(*) FROM texts").fetchone()[0]
+        return {"texts": texts, "translations": by_lang}
+
+if __name__ == "__main__":
+    with TranslationStore() as store:
+        if sys.argv[1:2] == ["stats"]:
+            print(store.stats())
+        elif len(sys.argv) > 2:
+            text = " ".join(sys.argv[2:])
+            print(store.get_many([text], sys.argv[1]).get(text, "(not translated yet)"))
+        else:
+            print('Usage: python translations.py stats | python translations.py <lang> "原文"')
@@ -0,0 +1,267 @@
+# vector_index.py
+# Persistent approximate-nearest-neighbour index + hybrid (vector + keyword) search
+# - IVF-Flat: k-means coarse quantizer, vectors stored contiguously per list so a
+#   query only scans `nprobe` lists (memory-mapped .npy files, nothing re-embedded)
+# - New documents land in a small "pending" buffer searched exhaustively until the
+#   next rebuild folds them into the lists
+# - Documents are the rows of search_index.db, so keyword and vector hits share ids
+# - Query embeddings are cached; p50/p99 query latency is tracked
+# - Vectors are stored as float16 (see embeddings.py for the selectable backends)
+#
+# Usage:
+#   python vector_index.py sync          # embed documents not indexed yet
+#   python vector_index.py rebuild       # retrain lists over everything
+#   python vector_index.py "冬 暖房"      # hybrid query from the shell
+
+import json
+import sqlite3
+import sys
+import time
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from embeddings import as_storage, get_embedder
+from search_index import SEARCH_DB, SearchIndex
+
+VECTOR_DIR = Path("vector_index")
+REBUILD_PENDING = 20000   # fold the pending buffer into the lists past this size
+
+# ----------------------------
+# Embeddings
+# ----------------------------
+def embed(texts) -> np.ndarray:
+    return get_embedder().encode(texts)
+
+@lru_cache(maxsize=4096)
+def _cached_query_vector(query: str) -> bytes:
+    return embed([query])[0].tobytes()
+
+def query_vector(query: str) -> np.ndarray:
+    return np.frombuffer(_cached_query_vector(" ".join(query.split())), dtype=np.float32)
+
+# ----------------------------
+# Latency stats
+# ----------------------------
+class LatencyTracker:
+    def __init__(self, window: int = 2000):
+        self.samples = deque(maxlen=window)
+
+    def add(self, ms: float):
+        self.samples.append(ms)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": 0, "p50_ms": None, "p99_ms": None}
+        ordered = sorted(self.samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 2)
+        return {"count": len(ordered), "p50_ms": pick(0.50), "p99_ms": pick(0.99), "max_ms": round(ordered[-1], 2)}
+
+# ----------------------------
+# k-means
+# ----------------------------
+def kmeans(data: np.ndarray, k: int, iterations: int = 10, sample: int = 100_000, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    if len(data) > sample:
+        data = data[rng.choice(len(data), sample, replace=False)]
+    centroids = data[rng.choice(len(data), k, replace=False)].astype(np.float32)
+    for _ in range(iterations):
+        assign = assign_lists(data, centroids)
+        for c in range(k):
+            members = data[assign == c]
+            if len(members):
+                centroids[c] = members.mean(axis=0)
+            else:
+                centroids[c] = data[rng.integers(len(data))]  # re-seed empty list
+        centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+def assign_lists(data: np.ndarray, centroids: np.ndarray, chunk: int = 65536) -> np.ndarray:
+    out = np.empty(len(data), dtype=np.int32)
+    for start in range(0, len(data), chunk):
+        out[start:start + chunk] = np.argmax(data[start:start + chunk] @ centroids.T, axis=1)
+    return out
+
+# ----------------------------
+# Index
+# ----------------------------
+class VectorIndex:
+    """IVF-Flat over normalized vectors (cosine similarity = dot product)."""
+
+    def __init__(self, directory=VECTOR_DIR, nprobe: int = 16):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.nprobe = nprobe
+        self.latency = LatencyTracker()
+        self._load()
+
+    def _path(self, name: str) -> Path:
+        return self.dir / f"{name}.npy"
+
+    def _load(self):
+        if self._path("centroids").exists():
+            self.centroids = np.load(self._path("centroids"))
+            self.offsets = np.load(self._path("offsets"))
+            self.vectors = np.load(self._path("vectors"), mmap_mode="r")
+            self.ids = np.load(self._path("ids"), mmap_mode="r")
+        else:
+            self.centroids = self.offsets = self.vectors = self.ids = None
+        if self._path("pending_vectors").exists():
+            self.pending_vectors = np.load(self._path("pending_vectors"))
+            self.pending_ids = np.load(self._path("pending_ids"))
+        else:
+            self.pending_vectors = np.empty((0, 0), dtype=np.float16)
+            self.pending_ids = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return (len(self.ids) if self.ids is not None else 0) + len(self.pending_ids)
+
+    def indexed_ids(self) -> set:
+        ids = set(self.pending_ids.tolist())
+        if self.ids is not None:
+            ids.update(self.ids.tolist())
+        return ids
+
+    def add(self, ids, vectors: np.ndarray):
+        vectors = as_storage(vectors)
+        if not len(vectors):
+            return
+        if self.pending_vectors.size:
+            vectors = np.vstack([self.pending_vectors, vectors])
+            ids = np.concatenate([self.pending_ids, np.asarray(ids, dtype=np.int64)])
+        self.pending_vectors = vectors
+        self.pending_ids = np.asarray(ids, dtype=np.int64)
+        np.save(self._path("pending_vectors"), self.pending_vectors)
+        np.save(self._path("pending_ids"), self.pending_ids)
+        if len(self.pending_ids) >= REBUILD_PENDING:
+            self.rebuild()
+
+    def rebuild(self, nlist: int = None):
+        """Retrain the coarse quantizer and lay vectors out contiguously per list."""
+        parts_v, parts_i = [], []
+        if self.vectors is not None:
+            parts_v.append(np.asarray(self.vectors))
+            parts_i.append(np.asarray(self.ids))
+        if self.pending_vectors.size:
+            parts_v.append(self.pending_vectors)
+            parts_i.append(self.pending_ids)
+        if not parts_v:
+            return
+        data, ids = np.vstack(parts_v).astype(np.float32), np.concatenate(parts_i)
+
+        nlist = nlist or max(1, min(4096, int(4 * np.sqrt(len(data)))))
+        nlist = min(nlist, len(data))
+        print(f"🧮 Training {nlist} lists over {len(data)} vectors...")
+        centroids = kmeans(data, nlist)
+        assign = assign_lists(data, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+
+        # Release the old memory maps before overwriting their files
+        self.vectors = self.ids = None
+        np.save(self._path("centroids"), centroids)
+        np.save(self._path("offsets"), offsets)
+        np.save(self._path("vectors"), as_storage(data[order]))
+        np.save(self._path("ids"), ids[order])
+        for name in ("pending_vectors", "pending_ids"):
+            self._path(name).unlink(missing_ok=True)
+        self._load()
+
+    def search(self, query: np.ndarray, k: int = 10):
+        """Return [(doc_id, score), ...] best first."""
+        start = time.perf_counter()
+        cand_scores, cand_ids = [], []
+
+        if self.centroids is not None:
+            nprobe = min(self.nprobe, len(self.centroids))
+            probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+            for lst in probe:
+                lo, hi = self.offsets[lst], self.offsets[lst + 1]
+                if hi > lo:
+                    cand_scores.append(self.vectors[lo:hi].astype(np.float32) @ query)
+                    cand_ids.append(self.ids[lo:hi])
+        if self.pending_vectors.size:
+            cand_scores.append(self.pending_vectors.astype(np.float32) @ query)
+            cand_ids.append(self.pending_ids)
+
+        results = []
+        if cand_scores:
+            scores, ids = np.concatenate(cand_scores), np.concatenate(cand_ids)
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            results = [(int(ids[i]), float(scores[i])) for i in top]
+
+        self.latency.add((time.perf_counter() - start) * 1000)
+        return results
+
+# ----------------------------
+# Sync with the keyword index
+# ----------------------------
+def document_text(payload: dict) -> str:
+    parts = [payload.get("title_ja") or payload.get("text_ja"), payload.get("title_en") or payload.get("text_en")]
+    return " / ".join(p for p in parts if p)
+
+def sync(index: VectorIndex, search_db=SEARCH_DB, batch: int = 512) -> int:
+    """Embed every search_index document that has no vector yet."""
+    known = index.indexed_ids()
+    conn = sqlite3.connect(str(search_db))
+    rows = [(doc_id, payload) for doc_id, payload in conn.execute("SELECT id, payload FROM docs ORDER BY id")
+            if doc_id not in known]
+    conn.close()
+    for start in range(0, len(rows), batch):
+        chunk = rows[start:start + batch]
+        index.add([r[0] for r in chunk], embed(document_text(json.loads(r[1])) for r in chunk))
+    print(f"🧩 Embedded {len(rows)} new documents ({len(index)} total)")
+    cache = get_embedder().cache_stats()
+    if cache.get("hit_rate") is not None:
+        print(f"♻️ Embedding cache: {cache['hits']} hits / {cache['misses']} new (hit rate {cache['hit_rate']:.0%})")
+    return len(rows)
+
+# ----------------------------
+# Hybrid search
+# ----------------------------
+def hybrid_search(index: VectorIndex, query: str, k: int = 10, alpha: float = 0.7,
+                  kind: str = None, search_db=SEARCH_DB) -> dict:
+    """
+    score = alpha * cosine + (1 - alpha) * (bm25 / best bm25)
+    Vector candidates come from the ANN index, keyword candidates from FTS5.
+    """
+    start = time.perf_counter()
+    qvec = query_vector(query)
+    vector_hits = dict(index.search(qvec, k=k * 4))
+
+    with SearchIndex(search_db) as keyword:
+        kw = keyword.search_ids(query, limit=k * 4)
+        best = max(kw.values(), default=0) or 1.0
+        scores = {}
+        for doc_id in set(vector_hits) | set(kw):
+            scores[doc_id] = alpha * vector_hits.get(doc_id, 0.0) + (1 - alpha) * kw.get(doc_id, 0.0) / best
+        docs = keyword.get_docs(sorted(scores, key=scores.get, reverse=True), kind=kind)
+
+    results = []
+    for doc_id, (doc_kind, payload) in docs.items():
+        results.append({
+            "kind": doc_kind,
+            "score": round(scores[doc_id], 4),
+            "vector_score": round(vector_hits.get(doc_id, 0.0), 4),
+            "keyword_score": round(kw.get(doc_id, 0.0), 4),
+            **payload,
+        })
+        if len(results) >= k:
+            break
+    total_ms = (time.perf_counter() - start) * 1000
+    return {"query": query, "count": len(results), "took_ms": round(total_ms, 2), "results": results}
+
+if __name__ == "__main__":
+    idx = VectorIndex()
+    if sys.argv[1:2] == ["sync"]:
+        sync(idx)
+    elif sys.argv[1:2] == ["rebuild"]:
+        sync(idx)
+        idx.rebuild()
+    elif len(sys.argv) > 1:
+        print(json.dumps(hybrid_search(idx, " ".join(sys.argv[1:])), indent=2, ensure_ascii=False))
+    else:
+        print('Usage: python vector_index.py sync | rebuild | "query"')